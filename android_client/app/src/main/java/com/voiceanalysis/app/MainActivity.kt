@@ -213,12 +213,13 @@ class MainActivity : AppCompatActivity() {
         
         // Format kết quả
         val stats = response.getStatistics()
-        val total = response.totalSegments
+        val total = response.totalFrames ?: response.totalSegments
         
         val resultText = buildString {
             appendLine("═".repeat(50))
             appendLine("📄 File: ${response.filename}")
-            appendLine("📊 Total Segments: $total")
+            appendLine("📊 Total Segments: ${response.totalSegments}")
+            appendLine("🎞 Total Frames: $total")
             appendLine("═".repeat(50))
             appendLine()
             appendLine("📈 STATISTICS:")
@@ -240,15 +241,29 @@ class MainActivity : AppCompatActivity() {
             appendLine("─".repeat(50))
             
             response.segments.take(20).forEach { segment ->
-                appendLine(
-                    String.format(
-                        "%.3f | %-10s | F0: %6.2f Hz | Energy: %.4f",
-                        segment.time,
-                        segment.type,
-                        segment.f0,
-                        segment.energy
+                if (response.isRuns) {
+                    appendLine(
+                        String.format(
+                            "%.3f-%.3f | %-10s | F0: %6.2f Hz | Energy: %.4f | %d frames",
+                            segment.start ?: 0.0,
+                            segment.end ?: 0.0,
+                            segment.type,
+                            segment.meanF0 ?: 0.0,
+                            segment.meanEnergy ?: 0.0,
+                            segment.frameCount ?: 1
+                        )
                     )
-                )
+                } else {
+                    appendLine(
+                        String.format(
+                            "%.3f | %-10s | F0: %6.2f Hz | Energy: %.4f",
+                            segment.time,
+                            segment.type,
+                            segment.f0,
+                            segment.energy
+                        )
+                    )
+                }
             }
             
             if (response.segments.size > 20) {
@@ -16,10 +16,20 @@ data class AnalysisResponse(
     val totalSegments: Int,
     
     @SerializedName("segments")
-    val segments: List<Segment>
+    val segments: List<Segment>,
+    
+    // Chỉ có khi mode = "runs"
+    @SerializedName("mode")
+    val mode: String? = null,
+    
+    @SerializedName("total_frames")
+    val totalFrames: Int? = null
 ) {
+    val isRuns: Boolean
+        get() = mode == "runs"
+    
     /**
-     * Tính thống kê các loại frame
+     * Tính thống kê các loại frame (mode runs: cộng frameCount)
      */
     fun getStatistics(): Map<String, Int> {
         val stats = mutableMapOf(
@@ -29,25 +39,44 @@ data class AnalysisResponse(
         )
         
         segments.forEach { segment ->
-            stats[segment.type] = (stats[segment.type] ?: 0) + 1
+            stats[segment.type] = (stats[segment.type] ?: 0) + (segment.frameCount ?: 1)
         }
         
         return stats
     }
 }
 
+/**
+ * Một segment: một frame (mode frames) hoặc một đoạn các frame liên tiếp
+ * cùng loại (mode runs - dùng start/end/meanF0/meanEnergy/frameCount)
+ */
 data class Segment(
     @SerializedName("time")
-    val time: Double,
+    val time: Double = 0.0,
     
     @SerializedName("type")
     val type: String,
     
     @SerializedName("f0")
-    val f0: Double,
+    val f0: Double = 0.0,
     
     @SerializedName("energy")
-    val energy: Double
+    val energy: Double = 0.0,
+    
+    @SerializedName("start")
+    val start: Double? = null,
+    
+    @SerializedName("end")
+    val end: Double? = null,
+    
+    @SerializedName("mean_f0")
+    val meanF0: Double? = null,
+    
+    @SerializedName("mean_energy")
+    val meanEnergy: Double? = null,
+    
+    @SerializedName("frame_count")
+    val frameCount: Int? = null
 )
 
 /**
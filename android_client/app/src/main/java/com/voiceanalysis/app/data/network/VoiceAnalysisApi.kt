@@ -6,6 +6,7 @@ import retrofit2.Response
 import retrofit2.http.Multipart
 import retrofit2.http.POST
 import retrofit2.http.Part
+import retrofit2.http.Query
 
 /**
  * API Interface cho Retrofit
@@ -16,6 +17,15 @@ interface VoiceAnalysisApi {
     @Multipart
     @POST("analyze/")
     suspend fun analyzeAudio(
-        @Part file: MultipartBody.Part
+        @Part file: MultipartBody.Part,
+        @Query("mode") mode: String = ANALYZE_MODE
     ): Response<AnalysisResponse>
+    
+    companion object {
+        /**
+         * "runs": server gộp các frame liên tiếp cùng loại (response nhỏ hơn)
+         * "frames": mỗi frame một segment (hợp đồng F-S5 gốc)
+         */
+        const val ANALYZE_MODE = "runs"
+    }
 }
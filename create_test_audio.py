@@ -2,6 +2,8 @@
 Script để tạo file âm thanh test
 """
 
+import wave
+
 import numpy as np
 from scipy.io import wavfile
 
@@ -61,6 +63,63 @@ def create_long_test_audio(filename="test_60s.wav", duration=60, sample_rate=160
     print(f"   - Thời lượng: {duration} giây")
     print(f"   - Sample rate: {sample_rate} Hz")
 
+def create_corpus_audio(filename, duration=60, sample_rate=16000, voiced_ratio=0.5,
+                        silence_ratio=0.3, seed=0):
+    """
+    Tạo file âm thanh tổng hợp có cấu trúc cho benchmark (NF-1)
+    
+    Xen kẽ các đoạn dài 0.2-1.5 giây:
+    - voiced: chuỗi hài (F0 80-400 Hz, có vibrato)
+    - unvoiced: nhiễu trắng
+    - silence: nhiễu nền rất nhỏ
+    Loại của mỗi đoạn được chọn ngẫu nhiên theo voiced_ratio / silence_ratio
+    (phần còn lại là unvoiced). Cùng tham số và seed cho cùng nội dung file.
+    File được ghi dần từng đoạn, nên tạo được file dài (2 giờ) mà không giữ
+    toàn bộ audio trong RAM.
+    
+    Returns:
+        Danh sách nhãn thật (start, end, loại) theo giây
+    """
+    if voiced_ratio < 0 or silence_ratio < 0 or voiced_ratio + silence_ratio > 1:
+        raise ValueError("voiced_ratio + silence_ratio must be between 0 and 1")
+    
+    print(f"🎵 Đang tạo file corpus: {filename}")
+    
+    rng = np.random.default_rng(seed)
+    kinds = ["VOICED", "SILENCE", "UNVOICED"]
+    weights = [voiced_ratio, silence_ratio, 1 - voiced_ratio - silence_ratio]
+    total = int(duration * sample_rate)
+    position = 0
+    labels = []
+    
+    with wave.open(filename, "wb") as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(sample_rate)
+        
+        while position < total:
+            kind = kinds[rng.choice(3, p=weights)]
+            n = min(int(rng.uniform(0.2, 1.5) * sample_rate), total - position)
+            t = np.arange(n) / sample_rate
+            
+            if kind == "VOICED":
+                f0 = rng.uniform(80, 400)
+                phase = 2 * np.pi * np.cumsum(f0 * (1 + 0.02 * np.sin(2 * np.pi * 5 * t))) / sample_rate
+                piece = sum(0.3 / k * np.sin(k * phase) for k in range(1, 5))
+            elif kind == "UNVOICED":
+                piece = 0.1 * rng.standard_normal(n)
+            else:
+                piece = 0.001 * rng.standard_normal(n)
+            
+            output.writeframes(np.int16(piece * 32767).astype("<i2").tobytes())
+            labels.append((position / sample_rate, (position + n) / sample_rate, kind))
+            position += n
+    
+    print(f"✅ Đã tạo {filename}")
+    print(f"   - Thời lượng: {duration} giây, sample rate: {sample_rate} Hz, seed: {seed}")
+    
+    return labels
+
 if __name__ == "__main__":
     # Kiểm tra scipy có sẵn không
     try:
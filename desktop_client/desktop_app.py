@@ -6,21 +6,51 @@ Bao gồm tính năng ghi âm từ microphone (F-C2)
 
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext, ttk
-import requests
 import threading
 import json
-from typing import Optional, Dict, Any
+import struct
+import sys
+from array import array
+from typing import TYPE_CHECKING, Optional, Dict, Any, Iterator, Tuple
 import os
 import wave
-import pyaudio
 import tempfile
 from datetime import datetime
+from urllib.parse import urlencode
+
+try:
+    import websocket  # websocket-client, chỉ cần cho chế độ live
+except ImportError:
+    websocket = None
+
+# requests và pyaudio được import ở lần dùng đầu tiên (gửi file / bắt đầu
+# ghi âm) để cửa sổ hiện ra ngay: khởi tạo PortAudio dò thiết bị âm thanh
+# có thể mất vài giây
+if TYPE_CHECKING:
+    import requests
 
 
 class Config:
     """Lớp cấu hình - Tuân thủ S-5: Không hard-code địa chỉ server"""
     API_BASE_URL = "http://127.0.0.1:8000"
     ANALYZE_ENDPOINT = f"{API_BASE_URL}/analyze/"
+    STREAM_ENDPOINT = f"{API_BASE_URL}/analyze/stream"
+    # True: nhận kết quả dần theo từng khối (/analyze/stream), bảng được
+    # hiển thị ngay khi khối đầu tiên xong thay vì chờ cả file
+    ANALYZE_STREAMING = True
+    # "runs": server gộp các frame liên tiếp cùng loại (response nhỏ hơn nhiều)
+    # "frames": mỗi frame một segment (hợp đồng F-S5 gốc)
+    ANALYZE_MODE = "runs"
+    # Định dạng response ưu tiên: mode frames nhận dạng cột nhị phân (nhỏ và
+    # parse nhanh), mode runs server luôn trả về JSON
+    COLUMNS_BINARY_MEDIA_TYPE = "application/vnd.voiceanalysis.columns"
+    COLUMNS_JSON_MEDIA_TYPE = "application/vnd.voiceanalysis.columns+json"
+    ANALYZE_ACCEPT = f"{COLUMNS_BINARY_MEDIA_TYPE}, application/json;q=0.9"
+    # Chế độ live: gửi từng buffer microphone qua WebSocket trong lúc ghi âm,
+    # nhãn của mỗi frame hiện ra sau khoảng 0.1s (backend nccf hoặc yin)
+    LIVE_ENDPOINT = "ws://127.0.0.1:8000/ws/analyze"
+    LIVE_ANALYSIS = False
+    LIVE_F0_BACKEND = "nccf"
     SUPPORTED_FORMATS = [
         ("Audio Files", "*.wav *.mp3 *.m4a *.flac *.ogg"),
         ("WAV Files", "*.wav"),
@@ -33,26 +63,122 @@ class Config:
     RECORD_SAMPLE_RATE = 16000  # Hz
     RECORD_CHANNELS = 1  # Mono
     RECORD_CHUNK = 1024  # Buffer size
-    RECORD_FORMAT = pyaudio.paInt16  # 16-bit audio
+    RECORD_SAMPLE_WIDTH = 2  # 16-bit audio (pyaudio.paInt16)
 
 
 class AnalysisResponse:
     """
     Model cho response từ API - Tuân thủ S-4: Sử dụng Model để parse JSON
+    
+    Với định dạng dạng cột (JSON hoặc nhị phân), dữ liệu được giữ nguyên
+    dạng mảng trong `columns` - không tạo dict cho từng frame.
     """
-    def __init__(self, data: Dict[str, Any]):
+    def __init__(self, data: Dict[str, Any], columns: Optional[Dict[str, Any]] = None):
         self.filename = data.get("filename", "")
         self.total_segments = data.get("total_segments", 0)
         self.segments = data.get("segments", [])
+        self.mode = data.get("mode", "frames")
+        self.total_frames = data.get("total_frames", self.total_segments)
+        self.frame_types = data.get("frame_types", ["VOICED", "UNVOICED", "SILENCE"])
+        # time/f0/energy: array('f') hoặc list; type: bytes hoặc list mã nhãn
+        self.columns = columns
+    
+    @classmethod
+    def from_http(cls, response: "requests.Response") -> "AnalysisResponse":
+        """Parse response theo Content-Type (F-S5, dạng cột JSON hoặc nhị phân)"""
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type == Config.COLUMNS_BINARY_MEDIA_TYPE:
+            return cls.from_columns_binary(response.content)
+        
+        data = response.json()
+        if content_type == Config.COLUMNS_JSON_MEDIA_TYPE:
+            return cls(data, data.pop("columns"))
+        return cls(data)
+    
+    @classmethod
+    def from_columns_binary(cls, body: bytes) -> "AnalysisResponse":
+        """
+        Parse định dạng nhị phân: "VUVC" | uint32 N | header JSON (N byte) |
+        các cột liên tiếp theo header["columns"] (little-endian)
+        """
+        magic, header_length = struct.unpack_from("<4sI", body)
+        if magic != b"VUVC":
+            raise ValueError("Invalid columnar response")
+        
+        offset = 8 + header_length
+        header = json.loads(body[8:offset])
+        count = header["total_segments"]
+        
+        columns = {}
+        for name, dtype in header["columns"]:
+            size = count * int(dtype[2:])
+            chunk = body[offset:offset + size]
+            if dtype[1] == "f":
+                values = array("f")
+                values.frombytes(chunk)
+                if sys.byteorder == "big":
+                    values.byteswap()
+                columns[name] = values
+            else:
+                columns[name] = chunk  # uint8: mỗi byte là một mã nhãn
+            offset += size
+        
+        return cls(header, columns)
     
     def get_statistics(self) -> Dict[str, int]:
-        """Tính thống kê các loại frame"""
+        """Tính thống kê các loại frame (mode runs: cộng frame_count)"""
         stats = {"VOICED": 0, "UNVOICED": 0, "SILENCE": 0}
+        if self.columns is not None:
+            types = self.columns["type"]
+            for code, frame_type in enumerate(self.frame_types):
+                stats[frame_type] = types.count(code)
+            return stats
+        
         for segment in self.segments:
             frame_type = segment.get("type", "")
             if frame_type in stats:
-                stats[frame_type] += 1
+                stats[frame_type] += segment.get("frame_count", 1)
         return stats
+    
+    def extend(self, segments: list):
+        """Thêm các segment nhận được từ response streaming"""
+        self.segments.extend(segments)
+        self.total_segments = len(self.segments)
+        if self.mode == "frames":
+            # Live: không biết trước tổng số frame
+            self.total_frames = max(self.total_frames, self.total_segments)
+    
+    def iter_rows(self, start: int = 0) -> Iterator[Tuple[str, str, float, float, int]]:
+        """
+        Các dòng hiển thị (thời gian, loại, F0, năng lượng, số frame),
+        bắt đầu từ segment thứ `start`
+        """
+        if self.columns is not None:
+            frame_types = self.frame_types
+            for time_val, code, f0, energy in zip(
+                self.columns["time"][start:], self.columns["type"][start:],
+                self.columns["f0"][start:], self.columns["energy"][start:]
+            ):
+                yield f"{time_val:.3f}", frame_types[code], f0, energy, 1
+        elif self.mode == "runs":
+            # Một dòng cho mỗi đoạn: khoảng thời gian và giá trị trung bình
+            for segment in self.segments[start:]:
+                yield (
+                    f"{segment.get('start', 0):.3f} - {segment.get('end', 0):.3f}",
+                    segment.get('type', ''),
+                    segment.get('mean_f0', 0),
+                    segment.get('mean_energy', 0),
+                    segment.get('frame_count', 1)
+                )
+        else:
+            for segment in self.segments[start:]:
+                yield (
+                    f"{segment.get('time', 0):.3f}",
+                    segment.get('type', ''),
+                    segment.get('f0', 0),
+                    segment.get('energy', 0),
+                    1
+                )
 
 
 class VoiceAnalysisApp:
@@ -72,10 +198,12 @@ class VoiceAnalysisApp:
         self.is_analyzing: bool = False
         self.is_recording: bool = False
         
-        # PyAudio instance cho ghi âm
-        self.audio = pyaudio.PyAudio()
+        # PyAudio instance cho ghi âm - tạo ở lần ghi âm đầu tiên (_get_audio)
+        self.audio = None
         self.frames = []
         self.stream = None
+        # WebSocket của phiên live (None khi không dùng chế độ live)
+        self.live_socket = None
         
         # Tạo giao diện
         self._create_ui()
@@ -166,6 +294,19 @@ class VoiceAnalysisApp:
         )
         self.recording_time_label.pack(side=tk.LEFT)
         
+        # Chế độ live: phân tích ngay trong lúc ghi âm
+        self.live_var = tk.BooleanVar(value=Config.LIVE_ANALYSIS)
+        live_check = tk.Checkbutton(
+            record_controls,
+            text="⚡ Live analysis",
+            variable=self.live_var,
+            font=("Segoe UI", 10),
+            bg='white',
+            activebackground='white',
+            cursor='hand2'
+        )
+        live_check.pack(side=tk.LEFT, padx=(15, 0))
+        
         # ========== FILE SELECTION CARD ==========
         file_card = tk.Frame(main_frame, bg='white', relief=tk.RAISED, borderwidth=1)
         file_card.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(0, 15))
@@ -354,7 +495,7 @@ class VoiceAnalysisApp:
         
         self.results_table = ttk.Treeview(
             table_frame,
-            columns=("no", "time", "type", "f0", "energy"),
+            columns=("no", "time", "type", "f0", "energy", "frames"),
             show="headings",
             yscrollcommand=tree_scroll_y.set,
             xscrollcommand=tree_scroll_x.set,
@@ -368,12 +509,14 @@ class VoiceAnalysisApp:
         self.results_table.heading("type", text="Type")
         self.results_table.heading("f0", text="F0 (Hz)")
         self.results_table.heading("energy", text="Energy")
+        self.results_table.heading("frames", text="Frames")
         
         self.results_table.column("no", width=60, anchor=tk.CENTER)
-        self.results_table.column("time", width=100, anchor=tk.E)
+        self.results_table.column("time", width=140, anchor=tk.E)
         self.results_table.column("type", width=150, anchor=tk.CENTER)
         self.results_table.column("f0", width=120, anchor=tk.E)
         self.results_table.column("energy", width=120, anchor=tk.E)
+        self.results_table.column("frames", width=80, anchor=tk.E)
         
         # Configure scrollbars
         tree_scroll_y.config(command=self.results_table.yview)
@@ -422,15 +565,26 @@ class VoiceAnalysisApp:
         else:
             self._stop_recording()
     
+    def _get_audio(self):
+        """PyAudio instance, import pyaudio và khởi tạo PortAudio ở lần gọi đầu tiên"""
+        if self.audio is None:
+            import pyaudio
+            self.audio = pyaudio.PyAudio()
+        return self.audio
+    
     def _start_recording(self):
         """Bắt đầu ghi âm từ microphone - F-C2"""
         try:
             self.is_recording = True
             self.frames = []
+            audio = self._get_audio()
+            
+            if self.live_var.get() and websocket is None:
+                raise RuntimeError("Live analysis requires websocket-client (pip install websocket-client)")
             
             # Mở stream
-            self.stream = self.audio.open(
-                format=Config.RECORD_FORMAT,
+            self.stream = audio.open(
+                format=audio.get_format_from_width(Config.RECORD_SAMPLE_WIDTH),
                 channels=Config.RECORD_CHANNELS,
                 rate=Config.RECORD_SAMPLE_RATE,
                 input=True,
@@ -452,23 +606,126 @@ class VoiceAnalysisApp:
             recording_thread.daemon = True
             recording_thread.start()
             
+            # Live: kết nối trong thread riêng, không chặn cửa sổ; audio ghi
+            # được trong lúc chờ kết nối sẽ được gửi bù
+            if self.live_var.get():
+                live_thread = threading.Thread(target=self._open_live_session)
+                live_thread.daemon = True
+                live_thread.start()
+            
             # Cập nhật thời gian ghi âm
             self._update_recording_time()
             
         except Exception as e:
             self.is_recording = False
+            self._close_live_session()
             messagebox.showerror("Recording Error", f"Không thể ghi âm: {str(e)}\n\nKiểm tra microphone đã được kết nối!")
             self._update_status("✅  Ready to analyze", "#27ae60")
     
     def _record_audio(self):
         """Thread ghi âm - đọc dữ liệu từ stream"""
+        sent = 0
         try:
             while self.is_recording:
                 data = self.stream.read(Config.RECORD_CHUNK, exception_on_overflow=False)
                 self.frames.append(data)
+                
+                # Live: gửi nguyên buffer PCM int16 cho server (kể cả các
+                # buffer ghi được trước khi kết nối xong)
+                live_socket = self.live_socket
+                if live_socket is not None:
+                    try:
+                        for chunk in self.frames[sent:]:
+                            live_socket.send_binary(chunk)
+                        sent = len(self.frames)
+                    except Exception as e:
+                        # Mất kết nối live: vẫn tiếp tục ghi âm vào file
+                        self.live_socket = None
+                        self.root.after(0, self._log_message, f"⚠️ Live analysis stopped: {e}")
         except Exception as e:
             print(f"Recording error: {e}")
     
+    def _open_live_session(self):
+        """
+        Thread kết nối /ws/analyze và bắt đầu thread nhận kết quả
+        
+        Lỗi kết nối (server không truy cập được, từ chối phiên) được báo qua
+        root.after; việc ghi âm vào file vẫn tiếp tục.
+        """
+        query = urlencode({'f0_backend': Config.LIVE_F0_BACKEND})
+        try:
+            live_socket = websocket.create_connection(f"{Config.LIVE_ENDPOINT}?{query}", timeout=5)
+            start = json.loads(live_socket.recv())
+            if start.get("event") != "start":
+                live_socket.close()
+                raise RuntimeError(start.get("message", "Live analysis rejected by server"))
+        except Exception as e:
+            self.root.after(0, self._log_message, f"⚠️ Live analysis unavailable: {e}")
+            return
+        
+        # Chờ kết quả không giới hạn thời gian (có thể im lặng lâu)
+        live_socket.settimeout(None)
+        result = AnalysisResponse({
+            "filename": "🎤 Live recording",
+            "frame_types": ["VOICED", "UNVOICED", "SILENCE"]
+        })
+        # S-D2: mọi cập nhật UI đi qua root.after
+        self.root.after(0, self._begin_results, result)
+        self.root.after(
+            0, self._log_message, f"⚡ Live analysis: latency {start.get('latency', 0):.3f}s"
+        )
+        
+        self.live_socket = live_socket
+        receiver = threading.Thread(target=self._receive_live_results, args=(live_socket, result))
+        receiver.daemon = True
+        receiver.start()
+        
+        # Đã dừng ghi âm trong lúc chờ kết nối
+        if not self.is_recording:
+            self._close_live_session()
+    
+    def _receive_live_results(self, live_socket, result: AnalysisResponse):
+        """Thread nhận sự kiện JSON của phiên live (segments, end, error)"""
+        try:
+            while True:
+                message = live_socket.recv()
+                if not message:
+                    break
+                event = json.loads(message)
+                name = event.get("event")
+                
+                # S-D2: mọi cập nhật UI đi qua root.after
+                if name == "segments":
+                    self.root.after(0, self._append_results, result, event["segments"])
+                elif name == "end":
+                    self.root.after(0, self._finish_live_results, result)
+                    break
+                elif name == "error":
+                    self.root.after(0, self._show_error, event.get("message", "Unknown error"))
+                    break
+        except Exception as e:
+            if self.is_recording:
+                self.root.after(0, self._log_message, f"⚠️ Live analysis stopped: {e}")
+        finally:
+            try:
+                live_socket.close()
+            except Exception:
+                pass
+    
+    def _close_live_session(self):
+        """Báo server kết thúc phiên live; server gửi các frame cuối rồi đóng"""
+        live_socket, self.live_socket = self.live_socket, None
+        if live_socket is not None:
+            try:
+                live_socket.send("end")
+            except Exception:
+                live_socket.close()
+    
+    def _finish_live_results(self, result: AnalysisResponse):
+        """Live: server đã gửi hết các frame"""
+        self._show_statistics(result)
+        self._update_status(f"✅  Live analysis completed: {result.total_frames} frames", "#27ae60")
+    
     def _update_recording_time(self):
         """Cập nhật thời gian ghi âm"""
         if self.is_recording:
@@ -492,6 +749,8 @@ class VoiceAnalysisApp:
             self.stream.stop_stream()
             self.stream.close()
         
+        self._close_live_session()
+        
         # Lưu file WAV
         try:
             # Tạo file tạm
@@ -506,7 +765,7 @@ class VoiceAnalysisApp:
             # Ghi dữ liệu
             wf = wave.open(temp_filename, 'wb')
             wf.setnchannels(Config.RECORD_CHANNELS)
-            wf.setsampwidth(self.audio.get_sample_size(Config.RECORD_FORMAT))
+            wf.setsampwidth(Config.RECORD_SAMPLE_WIDTH)
             wf.setframerate(Config.RECORD_SAMPLE_RATE)
             wf.writeframes(b''.join(self.frames))
             wf.close()
@@ -562,36 +821,36 @@ class VoiceAnalysisApp:
         Thực hiện gọi API - Chạy trên background thread
         Tuân thủ S-2: Error handling với try-catch
         """
+        import requests
+        
         try:
             # Chuẩn bị file để upload - F-C5
             with open(self.selected_file, 'rb') as f:
                 files = {'file': (os.path.basename(self.selected_file), f)}
                 
+                if Config.ANALYZE_STREAMING:
+                    self._perform_streaming_analysis(files)
+                    return
+                
                 # Gọi API - F-C5
                 response = requests.post(
                     Config.ANALYZE_ENDPOINT,
+                    params={'mode': Config.ANALYZE_MODE},
+                    headers={'Accept': Config.ANALYZE_ACCEPT},
                     files=files,
                     timeout=60  # Timeout 60 giây
                 )
             
             # Kiểm tra response
             if response.status_code == 200:
-                # Parse JSON theo hợp đồng - F-C7, S-4
-                data = response.json()
-                analysis_result = AnalysisResponse(data)
+                # Parse theo hợp đồng (JSON hoặc dạng cột) - F-C7, S-4
+                analysis_result = AnalysisResponse.from_http(response)
                 
                 # Cập nhật UI - S-D2: Sử dụng root.after để an toàn với Tkinter
                 self.root.after(0, self._display_results, analysis_result)
             else:
                 # Xử lý lỗi - F-C9
-                error_msg = f"Server error ({response.status_code})"
-                try:
-                    error_data = response.json()
-                    error_msg += f": {error_data.get('detail', {}).get('message', '')}"
-                except:
-                    pass
-                
-                self.root.after(0, self._show_error, error_msg)
+                self.root.after(0, self._show_error, self._error_message(response))
         
         except requests.exceptions.ConnectionError:
             # Lỗi kết nối - F-C9
@@ -613,18 +872,100 @@ class VoiceAnalysisApp:
             # Kích hoạt lại nút - F-C6
             self.root.after(0, self._enable_analyze_button)
     
+    def _perform_streaming_analysis(self, files: Dict[str, Any]):
+        """
+        Gọi /analyze/stream và cập nhật bảng theo từng sự kiện NDJSON
+        (start, segments, end, error) - chạy trên background thread
+        """
+        import requests
+        
+        with requests.post(
+            Config.STREAM_ENDPOINT,
+            params={'mode': Config.ANALYZE_MODE},
+            headers={'Accept': 'application/x-ndjson'},
+            files=files,
+            stream=True,
+            timeout=60  # Timeout 60 giây giữa hai lần nhận dữ liệu
+        ) as response:
+            if response.status_code != 200:
+                self.root.after(0, self._show_error, self._error_message(response))
+                return
+            
+            result = None
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                name = event.pop("event", "")
+                
+                # S-D2: mọi cập nhật UI đi qua root.after
+                if name == "start":
+                    event["segments"] = []
+                    result = AnalysisResponse(event)
+                    self.root.after(0, self._begin_results, result)
+                elif name == "segments" and result is not None:
+                    self.root.after(0, self._append_results, result, event["segments"])
+                elif name == "end" and result is not None:
+                    self.root.after(0, self._finish_results, result, event)
+                elif name == "error":
+                    self.root.after(0, self._show_error, event.get("message", "Unknown error"))
+    
+    @staticmethod
+    def _error_message(response: "requests.Response") -> str:
+        """Thông báo lỗi từ response lỗi của server - F-C9"""
+        error_msg = f"Server error ({response.status_code})"
+        try:
+            error_data = response.json()
+            error_msg += f": {error_data.get('detail', {}).get('message', '')}"
+        except:
+            pass
+        return error_msg
+    
     def _display_results(self, result: AnalysisResponse):
         """Hiển thị kết quả - F-C8 - Hiển thị toàn bộ trong table"""
         # Clear existing data
         for item in self.results_table.get_children():
             self.results_table.delete(item)
         
-        # Thống kê tổng quan
+        self._show_statistics(result)
+        
+        # Populate table với TẤT CẢ segments
+        self._insert_rows(result.iter_rows(), first_index=1)
+        
+        self._update_status("✅  Analysis completed successfully!", "#27ae60")
+    
+    def _begin_results(self, result: AnalysisResponse):
+        """Streaming: bắt đầu nhận kết quả, xóa bảng cũ"""
+        for item in self.results_table.get_children():
+            self.results_table.delete(item)
+        self._show_statistics(result)
+        self._update_status("⏳ Receiving results...", "#f39c12")
+    
+    def _append_results(self, result: AnalysisResponse, segments: list):
+        """Streaming: thêm các segment của một khối vào bảng và thống kê"""
+        start = len(result.segments)
+        result.extend(segments)
+        self._insert_rows(result.iter_rows(start), first_index=start + 1)
+        self._show_statistics(result)
+    
+    def _finish_results(self, result: AnalysisResponse, summary: Dict[str, Any]):
+        """Streaming: hoàn tất, hiển thị độ trễ segment đầu tiên và tổng"""
+        self._show_statistics(result)
+        self._update_status(
+            f"✅  Analysis completed successfully! "
+            f"(first segment {summary.get('time_to_first_segment', 0):.2f}s, "
+            f"total {summary.get('total_time', 0):.2f}s)",
+            "#27ae60"
+        )
+    
+    def _show_statistics(self, result: AnalysisResponse):
+        """Cập nhật nhãn thống kê tổng quan"""
         stats = result.get_statistics()
-        total = result.total_segments
+        total = result.total_frames
         
         # Update statistics label
-        stats_text = f"📄 File: {result.filename}  |  📊 Total Segments: {total}\n\n"
+        stats_text = (f"📄 File: {result.filename}  |  📊 Total Segments: "
+                      f"{result.total_segments}  |  🎞 Frames: {total}\n\n")
         
         for frame_type, count in stats.items():
             percentage = (count / total * 100) if total > 0 else 0
@@ -634,14 +975,10 @@ class VoiceAnalysisApp:
             stats_text += f"{emoji} {frame_type:12s}: {count:6d} frames ({percentage:6.2f}%)  [{bar}]\n"
         
         self.stats_label.config(text=stats_text)
-        
-        # Populate table với TẤT CẢ segments
-        for i, segment in enumerate(result.segments, 1):
-            time_val = segment.get('time', 0)
-            seg_type = segment.get('type', '')
-            f0 = segment.get('f0', 0)
-            energy = segment.get('energy', 0)
-            
+    
+    def _insert_rows(self, rows: Iterator[Tuple[str, str, float, float, int]], first_index: int):
+        """Thêm các dòng (xem AnalysisResponse.iter_rows) vào cuối bảng"""
+        for i, (time_display, seg_type, f0, energy, frame_count) in enumerate(rows, first_index):
             # Icon cho type
             if seg_type == "VOICED":
                 type_display = f"🔊 {seg_type}"
@@ -655,7 +992,7 @@ class VoiceAnalysisApp:
             self.results_table.insert(
                 "",
                 tk.END,
-                values=(i, f"{time_val:.3f}", type_display, f"{f0:.2f}", f"{energy:.6f}"),
+                values=(i, time_display, type_display, f"{f0:.2f}", f"{energy:.6f}", frame_count),
                 tags=(tag,)
             )
         
@@ -663,8 +1000,6 @@ class VoiceAnalysisApp:
         self.results_table.tag_configure('voiced', background='#d5f4e6')
         self.results_table.tag_configure('unvoiced', background='#fdebd0')
         self.results_table.tag_configure('silence', background='#f0f0f0')
-        
-        self._update_status("✅  Analysis completed successfully!", "#27ae60")
     
     def _show_error(self, error_message: str):
         """Hiển thị lỗi - F-C9"""
@@ -704,8 +1039,8 @@ class VoiceAnalysisApp:
         if self.is_recording:
             self._stop_recording()
         
-        # Đóng PyAudio
-        if hasattr(self, 'audio'):
+        # Đóng PyAudio (nếu đã ghi âm)
+        if self.audio is not None:
             self.audio.terminate()
         
         # Xóa file tạm nếu có
@@ -11,14 +11,23 @@ struct AnalysisResponse: Codable {
     let filename: String
     let totalSegments: Int
     let segments: [Segment]
+    // Chỉ có khi mode = "runs"
+    let mode: String?
+    let totalFrames: Int?
     
     enum CodingKeys: String, CodingKey {
         case filename
         case totalSegments = "total_segments"
         case segments
+        case mode
+        case totalFrames = "total_frames"
     }
     
-    /// Tính thống kê các loại frame
+    var isRuns: Bool {
+        return mode == "runs"
+    }
+    
+    /// Tính thống kê các loại frame (mode runs: cộng frameCount)
     func getStatistics() -> [String: Int] {
         var stats: [String: Int] = [
             "VOICED": 0,
@@ -27,7 +36,7 @@ struct AnalysisResponse: Codable {
         ]
         
         for segment in segments {
-            stats[segment.type, default: 0] += 1
+            stats[segment.type, default: 0] += segment.frameCount ?? 1
         }
         
         return stats
@@ -35,11 +44,30 @@ struct AnalysisResponse: Codable {
 }
 
 // MARK: - Segment
+/// Một frame (mode frames: time/f0/energy) hoặc một đoạn các frame liên tiếp
+/// cùng loại (mode runs: start/end/meanF0/meanEnergy/frameCount)
 struct Segment: Codable {
-    let time: Double
+    let time: Double?
     let type: String
-    let f0: Double
-    let energy: Double
+    let f0: Double?
+    let energy: Double?
+    let start: Double?
+    let end: Double?
+    let meanF0: Double?
+    let meanEnergy: Double?
+    let frameCount: Int?
+    
+    enum CodingKeys: String, CodingKey {
+        case time
+        case type
+        case f0
+        case energy
+        case start
+        case end
+        case meanF0 = "mean_f0"
+        case meanEnergy = "mean_energy"
+        case frameCount = "frame_count"
+    }
 }
 
 // MARK: - UI State
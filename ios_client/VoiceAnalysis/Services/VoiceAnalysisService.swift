@@ -19,6 +19,13 @@ class VoiceAnalysisService {
      */
     private let baseURL = "http://192.168.20.100:8000"  // IP của máy Windows chạy server
     
+    /**
+     * Định dạng segments yêu cầu từ server
+     * - "runs": gộp các frame liên tiếp cùng loại (response nhỏ hơn nhiều)
+     * - "frames": mỗi frame một segment (hợp đồng F-S5 gốc)
+     */
+    private let analyzeMode = "runs"
+    
     // MARK: - Singleton
     static let shared = VoiceAnalysisService()
     
@@ -37,7 +44,7 @@ class VoiceAnalysisService {
      */
     func analyzeAudio(fileURL: URL, completion: @escaping (Result<AnalysisResponse, Error>) -> Void) {
         // Tạo URL cho endpoint
-        guard let url = URL(string: "\(baseURL)/analyze/") else {
+        guard let url = URL(string: "\(baseURL)/analyze/?mode=\(analyzeMode)") else {
             completion(.failure(NetworkError.invalidURL))
             return
         }
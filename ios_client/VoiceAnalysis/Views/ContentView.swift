@@ -208,6 +208,8 @@ struct ResultsView: View {
                     .font(.subheadline)
                 Text("📊 Total Segments: \(response.totalSegments)")
                     .font(.subheadline)
+                Text("🎞 Total Frames: \(response.totalFrames ?? response.totalSegments)")
+                    .font(.subheadline)
             }
             .padding(.bottom, 8)
             
@@ -219,7 +221,7 @@ struct ResultsView: View {
                 .padding(.top, 8)
             
             let stats = response.getStatistics()
-            let total = response.totalSegments
+            let total = response.totalFrames ?? response.totalSegments
             
             ForEach(["VOICED", "UNVOICED", "SILENCE"], id: \.self) { type in
                 let count = stats[type] ?? 0
@@ -246,7 +248,7 @@ struct ResultsView: View {
             
             VStack(alignment: .leading, spacing: 4) {
                 ForEach(Array(response.segments.prefix(20).enumerated()), id: \.offset) { _, segment in
-                    Text(formatSegment(segment))
+                    Text(formatSegment(segment, isRun: response.isRuns))
                         .font(.system(.caption2, design: .monospaced))
                 }
                 
@@ -260,9 +262,14 @@ struct ResultsView: View {
         .frame(maxWidth: .infinity, alignment: .leading)
     }
     
-    private func formatSegment(_ segment: Segment) -> String {
+    private func formatSegment(_ segment: Segment, isRun: Bool) -> String {
+        if isRun {
+            return String(format: "%.3f-%.3f | %-10s | F0: %6.2f Hz | E: %.4f | %d frames",
+                         segment.start ?? 0, segment.end ?? 0, segment.type,
+                         segment.meanF0 ?? 0, segment.meanEnergy ?? 0, segment.frameCount ?? 1)
+        }
         return String(format: "%.3f | %-10s | F0: %6.2f Hz | E: %.4f",
-                     segment.time, segment.type, segment.f0, segment.energy)
+                     segment.time ?? 0, segment.type, segment.f0 ?? 0, segment.energy ?? 0)
     }
 }
 
@@ -3,9 +3,173 @@ Mô-đun phân tích âm thanh - Chứa toàn bộ logic nghiệp vụ
 Tuân thủ tiêu chuẩn S-P2: Tách biệt nghiệp vụ khỏi API logic
 """
 
+import inspect
+import io
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+# Cache biên dịch JIT của numba (các kernel pyin/Viterbi, localmax... của
+# librosa) trên đĩa: tiến trình mới (worker khởi động lại, bản deploy mới)
+# nạp mã đã biên dịch thay vì biên dịch lại - lần đầu mất hàng chục giây khi
+# import librosa và vài giây ở lần phân tích đầu tiên. Chỉ được bật trong
+# warm_up() (xem enable_jit_cache), import mô-đun không tạo thư mục nào;
+# NUMBA_CACHE_DIR (nếu có) được ưu tiên, JIT_CACHE_DIR="" để tắt.
+JIT_CACHE_DIR = os.getenv("NUMBA_CACHE_DIR") or os.getenv(
+    "JIT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jit_cache")
+)
+
+# librosa tự nạp module con khi dùng lần đầu (lazy_loader): import ở đây
+# gần như không tốn thời gian; librosa.core (kéo theo numba, scipy) chỉ được
+# nạp ở lần phân tích đầu tiên - hoặc warm-up khi khởi động server
 import librosa
 import numpy as np
-from typing import List, Dict, Any
+import soundfile
+
+from metrics import record_audio, stage
+from typing import (
+    List, Dict, Any, BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Nhãn phân loại frame (F-S4); chỉ số trong tuple chính là mã số của nhãn
+FRAME_TYPES = ("VOICED", "UNVOICED", "SILENCE")
+VOICED, UNVOICED, SILENCE = range(len(FRAME_TYPES))
+
+# Các thuật toán trích xuất F0 được hỗ trợ
+# - pyin: librosa.pyin (chính xác nhất, chậm nhất - giải mã Viterbi)
+# - yin: YIN cổ điển (CMNDF + ngưỡng tuyệt đối), vector hóa bằng FFT
+# - nccf: Normalized cross-correlation, vector hóa bằng FFT (nhanh nhất)
+F0_BACKENDS = ("pyin", "yin", "nccf")
+
+# Định dạng danh sách segments trong kết quả
+# - frames: mỗi frame một segment {time, type, f0, energy} (hợp đồng F-S5)
+# - runs: gộp các frame liên tiếp cùng loại thành một đoạn
+#   {start, end, type, mean_f0, mean_energy, frame_count}
+RESPONSE_MODES = ("frames", "runs")
+
+# Cách chọn ngưỡng năng lượng SILENCE/UNVOICED
+# - fixed: energy_threshold cố định
+# - adaptive: ước lượng từ nền nhiễu của chính bản ghi (xem choose_threshold)
+THRESHOLD_MODES = ("fixed", "adaptive")
+
+# Số frame xử lý mỗi lượt FFT trong yin/nccf (giới hạn bộ nhớ tạm)
+F0_BLOCK_FRAMES = 1024
+
+# Phân tích streaming (analyze_blocks): số frame mỗi khối đọc từ file, và
+# số frame ngữ cảnh thêm mỗi bên cho pyin (giải mã Viterbi trên cả chuỗi)
+STREAM_BLOCK_FRAMES = 4096
+PYIN_CONTEXT_FRAMES = 256
+
+# Phân tích trực tiếp (LiveAnalysis): chỉ các backend xét từng frame độc lập,
+# pyin cần ngữ cảnh Viterbi dài nên độ trễ quá lớn
+LIVE_F0_BACKENDS = ("nccf", "yin")
+
+# Khoảng F0 mặc định (fmin/fmax của AudioAnalyzer)
+# (bằng librosa.note_to_hz, tính trực tiếp để import không phải nạp librosa.core)
+DEFAULT_FMIN = 440.0 * 2.0 ** ((36 - 69) / 12.0)  # note_to_hz('C2') ~65 Hz
+DEFAULT_FMAX = 440.0 * 2.0 ** ((96 - 69) / 12.0)  # note_to_hz('C7') ~2093 Hz
+
+# Tham số mặc định của librosa.pyin, dùng để dựng trước trạng thái pYIN
+PYIN_DEFAULTS = {
+    "n_thresholds": 100,
+    "beta_parameters": (2, 18),
+    "boltzmann_parameter": 2,
+    "resolution": 0.1,
+    "max_transition_rate": 35.92,
+    "switch_prob": 0.01,
+    "no_trough_prob": 0.01
+}
+
+# Giới hạn tham số khung: frame_length trong FRAME_LENGTH_RANGE (samples),
+# hop_length từ MIN_HOP_LENGTH tới frame_length - hop quá nhỏ làm số frame
+# (và chi phí) tăng không giới hạn
+FRAME_LENGTH_RANGE = (64, 16384)
+MIN_HOP_LENGTH = 32
+
+# Mô hình chi phí (AudioAnalyzer.estimate_cost): đo thời gian CPU phân tích
+# COST_PROBE_SECONDS giây tín hiệu mẫu (1/3 có thanh, 1/3 nhiễu, 1/3 im lặng)
+COST_PROBE_SECONDS = 2.0
+COST_REFERENCE_RATE = 16000
+
+# Số analyzer tối đa được giữ trong registry (xem get_analyzer)
+ANALYZER_REGISTRY_SIZE = 16
+
+# Resampling về tần số phân tích chung (AudioAnalyzer.sample_rate): soxr_hq
+# của librosa (nhanh, mặc định của librosa.load). Khi đọc theo khối, mỗi khối
+# đọc thêm RESAMPLE_MARGIN_SECONDS mỗi bên để bộ lọc ở mép khối không ảnh
+# hưởng tới các mẫu được giữ lại
+RESAMPLE_TYPE = "soxr_hq"
+RESAMPLE_MARGIN_SECONDS = 0.05
+
+# Danh sách định dạng file được hỗ trợ (F-S2) - dùng chung cho server và CLI
+SUPPORTED_FORMATS = {'.wav', '.mp3', '.m4a', '.flac', '.ogg'}
+
+# Nguồn âm thanh: đường dẫn file, nội dung file (bytes) hoặc file-like object
+AudioSource = Union[str, bytes, BinaryIO]
+
+
+def load_audio(source: AudioSource) -> Tuple[np.ndarray, int]:
+    """
+    Đọc âm thanh thành tín hiệu mono float32, giữ sample rate gốc
+    
+    Đường dẫn được đọc bằng librosa.load (hỗ trợ cả mp3/m4a qua bộ giải
+    mã ngoài). Bytes/file-like được giải mã trực tiếp trong bộ nhớ bằng
+    soundfile - chỉ hỗ trợ định dạng của libsndfile (wav, flac, ogg).
+    
+    Args:
+        source: Đường dẫn, bytes hoặc file-like object
+        
+    Returns:
+        (y, sr)
+    """
+    with stage("decode"):
+        if isinstance(source, (str, os.PathLike)):
+            return librosa.load(source, sr=None)
+        
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        y, sr = soundfile.read(source, dtype="float32", always_2d=True)
+        return librosa.to_mono(y.T), sr
+
+
+# False sau khi đường pYIN nhanh lỗi một lần (xem _extract_f0_pyin)
+_pyin_fast_path = True
+
+
+@lru_cache(maxsize=None)
+def _pyin_internals() -> Optional[Dict[str, Any]]:
+    """
+    Các hàm nội bộ của librosa.pyin: dùng trực tiếp để ma trận chuyển trạng
+    thái HMM, lưới tần số... chỉ phải dựng một lần (xem _pyin_plan). Từ librosa
+    0.11, CMNDF không còn tham số win_length ("windowed") và phân phối ban đầu
+    đổi thành đều trên mọi trạng thái. Không có các hàm này (None) thì dùng
+    librosa.pyin.
+
+    Import ở lần dùng đầu tiên: librosa.core kéo theo numba và scipy.
+    Chữ ký của các hàm nội bộ có thể đổi giữa các phiên bản librosa: lỗi
+    khi gọi (TypeError/ValueError) cũng chuyển sang librosa.pyin (xem
+    _extract_f0_pyin).
+    """
+    try:
+        from librosa.core import pitch
+        from librosa.sequence import _viterbi
+        cmndf = pitch._cumulative_mean_normalized_difference
+        return {
+            "observations": getattr(pitch, "__pyin_helper"),
+            "cmndf": cmndf,
+            "parabolic": pitch._parabolic_interpolation,
+            "viterbi": _viterbi,
+            "windowed": "win_length" in inspect.signature(cmndf).parameters
+        }
+    except (ImportError, AttributeError):
+        return None
 
 
 class AudioAnalyzer:
@@ -14,26 +178,258 @@ class AudioAnalyzer:
     
     Attributes:
         energy_threshold: Ngưỡng năng lượng để phân biệt SILENCE vs UNVOICED
-        frame_length: Độ dài khung (samples)
-        hop_length: Bước nhảy giữa các khung (samples)
+            (threshold_mode="fixed")
+        threshold_mode: Cách chọn ngưỡng năng lượng (xem THRESHOLD_MODES)
+        sample_rate: Tần số phân tích (Hz) - audio được resample về tần số
+            này trước khi phân tích; None để giữ sample rate gốc
+        frame_length: Độ dài khung (samples, ở tần số phân tích)
+        hop_length: Bước nhảy giữa các khung (samples, ở tần số phân tích)
+        f0_backend: Thuật toán trích xuất F0 (xem F0_BACKENDS)
+        fmin: Tần số F0 nhỏ nhất (Hz)
+        fmax: Tần số F0 lớn nhất (Hz)
+        f0_gating: Chỉ chạy F0 trên các đoạn có năng lượng > ngưỡng
+        gate_padding: Số frame mở rộng mỗi bên của đoạn khi f0_gating
+    
+    frame_ms / hop_ms (tham số khởi tạo, cần sample_rate) cho phép khai báo
+    khung theo mili giây thay cho frame_length / hop_length.
+    
+    Raises (khởi tạo):
+        ValueError: Nếu tham số nằm ngoài giới hạn (xem check_sample_rate)
     """
     
+    # Ngưỡng CMNDF của YIN: frame có cực tiểu thấp hơn ngưỡng là VOICED
+    yin_threshold = 0.15
+    # Ngưỡng tương quan chuẩn hóa của NCCF: đỉnh cao hơn ngưỡng là VOICED
+    nccf_threshold = 0.75
+    # Ngưỡng thích ứng: nền nhiễu là phân vị noise_percentile của RMS các
+    # frame, ngưỡng cao hơn nền nhiễu noise_margin_db (kẹp trong
+    # adaptive_threshold_range); LiveAnalysis theo dõi nền nhiễu trên
+    # noise_window_seconds giây gần nhất
+    noise_percentile = 10.0
+    noise_margin_db = 6.0
+    adaptive_threshold_range = (1e-4, 0.5)
+    noise_window_seconds = 10.0
+    
     def __init__(
         self,
         energy_threshold: float = 0.02,
         frame_length: int = 2048,
-        hop_length: int = 512
+        hop_length: int = 512,
+        f0_backend: str = "pyin",
+        fmin: Optional[float] = None,
+        fmax: Optional[float] = None,
+        f0_gating: bool = False,
+        gate_padding: int = 2,
+        sample_rate: Optional[int] = None,
+        frame_ms: Optional[float] = None,
+        hop_ms: Optional[float] = None,
+        threshold_mode: str = "fixed"
     ):
+        if f0_backend not in F0_BACKENDS:
+            raise ValueError(
+                f"Unknown F0 backend: {f0_backend}. "
+                f"Supported backends: {', '.join(F0_BACKENDS)}"
+            )
+        if threshold_mode not in THRESHOLD_MODES:
+            raise ValueError(
+                f"Unknown threshold mode: {threshold_mode}. "
+                f"Supported modes: {', '.join(THRESHOLD_MODES)}"
+            )
+        if (frame_ms is not None or hop_ms is not None) and not sample_rate:
+            raise ValueError("frame_ms and hop_ms require a fixed sample_rate")
+        if frame_ms is not None:
+            frame_length = int(round(frame_ms * sample_rate / 1000))
+        if hop_ms is not None:
+            hop_length = int(round(hop_ms * sample_rate / 1000))
+        
+        if not 0.0 <= energy_threshold <= 1.0:
+            raise ValueError(
+                f"energy_threshold={energy_threshold} must be between 0 and 1"
+            )
+        if not FRAME_LENGTH_RANGE[0] <= frame_length <= FRAME_LENGTH_RANGE[1]:
+            raise ValueError(
+                f"frame_length={frame_length} must be between "
+                f"{FRAME_LENGTH_RANGE[0]} and {FRAME_LENGTH_RANGE[1]} samples"
+            )
+        if not MIN_HOP_LENGTH <= hop_length <= frame_length:
+            raise ValueError(
+                f"hop_length={hop_length} must be between {MIN_HOP_LENGTH} "
+                f"and frame_length={frame_length} samples"
+            )
+        
+        self.sample_rate = sample_rate or None
         self.energy_threshold = energy_threshold
+        self.threshold_mode = threshold_mode
         self.frame_length = frame_length
         self.hop_length = hop_length
+        self.f0_backend = f0_backend
+        self.fmin = fmin if fmin is not None else DEFAULT_FMIN
+        # fmin mặc định không bị từ chối ở sample rate cao (xem check_sample_rate)
+        self._fmin_requested = fmin is not None
+        self.fmax = fmax if fmax is not None else DEFAULT_FMAX
+        self.f0_gating = f0_gating
+        self.gate_padding = gate_padding
+        # Trạng thái dựng sẵn theo (loại, sample rate): xem _pyin_plan, _lag_plan
+        self._plans: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        
+        if not 0 < self.fmin < self.fmax:
+            raise ValueError(
+                f"fmin={self.fmin:.1f} must be positive and less than fmax={self.fmax:.1f}"
+            )
+        if self.sample_rate is not None:
+            self.check_sample_rate(self.sample_rate)
     
-    def analyze(self, audio_path: str) -> Dict[str, Any]:
+    def check_sample_rate(self, sr: int) -> None:
+        """
+        Kiểm tra fmin/fmax có dùng được ở tần số phân tích sr
+        
+        fmax không vượt quá tần số Nyquist, và chu kỳ của fmin (nếu được
+        yêu cầu rõ ràng) phải nằm trong phần độ trễ của khung (nửa sau
+        frame_length) như YIN yêu cầu. Với fmin mặc định, độ trễ lớn nhất
+        được kẹp trong khung (xem _lag_plan, _pyin_plan) như librosa.pyin,
+        nên audio 88.2/96kHz vẫn phân tích được.
+        
+        Raises:
+            ValueError: Nếu không hợp lệ
+        """
+        if self.fmax > sr / 2:
+            raise ValueError(
+                f"fmax={self.fmax:.1f} cannot exceed the Nyquist frequency "
+                f"{sr / 2:.0f} Hz at sample rate {sr}"
+            )
+        max_lag = self.frame_length - self.frame_length // 2 - 1
+        if self._fmin_requested and np.ceil(sr / self.fmin) > max_lag:
+            raise ValueError(
+                f"fmin={self.fmin:.1f} is too low for frame_length={self.frame_length} "
+                f"at sample rate {sr}: use fmin >= {sr / max_lag:.1f} "
+                f"or frame_length >= {2 * int(np.ceil(sr / self.fmin)) + 2}"
+            )
+    
+    def config(self) -> Dict[str, Any]:
+        """
+        Tham số hiệu lực của analyzer (đã áp dụng giá trị mặc định)
+        
+        Hai analyzer có cùng config cho cùng kết quả trên cùng audio.
+        """
+        return {
+            "energy_threshold": self.energy_threshold,
+            "threshold_mode": self.threshold_mode,
+            "sample_rate": self.sample_rate,
+            "frame_length": self.frame_length,
+            "hop_length": self.hop_length,
+            "f0_backend": self.f0_backend,
+            "fmin": float(self.fmin),
+            "fmax": float(self.fmax),
+            "f0_gating": self.f0_gating,
+            "gate_padding": self.gate_padding
+        }
+    
+    def params(
+        self,
+        sr: int,
+        threshold: Optional[float] = None,
+        noise_floor: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Tham số hiệu lực khi phân tích ở tần số sr - trả về trong kết quả
+        
+        Args:
+            sr: Tần số phân tích
+            threshold: Ngưỡng năng lượng đã dùng (xem choose_threshold)
+            noise_floor: Nền nhiễu đã ước lượng (threshold_mode="adaptive")
+        """
+        params = {**self.config(), "sample_rate": sr}
+        if threshold is not None:
+            params["energy_threshold"] = round(float(threshold), 6)
+        if noise_floor is not None:
+            params["noise_floor"] = round(float(noise_floor), 6)
+        return params
+    
+    def choose_threshold(self, energy: np.ndarray) -> Tuple[float, Optional[float]]:
+        """
+        Ngưỡng năng lượng SILENCE/UNVOICED cho các frame có RMS `energy`
+        
+        threshold_mode="adaptive": nền nhiễu là phân vị noise_percentile
+        của energy (một lượt vector hóa - phần im lặng/nhiễu nền của bản ghi
+        nằm ở các frame thấp nhất), ngưỡng = nền nhiễu + noise_margin_db.
+        Nhờ vậy bản ghi nhỏ tiếng hoặc nhiều nhiễu nền vẫn phân loại đúng,
+        điều một ngưỡng cố định không làm được.
+        
+        Returns:
+            (ngưỡng, nền nhiễu) - nền nhiễu là None khi dùng energy_threshold
+            (threshold_mode="fixed" hoặc không có frame nào)
+        """
+        if self.threshold_mode == "fixed" or len(energy) == 0:
+            return self.energy_threshold, None
+        
+        noise_floor = float(np.percentile(energy, self.noise_percentile))
+        threshold = noise_floor * 10 ** (self.noise_margin_db / 20)
+        return float(np.clip(threshold, *self.adaptive_threshold_range)), noise_floor
+    
+    def file_threshold(self, audio: soundfile.SoundFile) -> Tuple[float, Optional[float]]:
+        """
+        Ngưỡng (xem choose_threshold) của cả file đang mở
+        
+        Với threshold_mode="adaptive", chỉ tính energy theo từng khối
+        STREAM_BLOCK_FRAMES frame (không chạy F0) - cùng giá trị như
+        analyze_columns, để analyze_frame_range trên từng khối dùng chung
+        một ngưỡng của cả file.
+        """
+        if self.threshold_mode == "fixed":
+            return self.energy_threshold, None
+        
+        total_frames = self.frame_count(audio.frames, audio.samplerate)
+        margin = -(-(self.frame_length // 2) // self.hop_length)
+        energy = []
+        for first in range(0, total_frames, STREAM_BLOCK_FRAMES):
+            last = min(first + STREAM_BLOCK_FRAMES, total_frames)
+            y, start_frame = self._read_frames(audio, first, last, margin)
+            offset = first - start_frame
+            energy.append(self._extract_energy(y)[offset:offset + last - first])
+        return self.choose_threshold(np.concatenate(energy))
+    
+    def estimate_cost(self, sr: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ước lượng chi phí phân tích: số giây CPU cho mỗi giây audio
+        
+        Đo thời gian CPU (của luồng hiện tại) khi phân tích tín hiệu mẫu
+        COST_PROBE_SECONDS giây ở tần số sr, sau một lần chạy làm nóng.
+        Kết quả được giữ lại cho mỗi sr. Không tính giải mã và resample.
+        
+        Args:
+            sr: Tần số phân tích (mặc định sample_rate, hoặc
+                COST_REFERENCE_RATE nếu analyzer giữ sample rate gốc)
+        """
+        sr = sr or self.sample_rate or COST_REFERENCE_RATE
+        plan = self._plans.get(("cost", sr))
+        if plan is None:
+            self.check_sample_rate(sr)
+            probe = _cost_probe(sr)
+            self.analyze_signal(probe[:sr // 4], sr)  # làm nóng: JIT, _pyin_plan...
+            start = time.thread_time()
+            self.analyze_signal(probe, sr)
+            elapsed = time.thread_time() - start
+            plan = {
+                "sample_rate": sr,
+                "frames_per_second": sr / self.hop_length,
+                "cpu_seconds_per_audio_second": elapsed / COST_PROBE_SECONDS
+            }
+            self._plans[("cost", sr)] = plan
+        return dict(plan)
+    
+    def analyze(
+        self,
+        audio_path: AudioSource,
+        filename: Optional[str] = None,
+        mode: str = "frames"
+    ) -> Dict[str, Any]:
         """
         Phân tích file âm thanh và trả về kết quả theo hợp đồng F-S5
         
         Args:
-            audio_path: Đường dẫn đến file âm thanh
+            audio_path: Đường dẫn, bytes hoặc file-like object (xem load_audio)
+            filename: Tên file trong kết quả (mặc định: tên của đường dẫn)
+            mode: Định dạng segments (xem RESPONSE_MODES)
             
         Returns:
             Dict chứa kết quả phân tích theo chuẩn JSON contract
@@ -41,28 +437,349 @@ class AudioAnalyzer:
         Raises:
             Exception: Nếu có lỗi trong quá trình phân tích
         """
-        # Load file âm thanh
-        y, sr = librosa.load(audio_path, sr=None)
+        if mode not in RESPONSE_MODES:
+            raise ValueError(
+                f"Unknown response mode: {mode}. "
+                f"Supported modes: {', '.join(RESPONSE_MODES)}"
+            )
         
-        # Tính toán Pitch (F0) - Tần số cơ bản
-        f0 = self._extract_f0(y, sr)
+        result = self.analyze_columns(audio_path, filename)
+        columns = result.pop("columns")
+        sr = result.pop("sample_rate")
         
-        # Tính toán Energy (RMS)
+        if mode == "runs":
+            with stage("segments"):
+                runs = self._columns_to_runs(columns, sr)
+            return {
+                "filename": result["filename"],
+                "mode": "runs",
+                "total_segments": len(runs),
+                "total_frames": result["total_segments"],
+                "params": result["params"],
+                "segments": runs
+            }
+        
+        # Tạo response theo hợp đồng F-S5
+        with stage("segments"):
+            result["segments"] = self._columns_to_segments(columns)
+        return result
+    
+    def analyze_columns(
+        self,
+        audio_path: AudioSource,
+        filename: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Phân tích file âm thanh và trả về kết quả dạng cột (NumPy arrays)
+        
+        Không tạo dict cho từng frame - dùng cho các đường xử lý cần
+        hiệu năng (file dài, định dạng response khác F-S5).
+        
+        Args:
+            audio_path: Đường dẫn, bytes hoặc file-like object (xem load_audio)
+            filename: Tên file trong kết quả (mặc định: tên của đường dẫn)
+            
+        Returns:
+            Dict gồm filename, total_segments, sample_rate, params (xem
+            params) và columns (xem _classify_columns)
+        """
+        # Load file âm thanh, resample về tần số phân tích
+        y, sr = self.resample(*load_audio(audio_path))
+        self.check_sample_rate(sr)
+        record_audio(len(y) / sr)
         energy = self._extract_energy(y)
+        threshold, noise_floor = self.choose_threshold(energy)
+        columns = self._analyze_energy(y, sr, energy, threshold)
         
-        # Phân loại từng frame
-        segments = self._classify_frames(f0, energy, sr)
+        if filename is None:
+            filename = "audio"
+            if isinstance(audio_path, (str, os.PathLike)):
+                filename = str(audio_path).split('/')[-1].split('\\')[-1]
         
-        # Tạo response theo hợp đồng F-S5
         return {
-            "filename": audio_path.split('/')[-1].split('\\')[-1],
-            "total_segments": len(segments),
-            "segments": segments
+            "filename": filename,
+            "total_segments": len(columns["time"]),
+            "sample_rate": sr,
+            "params": self.params(sr, threshold, noise_floor),
+            "columns": columns
         }
     
+    def analyze_blocks(
+        self,
+        audio_path: AudioSource,
+        block_frames: int = STREAM_BLOCK_FRAMES
+    ) -> Iterator[Dict[str, np.ndarray]]:
+        """
+        Phân tích streaming: đọc file theo từng khối bằng soundfile, chỉ giữ
+        một khối trong bộ nhớ nên bộ nhớ đỉnh không phụ thuộc độ dài file
+        
+        Mỗi khối được đọc thêm _stream_margin() frame mỗi bên, nên frame
+        ở biên khối thấy đúng các mẫu như khi phân tích cả file: yin/nccf
+        và energy cho kết quả giống hệt analyze_columns. Với pyin, giải mã
+        Viterbi phụ thuộc cả chuỗi - PYIN_CONTEXT_FRAMES frame ngữ cảnh
+        làm kết quả trùng batch trong thực tế nhưng không được bảo đảm.
+        
+        Định dạng libsndfile không đọc được (mp3/m4a tùy phiên bản) được
+        load toàn bộ rồi chia khối - đúng kết quả nhưng không giới hạn bộ nhớ.
+        
+        Args:
+            audio_path: Đường dẫn, bytes hoặc file-like object
+            block_frames: Số frame mỗi khối
+            
+        Yields:
+            Các cột (xem _classify_columns) của từng khối frame liên tiếp
+        """
+        if isinstance(audio_path, (bytes, bytearray, memoryview)):
+            audio_path = io.BytesIO(audio_path)
+        
+        try:
+            audio = soundfile.SoundFile(audio_path)
+        except RuntimeError:
+            if not isinstance(audio_path, (str, os.PathLike)):
+                raise
+            columns = self.analyze_columns(audio_path)["columns"]
+            for first in range(0, len(columns["time"]), block_frames):
+                yield {
+                    name: values[first:first + block_frames]
+                    for name, values in columns.items()
+                }
+            return
+        
+        with audio:
+            threshold, _ = self.file_threshold(audio)
+            total_frames = self.frame_count(audio.frames, audio.samplerate)
+            for first in range(0, total_frames, block_frames):
+                last = min(first + block_frames, total_frames)
+                yield self.analyze_frame_range(audio, first, last, threshold)
+    
+    def analyze_frame_range(
+        self,
+        audio: soundfile.SoundFile,
+        first: int,
+        last: int,
+        threshold: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Phân tích các frame [first, last) của file đang mở
+        
+        Chỉ đọc đoạn mẫu cần thiết (cộng _stream_margin() frame mỗi bên),
+        kết quả giống hệt phần tương ứng của analyze_columns.
+        
+        Args:
+            audio: File đang mở
+            first: Frame đầu
+            last: Frame cuối (không tính)
+            threshold: Ngưỡng năng lượng của cả file (xem file_threshold);
+                None thì chọn theo riêng đoạn được đọc
+        
+        Returns:
+            Các cột (xem _classify_columns) của last - first frame
+        """
+        sr = self.analysis_rate(audio.samplerate)
+        self.check_sample_rate(sr)
+        y, start_frame = self._read_frames(audio, first, last, self._stream_margin())
+        record_audio((last - first) * self.hop_length / sr)
+        columns = self.analyze_signal(y, sr, first_frame=start_frame, threshold=threshold)
+        offset = first - start_frame
+        return {
+            name: values[offset:offset + last - first]
+            for name, values in columns.items()
+        }
+    
+    def _read_frames(
+        self,
+        audio: soundfile.SoundFile,
+        first: int,
+        last: int,
+        margin: int
+    ) -> Tuple[np.ndarray, int]:
+        """
+        Đọc các mẫu của frame [first, last) cộng margin frame mỗi bên
+        
+        Returns:
+            (mẫu ở tần số phân tích, chỉ số frame của mẫu đầu tiên)
+        """
+        # Khối mẫu bắt đầu đúng tại một frame để thẳng hàng với batch
+        start_frame = max(0, first - margin)
+        start = start_frame * self.hop_length
+        stop = min(
+            self._signal_length(audio.frames, audio.samplerate),
+            (last + margin) * self.hop_length
+        )
+        return self._read_span(audio, start, stop), start_frame
+    
+    def count_frames(self, audio_path: str) -> Optional[int]:
+        """
+        Số frame của file (đọc header, không giải mã audio)
+        
+        Returns:
+            Số frame, hoặc None nếu libsndfile không đọc được file - khi đó
+            không phân tích được theo khối bằng analyze_frame_range
+        """
+        try:
+            info = soundfile.info(audio_path)
+        except RuntimeError:
+            return None
+        return self.frame_count(info.frames, info.samplerate)
+    
+    def analysis_rate(self, sr: int) -> int:
+        """Tần số phân tích của một nguồn có sample rate gốc sr"""
+        return self.sample_rate or sr
+    
+    def resample(self, y: np.ndarray, sr: int) -> Tuple[np.ndarray, int]:
+        """
+        Resample tín hiệu về tần số phân tích (giữ nguyên nếu đã đúng)
+        
+        Returns:
+            (y, sr) ở tần số phân tích
+        """
+        target = self.analysis_rate(sr)
+        if target == sr:
+            return y, sr
+        with stage("resample"):
+            y = librosa.resample(y, orig_sr=sr, target_sr=target, res_type=RESAMPLE_TYPE)
+        return y, target
+    
+    def frame_count(self, frames: int, sr: int) -> int:
+        """Số frame phân tích của nguồn có `frames` mẫu ở sample rate gốc sr"""
+        return 1 + self._signal_length(frames, sr) // self.hop_length
+    
+    def _signal_length(self, frames: int, sr: int) -> int:
+        """Số mẫu sau khi resample (cùng công thức với librosa.resample)"""
+        target = self.analysis_rate(sr)
+        if target == sr:
+            return frames
+        return int(np.ceil(frames * (float(target) / sr)))
+    
+    def _read_span(self, audio: soundfile.SoundFile, start: int, stop: int) -> np.ndarray:
+        """
+        Đọc các mẫu [start, stop) ở tần số phân tích từ file đang mở
+        
+        Khi cần resample, đoạn đọc được mở rộng RESAMPLE_MARGIN_SECONDS mỗi
+        bên và bắt đầu tại một điểm mà lưới mẫu gốc và lưới mẫu phân tích
+        trùng nhau (mỗi `down` mẫu gốc ứng với đúng `up` mẫu phân tích), nên
+        các mẫu trả về khớp với resample cả file (sai khác ở mức làm tròn).
+        """
+        sr = audio.samplerate
+        target = self.analysis_rate(sr)
+        if target == sr:
+            with stage("decode"):
+                audio.seek(start)
+                y = audio.read(stop - start, dtype="float32", always_2d=True)
+                return librosa.to_mono(y.T)
+        
+        common = math.gcd(sr, target)
+        up, down = target // common, sr // common
+        pad = -(-int(sr * RESAMPLE_MARGIN_SECONDS) // down)
+        first_period = max(0, start // up - pad)
+        last_period = -(-stop // up) + pad
+        native_start = first_period * down
+        native_stop = min(audio.frames, last_period * down)
+        
+        with stage("decode"):
+            audio.seek(native_start)
+            y = audio.read(native_stop - native_start, dtype="float32", always_2d=True)
+            y = librosa.to_mono(y.T)
+        y, _ = self.resample(y, sr)
+        offset = start - first_period * up
+        return y[offset:offset + stop - start]
+    
+    def iter_segments(
+        self,
+        audio_path: AudioSource,
+        block_frames: int = STREAM_BLOCK_FRAMES
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Như analyze_blocks nhưng trả về lần lượt từng segment F-S5
+        {time, type, f0, energy} ngay khi khối chứa nó được phân tích
+        """
+        for columns in self.analyze_blocks(audio_path, block_frames):
+            yield from self._columns_to_segments(columns)
+    
+    def iter_runs(
+        self,
+        blocks: Iterable[Dict[str, np.ndarray]],
+        sr: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Gộp các khối cột liên tiếp (vd. từ analyze_blocks) thành runs
+        
+        Yields:
+            List các đoạn đã hoàn chỉnh sau mỗi khối (có thể rỗng), cuối
+            cùng là đoạn còn lại (xem RunAccumulator)
+        """
+        accumulator = RunAccumulator(self, sr)
+        for columns in blocks:
+            yield accumulator.push(columns)
+        yield accumulator.flush()
+    
+    def _stream_margin(self) -> int:
+        """
+        Số frame đọc thêm mỗi bên khối trong analyze_blocks
+        
+        Nửa frame (làm tròn lên theo hop) để cửa sổ của frame biên nằm
+        trọn trong khối, gấp đôi khi f0_gating (biên đoạn sai ở mép khối
+        không được chạm tới frame được giữ lại) cộng gate_padding.
+        """
+        half = -(-(self.frame_length // 2) // self.hop_length)
+        margin = half
+        if self.f0_gating:
+            margin += half + self.gate_padding
+        if self.f0_backend == "pyin":
+            margin += PYIN_CONTEXT_FRAMES
+        return margin
+    
+    def analyze_signal(
+        self,
+        y: np.ndarray,
+        sr: int,
+        first_frame: int = 0,
+        threshold: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Phân tích tín hiệu đã được load vào bộ nhớ
+        
+        Args:
+            y: Audio time series (mono), đã ở tần số phân tích (xem resample)
+            sr: Sample rate
+            first_frame: Chỉ số frame (trong cả file) của mẫu đầu tiên của y
+            threshold: Ngưỡng năng lượng (mặc định: choose_threshold trên y)
+            
+        Returns:
+            Các cột kết quả (xem _classify_columns)
+        """
+        # Tính toán Energy (RMS)
+        energy = self._extract_energy(y)
+        if threshold is None:
+            threshold, _ = self.choose_threshold(energy)
+        return self._analyze_energy(y, sr, energy, threshold, first_frame)
+    
+    def _analyze_energy(
+        self,
+        y: np.ndarray,
+        sr: int,
+        energy: np.ndarray,
+        threshold: float,
+        first_frame: int = 0
+    ) -> Dict[str, np.ndarray]:
+        """Phần còn lại của analyze_signal khi đã có energy và ngưỡng"""
+        # Tính toán Pitch (F0) - Tần số cơ bản
+        with stage("f0"):
+            if self.f0_gating:
+                f0 = self._extract_f0_gated(y, sr, energy, threshold)
+            else:
+                f0 = self._extract_f0(y, sr)
+        
+        # Phân loại toàn bộ frame trong một lượt vector hóa
+        with stage("classify"):
+            return self._classify_columns(f0, energy, sr, first_frame, threshold)
+    
     def _extract_f0(self, y: np.ndarray, sr: int) -> np.ndarray:
         """
-        Trích xuất tần số cơ bản (F0/Pitch) sử dụng librosa
+        Trích xuất tần số cơ bản (F0/Pitch) bằng thuật toán f0_backend
+        
+        Mọi backend đều trả về cùng số frame (center=True) như
+        _extract_energy, giá trị 0 cho frame không có F0.
         
         Args:
             y: Audio time series
@@ -71,20 +788,359 @@ class AudioAnalyzer:
         Returns:
             Array chứa giá trị F0 cho từng frame
         """
+        if self.f0_backend == "yin":
+            return self._extract_f0_lag_domain(y, sr, self._pick_yin_lag)
+        if self.f0_backend == "nccf":
+            return self._extract_f0_lag_domain(y, sr, self._pick_nccf_lag)
+        return self._extract_f0_pyin(y, sr)
+    
+    def _extract_f0_gated(
+        self,
+        y: np.ndarray,
+        sr: int,
+        energy: np.ndarray,
+        threshold: Optional[float] = None
+    ) -> np.ndarray:
+        """
+        Chỉ trích xuất F0 trên các đoạn có năng lượng > ngưỡng
+        
+        Frame im lặng không cần F0 (quy tắc F-S4 vẫn cho ra SILENCE nếu
+        không có F0), nên chi phí pitch tracking tỉ lệ với phần có tiếng.
+        
+        Args:
+            y: Audio time series
+            sr: Sample rate
+            energy: Kết quả _extract_energy(y)
+            threshold: Ngưỡng năng lượng (mặc định energy_threshold)
+            
+        Returns:
+            Array F0 đủ độ dài, thẳng hàng với energy (0 ngoài các đoạn)
+        """
+        f0 = np.zeros(len(energy))
+        
+        for first, last in self._active_spans(energy, threshold):
+            # Đoạn mẫu có frame đầu/cuối trùng tâm với frame first/last
+            span = y[first * self.hop_length:last * self.hop_length + 1]
+            span_f0 = self._extract_f0(span, sr)
+            f0[first:first + len(span_f0)] = span_f0[:last + 1 - first]
+        
+        return f0
+    
+    def _active_spans(
+        self,
+        energy: np.ndarray,
+        threshold: Optional[float] = None
+    ) -> List[Tuple[int, int]]:
+        """
+        Tìm các đoạn frame liên tiếp có năng lượng > threshold (mặc định
+        energy_threshold), mở rộng gate_padding frame mỗi bên (các đoạn
+        chạm nhau được gộp)
+        
+        Returns:
+            List (frame đầu, frame cuối) - tính cả hai đầu
+        """
+        if threshold is None:
+            threshold = self.energy_threshold
+        active = energy > threshold
+        if self.gate_padding > 0:
+            kernel = np.ones(2 * self.gate_padding + 1)
+            active = np.convolve(active, kernel, mode="same") > 0
+        
+        edges = np.diff(np.concatenate([[0], active.astype(np.int8), [0]]))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1) - 1
+        return list(zip(starts.tolist(), ends.tolist()))
+    
+    def _extract_f0_pyin(self, y: np.ndarray, sr: int) -> np.ndarray:
+        """
+        Trích xuất F0 bằng pYIN - cùng kết quả với librosa.pyin, nhưng
+        trạng thái không phụ thuộc tín hiệu được dựng một lần (_pyin_plan)
+        
+        Đường nhanh dùng hàm nội bộ của librosa; nếu không có hoặc chữ ký đã
+        đổi (TypeError/ValueError), dùng librosa.pyin cho mọi lần gọi sau.
+        """
+        global _pyin_fast_path
+        pyin = _pyin_internals() if _pyin_fast_path else None
+        if pyin is not None:
+            try:
+                return self._extract_f0_pyin_internal(y, sr, pyin)
+            except (TypeError, ValueError) as e:
+                logger.warning(
+                    f"librosa pYIN internals failed ({type(e).__name__}: {e}), "
+                    f"falling back to librosa.pyin"
+                )
+                _pyin_fast_path = False
+        
         f0, voiced_flag, voiced_probs = librosa.pyin(
             y,
-            fmin=librosa.note_to_hz('C2'),  # ~65 Hz
-            fmax=librosa.note_to_hz('C7'),  # ~2093 Hz
+            fmin=self.fmin,
+            fmax=self.fmax,
             sr=sr,
             frame_length=self.frame_length,
             hop_length=self.hop_length
         )
-        
         # Thay thế NaN bằng 0
-        f0 = np.nan_to_num(f0, nan=0.0)
+        return np.nan_to_num(f0, nan=0.0)
+    
+    def _extract_f0_pyin_internal(
+        self,
+        y: np.ndarray,
+        sr: int,
+        pyin: Dict[str, Any]
+    ) -> np.ndarray:
+        """pYIN qua các hàm nội bộ của librosa (xem _pyin_internals)"""
+        plan = self._pyin_plan(sr, pyin["windowed"])
+        
+        # Pad giống librosa (center=True) để frame thẳng hàng với RMS
+        y = np.pad(y, self.frame_length // 2, mode="constant")
+        frames = librosa.util.frame(
+            y,
+            frame_length=self.frame_length,
+            hop_length=self.hop_length
+        )
+        
+        if pyin["windowed"]:
+            yin_frames = pyin["cmndf"](
+                frames, self.frame_length, self.frame_length // 2,
+                plan["min_period"], plan["max_period"]
+            )
+        else:
+            yin_frames = pyin["cmndf"](frames, plan["min_period"], plan["max_period"])
+        shifts = pyin["parabolic"](yin_frames)
+        
+        observation_probs, _ = pyin["observations"](
+            yin_frames,
+            shifts,
+            sr,
+            plan["thresholds"],
+            PYIN_DEFAULTS["boltzmann_parameter"],
+            plan["beta_probs"],
+            PYIN_DEFAULTS["no_trough_prob"],
+            plan["min_period"],
+            self.fmin,
+            plan["n_pitch_bins"],
+            plan["n_bins_per_semitone"]
+        )
+        
+        # Giải mã Viterbi với log xác suất chuyển trạng thái đã tính sẵn
+        log_prob = np.log(observation_probs[0] + plan["epsilon"])
+        states, _ = pyin["viterbi"](log_prob.T, plan["log_transition"], plan["log_p_init"])
+        
+        n_pitch_bins = plan["n_pitch_bins"]
+        return np.where(states < n_pitch_bins, plan["freqs"][states % n_pitch_bins], 0.0)
+    
+    def _pyin_plan(self, sr: int, windowed: bool) -> Dict[str, Any]:
+        """
+        Trạng thái pYIN chỉ phụ thuộc cấu hình và sample rate: khoảng chu kỳ,
+        phân phối ngưỡng, lưới tần số và ma trận chuyển trạng thái HMM (dạng
+        log) - tính lần đầu rồi dùng lại cho mọi lần gọi sau
+
+        Args:
+            windowed: CMNDF của librosa còn tham số win_length (trước 0.11)
+        """
+        plan = self._plans.get(("pyin", sr))
+        if plan is not None:
+            return plan
+        
+        from scipy.stats import beta
+        
+        min_period = int(np.floor(sr / self.fmax))
+        max_period = min(int(np.ceil(sr / self.fmin)), self.frame_length - 1)
+        if windowed:
+            max_period = min(max_period, self.frame_length - self.frame_length // 2 - 1)
+        
+        thresholds = np.linspace(0, 1, PYIN_DEFAULTS["n_thresholds"] + 1)
+        beta_cdf = beta.cdf(thresholds, *PYIN_DEFAULTS["beta_parameters"])
+        
+        n_bins_per_semitone = int(np.ceil(1.0 / PYIN_DEFAULTS["resolution"]))
+        n_pitch_bins = int(np.floor(
+            12 * n_bins_per_semitone * np.log2(self.fmax / self.fmin)
+        )) + 1
+        
+        # Chuyển trong cùng trạng thái voiced/unvoiced: tối đa
+        # max_transition_rate nửa cung mỗi giây; đổi trạng thái: switch_prob
+        max_semitones_per_frame = round(
+            PYIN_DEFAULTS["max_transition_rate"] * 12 * self.hop_length / sr
+        )
+        transition = librosa.sequence.transition_local(
+            n_pitch_bins,
+            max_semitones_per_frame * n_bins_per_semitone + 1,
+            window="triangle",
+            wrap=False
+        )
+        switch = librosa.sequence.transition_loop(2, 1 - PYIN_DEFAULTS["switch_prob"])
+        transition = np.kron(switch, transition)
+        
+        if windowed:
+            p_init = np.zeros(2 * n_pitch_bins)
+            p_init[n_pitch_bins:] = 1 / n_pitch_bins
+        else:
+            p_init = np.ones(2 * n_pitch_bins) / (2 * n_pitch_bins)
+        
+        epsilon = np.finfo(np.float64).tiny
+        plan = {
+            "min_period": min_period,
+            "max_period": max_period,
+            "thresholds": thresholds,
+            "beta_probs": np.diff(beta_cdf),
+            "n_bins_per_semitone": n_bins_per_semitone,
+            "n_pitch_bins": n_pitch_bins,
+            "freqs": self.fmin * 2 ** (
+                np.arange(n_pitch_bins) / (12 * n_bins_per_semitone)
+            ),
+            "epsilon": epsilon,
+            "log_transition": np.log(transition + epsilon),
+            "log_p_init": np.log(p_init + epsilon)
+        }
+        self._plans[("pyin", sr)] = plan
+        return plan
+    
+    def _extract_f0_lag_domain(
+        self,
+        y: np.ndarray,
+        sr: int,
+        pick_lag
+    ) -> np.ndarray:
+        """
+        Khung chung cho YIN/NCCF: chia frame giống pyin, tính tương quan
+        bằng FFT theo từng khối frame rồi chọn chu kỳ bằng pick_lag
+        
+        Args:
+            y: Audio time series
+            sr: Sample rate
+            pick_lag: Hàm (corr, energy_0, energy_lag, min_lag) -> (lag, voiced)
+            
+        Returns:
+            Array chứa giá trị F0 cho từng frame
+        """
+        plan = self._lag_plan(sr)
+        win_length = plan["win_length"]
+        min_lag = plan["min_lag"]
+        max_lag = plan["max_lag"]
+        n_fft = plan["n_fft"]
+        lags = plan["lags"]
+        
+        # Pad giống librosa (center=True) để frame thẳng hàng với RMS
+        y = np.pad(y, self.frame_length // 2, mode="constant")
+        frames = librosa.util.frame(
+            y,
+            frame_length=self.frame_length,
+            hop_length=self.hop_length
+        ).T
+        
+        f0 = np.zeros(len(frames))
+        
+        for start in range(0, len(frames), F0_BLOCK_FRAMES):
+            block = np.asarray(frames[start:start + F0_BLOCK_FRAMES], dtype=np.float64)
+            
+            # corr[t, lag] = sum_j x[j] * x[j + lag], j < win_length
+            spectrum = np.fft.rfft(block, n=n_fft, axis=1)
+            window_spectrum = np.fft.rfft(block[:, :win_length], n=n_fft, axis=1)
+            corr = np.fft.irfft(
+                spectrum * np.conj(window_spectrum), n=n_fft, axis=1
+            )[:, :max_lag + 1]
+            
+            # Năng lượng của cửa sổ dịch theo từng độ trễ
+            squares = np.cumsum(block ** 2, axis=1)
+            squares = np.concatenate([np.zeros((len(block), 1)), squares], axis=1)
+            energy_lag = squares[:, lags + win_length] - squares[:, lags]
+            energy_0 = energy_lag[:, :1]
+            
+            lag, voiced = pick_lag(corr, energy_0, energy_lag, min_lag)
+            f0[start:start + len(block)] = np.where(
+                voiced, sr / np.maximum(lag, 1.0), 0.0
+            )
         
         return f0
     
+    def _lag_plan(self, sr: int) -> Dict[str, Any]:
+        """Khoảng độ trễ và kích thước FFT của YIN/NCCF (tính một lần mỗi sr)"""
+        plan = self._plans.get(("lag", sr))
+        if plan is None:
+            # Cửa sổ tích phân bằng nửa frame, phần còn lại dành cho độ trễ
+            win_length = self.frame_length // 2
+            max_lag = min(
+                int(np.ceil(sr / self.fmin)),
+                self.frame_length - win_length - 1
+            )
+            plan = {
+                "win_length": win_length,
+                "min_lag": max(1, int(np.floor(sr / self.fmax))),
+                "max_lag": max_lag,
+                "n_fft": 1 << int(np.ceil(np.log2(self.frame_length + win_length))),
+                "lags": np.arange(max_lag + 1)
+            }
+            self._plans[("lag", sr)] = plan
+        return plan
+    
+    def _pick_yin_lag(self, corr, energy_0, energy_lag, min_lag):
+        """
+        YIN: hàm sai phân chuẩn hóa tích lũy (CMNDF), chọn độ trễ đầu tiên
+        là cực tiểu cục bộ dưới yin_threshold
+        """
+        diff = np.maximum(energy_0 + energy_lag - 2 * corr, 0.0)
+        cumulative = np.cumsum(diff[:, 1:], axis=1)
+        lags = np.arange(1, diff.shape[1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cmndf = diff[:, 1:] * lags / cumulative
+        cmndf = np.where(cumulative > 1e-12, cmndf, 1.0)
+        cmndf = np.concatenate([np.ones((len(cmndf), 1)), cmndf], axis=1)
+        
+        return self._first_local_extremum(
+            cmndf, cmndf < self.yin_threshold, min_lag, minimum=True
+        )
+    
+    def _pick_nccf_lag(self, corr, energy_0, energy_lag, min_lag):
+        """
+        NCCF: tương quan chuẩn hóa, chọn đỉnh cục bộ đầu tiên đạt ít nhất
+        95% đỉnh lớn nhất (tránh lỗi quãng tám) và vượt nccf_threshold
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            nccf = corr / np.sqrt(energy_0 * energy_lag)
+        nccf = np.where(energy_0 * energy_lag > 1e-12, nccf, 0.0)
+        
+        peak = nccf[:, min_lag:].max(axis=1, keepdims=True)
+        candidates = (nccf >= 0.95 * peak) & (peak > self.nccf_threshold)
+        return self._first_local_extremum(nccf, candidates, min_lag, minimum=False)
+    
+    @staticmethod
+    def _first_local_extremum(curve, candidates, min_lag, minimum):
+        """
+        Tìm độ trễ đầu tiên (>= min_lag) là cực trị cục bộ thuộc candidates,
+        tinh chỉnh bằng nội suy parabol
+        
+        Returns:
+            (lag, voiced): độ trễ thực (samples) và cờ có F0 cho từng frame
+        """
+        center = curve[:, 1:-1]
+        if minimum:
+            extremum = (center <= curve[:, :-2]) & (center < curve[:, 2:])
+        else:
+            extremum = (center >= curve[:, :-2]) & (center > curve[:, 2:])
+        
+        mask = np.zeros_like(candidates)
+        mask[:, 1:-1] = extremum & candidates[:, 1:-1]
+        mask[:, :min_lag] = False
+        
+        voiced = mask.any(axis=1)
+        index = np.where(voiced, mask.argmax(axis=1), 1)
+        
+        # Nội suy parabol quanh cực trị để có độ trễ lẻ
+        rows = np.arange(len(curve))
+        left = curve[rows, index - 1]
+        middle = curve[rows, index]
+        right = curve[rows, np.minimum(index + 1, curve.shape[1] - 1)]
+        denominator = left - 2 * middle + right
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shift = np.where(
+                np.abs(denominator) > 1e-12,
+                0.5 * (left - right) / denominator,
+                0.0
+            )
+        lag = index + np.clip(shift, -1.0, 1.0)
+        
+        return lag, voiced
+    
     def _extract_energy(self, y: np.ndarray) -> np.ndarray:
         """
         Trích xuất năng lượng (RMS - Root Mean Square)
@@ -95,11 +1151,12 @@ class AudioAnalyzer:
         Returns:
             Array chứa giá trị năng lượng cho từng frame
         """
-        rms = librosa.feature.rms(
-            y=y,
-            frame_length=self.frame_length,
-            hop_length=self.hop_length
-        )[0]
+        with stage("energy"):
+            rms = librosa.feature.rms(
+                y=y,
+                frame_length=self.frame_length,
+                hop_length=self.hop_length
+            )[0]
         
         return rms
     
@@ -123,49 +1180,507 @@ class AudioAnalyzer:
         Returns:
             List các segment theo hợp đồng F-S5
         """
-        segments = []
+        columns = self._classify_columns(f0, energy, sr)
+        return self._columns_to_segments(columns)
+    
+    def _classify_columns(
+        self,
+        f0: np.ndarray,
+        energy: np.ndarray,
+        sr: int,
+        first_frame: int = 0,
+        threshold: Optional[float] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Phân loại toàn bộ frame bằng phép toán trên mảng (quy tắc F-S4)
         
+        Args:
+            f0: Array tần số cơ bản
+            energy: Array năng lượng
+            sr: Sample rate
+            first_frame: Chỉ số frame của phần tử đầu tiên (tính thời gian)
+            threshold: Ngưỡng năng lượng (mặc định energy_threshold)
+            
+        Returns:
+            Dict các cột cùng độ dài:
+            - time: thời điểm frame (giây, làm tròn 3 chữ số)
+            - type: mã nhãn uint8, chỉ số vào FRAME_TYPES
+            - f0: F0 (Hz, làm tròn 2 chữ số)
+            - energy: RMS (làm tròn 4 chữ số)
+        """
         # Đảm bảo cả hai array có cùng độ dài
         min_length = min(len(f0), len(energy))
+        f0 = np.asarray(f0[:min_length], dtype=np.float64)
+        energy = np.asarray(energy[:min_length], dtype=np.float64)
         
-        for i in range(min_length):
-            # Tính thời gian của frame (giây)
-            time = librosa.frames_to_time(
-                i,
-                sr=sr,
-                hop_length=self.hop_length
-            )
-            
-            current_f0 = float(f0[i])
-            current_energy = float(energy[i])
+        # Tính thời gian của tất cả frame (giây)
+        times = librosa.frames_to_time(
+            np.arange(first_frame, first_frame + min_length),
+            sr=sr,
+            hop_length=self.hop_length
+        )
+        
+        # Phân loại theo quy tắc F-S4
+        if threshold is None:
+            threshold = self.energy_threshold
+        types = np.full(min_length, SILENCE, dtype=np.uint8)
+        types[energy > threshold] = UNVOICED
+        types[f0 > 0] = VOICED
+        
+        return {
+            "time": np.round(times, 3),
+            "type": types,
+            "f0": np.round(f0, 2),
+            "energy": np.round(energy, 4)
+        }
+    
+    @staticmethod
+    def _columns_to_segments(
+        columns: Dict[str, np.ndarray]
+    ) -> List[Dict[str, Any]]:
+        """
+        Chuyển kết quả dạng cột sang list segment theo hợp đồng F-S5
+        
+        Args:
+            columns: Kết quả của _classify_columns
             
-            # Phân loại theo quy tắc F-S4
-            if current_f0 > 0:
-                frame_type = "VOICED"
-            elif current_energy > self.energy_threshold:
-                frame_type = "UNVOICED"
-            else:
-                frame_type = "SILENCE"
+        Returns:
+            List các segment {time, type, f0, energy}
+        """
+        labels = [FRAME_TYPES[code] for code in columns["type"].tolist()]
+        return [
+            {"time": time, "type": frame_type, "f0": f0, "energy": energy}
+            for time, frame_type, f0, energy in zip(
+                columns["time"].tolist(),
+                labels,
+                columns["f0"].tolist(),
+                columns["energy"].tolist()
+            )
+        ]
+
+    def _columns_to_runs(
+        self,
+        columns: Dict[str, np.ndarray],
+        sr: int,
+        first_frame: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Gộp các frame liên tiếp cùng loại thành các đoạn (run)
+        
+        Args:
+            columns: Kết quả của _classify_columns
+            sr: Sample rate
+            first_frame: Chỉ số frame của phần tử đầu tiên (tính thời gian)
             
-            segments.append({
-                "time": round(time, 3),
-                "type": frame_type,
-                "f0": round(current_f0, 2),
-                "energy": round(current_energy, 4)
-            })
+        Returns:
+            List các đoạn {start, end, type, mean_f0, mean_energy, frame_count},
+            end là thời điểm kết thúc của frame cuối trong đoạn
+        """
+        types = columns["type"]
+        if len(types) == 0:
+            return []
+        
+        # Vị trí frame đầu tiên của mỗi đoạn
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(types)) + 1])
+        ends = np.concatenate([starts[1:], [len(types)]])
+        counts = ends - starts
+        
+        frame_seconds = self.hop_length / sr
+        mean_f0 = np.add.reduceat(columns["f0"], starts) / counts
+        mean_energy = np.add.reduceat(columns["energy"], starts) / counts
+        
+        return [
+            {
+                "start": start,
+                "end": end,
+                "type": FRAME_TYPES[code],
+                "mean_f0": f0,
+                "mean_energy": energy,
+                "frame_count": count
+            }
+            for start, end, code, f0, energy, count in zip(
+                np.round((starts + first_frame) * frame_seconds, 3).tolist(),
+                np.round((ends + first_frame) * frame_seconds, 3).tolist(),
+                types[starts].tolist(),
+                np.round(mean_f0, 2).tolist(),
+                np.round(mean_energy, 4).tolist(),
+                counts.tolist()
+            )
+        ]
+
+
+class RunAccumulator:
+    """
+    Gộp dần các khối cột liên tiếp thành runs (dùng cho streaming)
+    
+    Đoạn cuối của mỗi khối có thể kéo dài sang khối sau, nên các frame
+    của nó được giữ lại và ghép với khối sau; nối các kết quả lại giống
+    _columns_to_runs trên cả file.
+    
+    Attributes:
+        analyzer: AudioAnalyzer tạo ra các khối
+        sr: Sample rate
+    """
+    
+    def __init__(self, analyzer: AudioAnalyzer, sr: int):
+        self.analyzer = analyzer
+        self.sr = sr
+        self._pending: Optional[Dict[str, np.ndarray]] = None
+        self._first_frame = 0
+    
+    def push(self, columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        """Thêm một khối, trả về các đoạn đã hoàn chỉnh (có thể rỗng)"""
+        if self._pending is not None:
+            columns = {
+                name: np.concatenate([self._pending[name], values])
+                for name, values in columns.items()
+            }
+        runs = self.analyzer._columns_to_runs(columns, self.sr, self._first_frame)
+        if not runs:
+            return []
+        
+        kept = len(columns["type"]) - runs[-1]["frame_count"]
+        self._pending = {name: values[kept:] for name, values in columns.items()}
+        self._first_frame += kept
+        return runs[:-1]
+    
+    def flush(self) -> List[Dict[str, Any]]:
+        """Kết thúc: trả về đoạn cuối còn giữ lại"""
+        if self._pending is None:
+            return []
+        runs = self.analyzer._columns_to_runs(self._pending, self.sr, self._first_frame)
+        self._first_frame += len(self._pending["type"])
+        self._pending = None
+        return runs
+
+
+class LiveAnalysis:
+    """
+    Phân tích tăng dần tín hiệu nhận theo từng đoạn (vd. PCM từ microphone)
+    
+    Frame được phân loại ngay khi đã nhận đủ mẫu cho cửa sổ của nó cộng
+    _stream_margin() frame, nên độ trễ bị chặn bởi latency_samples. Chỉ giữ
+    phần đuôi tín hiệu cần cho các frame sau; nối các kết quả (kể cả flush)
+    lại giống hệt analyze_columns trên toàn bộ tín hiệu.
+    
+    Với threshold_mode="adaptive" không có cả tín hiệu để ước lượng: nền
+    nhiễu được theo dõi trên energy của noise_window_seconds giây gần nhất
+    (kể cả các frame đang trả về), nên ngưỡng thay đổi theo thời gian và kết
+    quả có thể khác analyze_columns.
+    
+    Attributes:
+        analyzer: AudioAnalyzer (f0_backend thuộc LIVE_F0_BACKENDS)
+        sr: Sample rate của tín hiệu
+        total_samples: Số mẫu đã nhận
+        next_frame: Chỉ số frame tiếp theo sẽ được trả về
+        threshold: Ngưỡng năng lượng dùng cho các frame trả về gần nhất
+        noise_floor: Nền nhiễu hiện tại (threshold_mode="adaptive")
+    """
+    
+    def __init__(self, analyzer: AudioAnalyzer, sr: int):
+        if analyzer.f0_backend not in LIVE_F0_BACKENDS:
+            raise ValueError(
+                f"F0 backend {analyzer.f0_backend} is not supported for live analysis. "
+                f"Supported backends: {', '.join(LIVE_F0_BACKENDS)}"
+            )
+        if analyzer.analysis_rate(sr) != sr:
+            raise ValueError(
+                f"Live audio must be sent at the analysis rate "
+                f"({analyzer.sample_rate} Hz), got {sr} Hz"
+            )
+        analyzer.check_sample_rate(sr)
+        self.analyzer = analyzer
+        self.sr = sr
+        self.total_samples = 0
+        self.next_frame = 0
+        self._margin = analyzer._stream_margin()
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0  # chỉ số mẫu (trong cả tín hiệu) của _buffer[0]
+        self._leftover = b""  # byte lẻ của PCM int16 chưa đủ một mẫu
+        self.threshold = analyzer.energy_threshold
+        self.noise_floor: Optional[float] = None
+        # Energy của các frame đã trả về gần nhất (theo dõi nền nhiễu)
+        self._history = np.zeros(0)
+        self._history_frames = max(
+            1, int(round(analyzer.noise_window_seconds * sr / analyzer.hop_length))
+        )
+    
+    @property
+    def latency_samples(self) -> int:
+        """Số mẫu tối đa phải nhận thêm sau tâm một frame trước khi nó được trả về"""
+        return (self._margin + 1) * self.analyzer.hop_length
+    
+    def push_pcm16(self, data: bytes) -> Dict[str, np.ndarray]:
+        """Thêm PCM int16 little-endian mono (như soundfile đọc file PCM_16)"""
+        data = self._leftover + data
+        usable = len(data) - len(data) % 2
+        self._leftover = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32)
+        return self.push(samples / 32768.0)
+    
+    def push(self, samples: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Thêm mẫu mới
+        
+        Returns:
+            Các cột (xem _classify_columns) của các frame vừa hoàn chỉnh,
+            có thể rỗng
+        """
+        self._buffer = np.concatenate([self._buffer, samples.astype(np.float32)])
+        self.total_samples += len(samples)
+        
+        hop_length = self.analyzer.hop_length
+        last = self.total_samples // hop_length - self._margin
+        return self._analyze(last, (last + self._margin) * hop_length)
+    
+    def flush(self) -> Dict[str, np.ndarray]:
+        """Kết thúc tín hiệu: trả về các frame còn lại (cuối tín hiệu đệm 0 như batch)"""
+        last = 1 + self.total_samples // self.analyzer.hop_length
+        return self._analyze(last, self.total_samples)
+    
+    def _analyze(self, last: int, stop: int) -> Dict[str, np.ndarray]:
+        """Phân tích các frame [next_frame, last) từ các mẫu tới `stop`"""
+        first = self.next_frame
+        if last <= first:
+            return {
+                "time": np.zeros(0),
+                "type": np.zeros(0, dtype=np.uint8),
+                "f0": np.zeros(0),
+                "energy": np.zeros(0)
+            }
+        
+        hop_length = self.analyzer.hop_length
+        start_frame = max(0, first - self._margin)
+        y = self._buffer[
+            start_frame * hop_length - self._buffer_start:stop - self._buffer_start
+        ]
+        offset = first - start_frame
+        energy = self.analyzer._extract_energy(y)
+        if self.analyzer.threshold_mode == "adaptive":
+            recent = energy[offset:offset + last - first]
+            self._history = np.concatenate([self._history, recent])[-self._history_frames:]
+            self.threshold, self.noise_floor = self.analyzer.choose_threshold(self._history)
+        columns = self.analyzer._analyze_energy(
+            y, self.sr, energy, self.threshold, first_frame=start_frame
+        )
+        self.next_frame = last
+        
+        # Bỏ các mẫu lần phân tích sau không cần tới
+        keep_from = max(0, last - self._margin) * hop_length
+        if keep_from > self._buffer_start:
+            self._buffer = self._buffer[keep_from - self._buffer_start:]
+            self._buffer_start = keep_from
+        
+        return {
+            name: values[offset:offset + last - first]
+            for name, values in columns.items()
+        }
+
+
+_registry: "OrderedDict[Tuple[Tuple[str, Any], ...], AudioAnalyzer]" = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+def get_analyzer(**options: Any) -> AudioAnalyzer:
+    """
+    AudioAnalyzer dùng chung cho một cấu hình (registry trong tiến trình)
+    
+    Analyzer không giữ trạng thái của từng lần phân tích, chỉ giữ trạng thái
+    dựng sẵn theo cấu hình (ma trận HMM của pYIN, khoảng độ trễ YIN/NCCF...),
+    nên server và CLI dùng lại cùng một instance cho mọi file cùng cấu hình.
+    Giữ tối đa ANALYZER_REGISTRY_SIZE cấu hình, bỏ cấu hình ít dùng nhất.
+    
+    Args:
+        **options: Tham số khởi tạo AudioAnalyzer
         
-        return segments
+    Raises:
+        ValueError: Nếu tham số không hợp lệ (xem AudioAnalyzer)
+    """
+    key = tuple(sorted(options.items()))
+    with _registry_lock:
+        analyzer = _registry.get(key)
+        if analyzer is not None:
+            _registry.move_to_end(key)
+            return analyzer
+    
+    analyzer = AudioAnalyzer(**options)
+    with _registry_lock:
+        analyzer = _registry.setdefault(key, analyzer)
+        _registry.move_to_end(key)
+        while len(_registry) > ANALYZER_REGISTRY_SIZE:
+            _registry.popitem(last=False)
+    return analyzer
 
 
-def analyze_audio_file(file_path: str) -> Dict[str, Any]:
+def analyze_audio_file(
+    file_path: AudioSource,
+    filename: Optional[str] = None,
+    mode: str = "frames",
+    **options: Any
+) -> Dict[str, Any]:
     """
     Hàm tiện ích để phân tích file âm thanh
     
     Args:
-        file_path: Đường dẫn đến file âm thanh
+        file_path: Đường dẫn, bytes hoặc file-like object (xem load_audio)
+        filename: Tên file trong kết quả (mặc định: tên của đường dẫn)
+        mode: Định dạng segments (xem RESPONSE_MODES)
+        **options: Tham số cấu hình AudioAnalyzer (f0_backend, f0_gating, ...)
         
     Returns:
         Dict kết quả phân tích
     """
-    analyzer = AudioAnalyzer()
-    return analyzer.analyze(file_path)
+    analyzer = get_analyzer(**options)
+    return analyzer.analyze(file_path, filename, mode)
+
+
+def analyze_audio_columns(
+    file_path: AudioSource,
+    filename: Optional[str] = None,
+    **options: Any
+) -> Dict[str, Any]:
+    """
+    Như analyze_audio_file nhưng trả về kết quả dạng cột (xem analyze_columns)
+    
+    Dùng cho các định dạng response dạng cột: mảng NumPy được truyền từ
+    worker về nhanh hơn nhiều so với list dict từng frame.
+    """
+    analyzer = get_analyzer(**options)
+    return analyzer.analyze_columns(file_path, filename)
+
+
+def analyze_audio_block(
+    file_path: str,
+    first: int,
+    last: int,
+    threshold: Optional[float] = None,
+    **options: Any
+) -> Dict[str, np.ndarray]:
+    """
+    Phân tích các frame [first, last) của file (xem analyze_frame_range)
+    
+    Mỗi khối là một tác vụ độc lập trên pool, nên response streaming được
+    chia thành nhiều tác vụ nhỏ thay vì một generator sống trong worker.
+    threshold là ngưỡng của cả file (xem estimate_audio_threshold).
+    """
+    analyzer = get_analyzer(**options)
+    with soundfile.SoundFile(file_path) as audio:
+        return analyzer.analyze_frame_range(audio, first, last, threshold)
+
+
+def estimate_audio_threshold(
+    file_path: str,
+    **options: Any
+) -> Tuple[float, Optional[float]]:
+    """(ngưỡng, nền nhiễu) của cả file (xem file_threshold) - chạy trên pool"""
+    analyzer = get_analyzer(**options)
+    with soundfile.SoundFile(file_path) as audio:
+        return analyzer.file_threshold(audio)
+
+
+def get_audio_duration(file_path: str) -> Optional[float]:
+    """
+    Đọc thời lượng (giây) từ header file, không giải mã audio
+    
+    Returns:
+        Thời lượng, hoặc None nếu định dạng không đọc được header
+    """
+    try:
+        return soundfile.info(file_path).duration
+    except Exception:
+        return None
+
+
+def _cost_probe(sr: int) -> np.ndarray:
+    """
+    Tín hiệu mẫu cố định cho estimate_cost: COST_PROBE_SECONDS giây gồm
+    chuỗi hài 150 Hz, nhiễu trắng và nhiễu nền rất nhỏ (mỗi loại 1/3)
+    """
+    n = int(COST_PROBE_SECONDS * sr) // 3
+    t = np.arange(n) / sr
+    rng = np.random.default_rng(0)
+    voiced = sum(0.3 / k * np.sin(2 * np.pi * 150 * k * t) for k in range(1, 5))
+    return np.concatenate([
+        voiced,
+        0.1 * rng.standard_normal(n),
+        0.001 * rng.standard_normal(n)
+    ]).astype(np.float32)
+
+
+def estimate_analysis_cost(**options: Any) -> Dict[str, Any]:
+    """Chi phí ước lượng của một cấu hình (xem estimate_cost) - chạy trên pool"""
+    return get_analyzer(**options).estimate_cost()
+
+
+def warm_up_clip(sample_rate: int = 22050) -> bytes:
+    """
+    File WAV 1 giây theo cấu trúc của create_test_audio.py (silence + voiced
+    440Hz + unvoiced + silence, mỗi đoạn 0.25s), mã hóa trong bộ nhớ
+
+    Đủ cả ba loại frame để warm-up đi qua mọi nhánh: F0 trên đoạn voiced,
+    bỏ qua F0 ở đoạn im lặng (f0_gating), resample về tần số phân tích.
+    """
+    part = sample_rate // 4
+    t = np.arange(part) / sample_rate
+    y = np.concatenate([
+        np.zeros(part),
+        0.3 * np.sin(2 * np.pi * 440 * t),
+        0.1 * np.random.default_rng(0).standard_normal(part),
+        np.zeros(part)
+    ])
+    buffer = io.BytesIO()
+    soundfile.write(buffer, y.astype(np.float32), sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def enable_jit_cache() -> Optional[str]:
+    """
+    Tạo JIT_CACHE_DIR và trỏ NUMBA_CACHE_DIR vào đó (không ghi đè giá trị
+    người vận hành đã đặt)
+
+    Phải chạy trước khi librosa nạp các kernel numba (lần phân tích đầu
+    tiên) để chúng được nạp từ/ghi vào cache trên đĩa.
+
+    Returns:
+        Thư mục cache, None nếu tắt hoặc không ghi được (giữ mặc định của numba)
+    """
+    if not JIT_CACHE_DIR:
+        return None
+    try:
+        os.makedirs(JIT_CACHE_DIR, exist_ok=True)
+    except OSError:
+        return None
+    if not os.access(JIT_CACHE_DIR, os.W_OK):
+        return None
+    os.environ.setdefault("NUMBA_CACHE_DIR", JIT_CACHE_DIR)
+    return JIT_CACHE_DIR
+
+
+def warm_up(**options: Any) -> float:
+    """
+    Chạy AudioAnalyzer.analyze với mọi backend F0 trên một clip ngắn
+    
+    Lần gọi đầu tiên của librosa phải import module con và biên dịch
+    numba (pyin); gọi hàm này khi khởi động để request đầu tiên không
+    phải trả chi phí đó. Cache JIT trên đĩa (enable_jit_cache) được bật
+    trước tiên. Các analyzer được tạo qua get_analyzer với cùng
+    `options` như server (tần số phân tích, frame/hop...), nên registry
+    cũng đã có sẵn analyzer cho request đầu tiên.
+    
+    Returns:
+        Thời gian warm-up (giây)
+    """
+    start = time.perf_counter()
+    enable_jit_cache()
+    clip = warm_up_clip()
+    for backend in F0_BACKENDS:
+        for f0_gating in (False, True):
+            analyzer = get_analyzer(**{**options, "f0_backend": backend, "f0_gating": f0_gating})
+            analyzer.analyze(clip, "warm_up.wav")
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    # python -m analysis: phân tích hàng loạt thư mục trên đĩa (xem cli.py)
+    from cli import main
+    main()
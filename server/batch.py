@@ -0,0 +1,361 @@
+"""
+Phân tích nhiều file trong một request (/analyze/batch)
+
+Các file được gom thành nhóm nhỏ; mỗi nhóm là một tác vụ trên
+AnalysisExecutor dùng chung một AudioAnalyzer - giảm chi phí gửi tác vụ
+và khởi tạo cho từng clip ngắn. Lỗi của một file chỉ ảnh hưởng tới kết
+quả của file đó.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from analysis import AudioSource, get_analyzer
+from cache import ResultCache, make_cache_key
+from executor import AnalysisExecutor, QueueFullError
+from formats import JSON_MEDIA_TYPE, encode_result
+
+logger = logging.getLogger(__name__)
+
+# Phần mở rộng của file nén được giải nén thành nhiều file
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+def archive_suffix(filename: str) -> Optional[str]:
+    """Phần mở rộng file nén của filename, None nếu không phải file nén"""
+    lower = filename.lower()
+    return next((suffix for suffix in ARCHIVE_SUFFIXES if lower.endswith(suffix)), None)
+
+
+class BatchItem:
+    """
+    Một file trong batch
+
+    Attributes:
+        filename: Tên file (với file nén: đường dẫn bên trong file nén)
+        source: Bytes hoặc đường dẫn file tạm, None nếu có lỗi
+        temp_path: File tạm thuộc sở hữu của batch (xóa sau khi phân tích)
+        digest: SHA-256 (hex) của nội dung, dùng cho cache
+        error: Lỗi phát hiện trước khi phân tích ({"error", "message"})
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        source: Optional[AudioSource] = None,
+        temp_path: Optional[str] = None,
+        digest: Optional[str] = None,
+        error: Optional[Dict[str, str]] = None
+    ):
+        self.filename = filename
+        self.source = source
+        self.temp_path = temp_path
+        self.digest = digest
+        self.error = error
+
+
+class ArchiveReader:
+    """
+    Đọc các file bên trong một file zip hoặc tar (có thể nén gzip/bz2/xz)
+
+    Thư mục, file ẩn của macOS (__MACOSX/, ._*) được bỏ qua.
+
+    Raises:
+        ValueError: Nếu file không phải zip/tar hợp lệ
+    """
+
+    def __init__(self, path: str):
+        if zipfile.is_zipfile(path):
+            self._zip: Optional[zipfile.ZipFile] = zipfile.ZipFile(path)
+            self._tar: Optional[tarfile.TarFile] = None
+        elif tarfile.is_tarfile(path):
+            self._zip = None
+            self._tar = tarfile.open(path)
+        else:
+            raise ValueError("Not a valid zip or tar archive")
+
+    def members(self) -> List[Tuple[str, int, Any]]:
+        """List (tên, kích thước giải nén, handle) của các file thường"""
+        if self._zip is not None:
+            entries = [
+                (info.filename, info.file_size, info)
+                for info in self._zip.infolist() if not info.is_dir()
+            ]
+        else:
+            entries = [
+                (info.name, info.size, info)
+                for info in self._tar.getmembers() if info.isfile()
+            ]
+        return [
+            entry for entry in entries
+            if not entry[0].startswith("__MACOSX/")
+            and not os.path.basename(entry[0]).startswith("._")
+        ]
+
+    def open(self, handle: Any) -> Any:
+        """File-like object đọc nội dung của một thành viên"""
+        if self._zip is not None:
+            return self._zip.open(handle)
+        return self._tar.extractfile(handle)
+
+    def read(self, handle: Any) -> Tuple[bytes, str]:
+        """Nội dung và SHA-256 (hex) của một thành viên"""
+        with self.open(handle) as member:
+            data = member.read()
+        return data, hashlib.sha256(data).hexdigest()
+
+    def extract(self, handle: Any, suffix: str) -> Tuple[str, str]:
+        """
+        Giải nén một thành viên ra file tạm theo từng khối
+
+        Returns:
+            (đường dẫn file tạm, SHA-256 hex) - người gọi xóa file tạm
+        """
+        digest = hashlib.sha256()
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        try:
+            with temp_file, self.open(handle) as member:
+                while True:
+                    chunk = member.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            os.unlink(temp_file.name)
+            raise
+        return temp_file.name, digest.hexdigest()
+
+    def close(self) -> None:
+        (self._zip or self._tar).close()
+
+
+def analyze_batch_chunk(
+    items: List[Tuple[str, AudioSource]],
+    mode: str = "frames",
+    **options: Any
+) -> List[Tuple[bool, Any, float]]:
+    """
+    Phân tích một nhóm file trên worker với cùng một AudioAnalyzer
+
+    Args:
+        items: List (filename, nguồn âm thanh)
+        mode: Định dạng segments (xem RESPONSE_MODES)
+        **options: Tham số cấu hình AudioAnalyzer
+
+    Returns:
+        Với mỗi file: (True, kết quả JSON không kèm filename, giây xử lý)
+        hoặc (False, thông báo lỗi, giây xử lý)
+    """
+    analyzer = get_analyzer(**options)
+    outcomes = []
+    for filename, source in items:
+        started = time.perf_counter()
+        try:
+            result = analyzer.analyze(source, filename, mode)
+            body = encode_result(result, JSON_MEDIA_TYPE)
+            outcomes.append((True, body, time.perf_counter() - started))
+        except Exception as e:
+            outcomes.append((False, str(e), time.perf_counter() - started))
+    return outcomes
+
+
+def _discard(path: Optional[str]) -> None:
+    """Xóa file tạm nếu còn tồn tại (S-P1)"""
+    if path and os.path.exists(path):
+        try:
+            os.unlink(path)
+        except Exception as e:
+            logger.warning(f"Failed to delete temp file: {str(e)}")
+
+
+class BatchAnalysis:
+    """
+    Phân tích các BatchItem theo nhóm, tối đa `concurrency` nhóm cùng lúc
+
+    add() chờ khi đã đủ `concurrency` nhóm đang chạy, nên số file được
+    giữ trong bộ nhớ có giới hạn dù batch có hàng nghìn file. Kết quả
+    được trả về theo đúng thứ tự các file.
+
+    Attributes:
+        executor: Pool phân tích dùng chung với /analyze/
+        options: Tham số cho AudioAnalyzer
+        mode: Định dạng segments (xem RESPONSE_MODES)
+        chunk_files: Số file tối đa mỗi tác vụ
+        concurrency: Số tác vụ chạy đồng thời
+        cache: Cache kết quả dùng chung với /analyze/ (tùy chọn)
+        retry_delay: Thời gian chờ khi executor đầy trước khi thử lại (giây)
+    """
+
+    def __init__(
+        self,
+        executor: AnalysisExecutor,
+        options: Dict[str, Any],
+        mode: str,
+        chunk_files: int,
+        concurrency: int,
+        cache: Optional[ResultCache] = None,
+        retry_delay: float = 1.0
+    ):
+        self.executor = executor
+        self.options = options
+        self.mode = mode
+        self.chunk_files = max(1, chunk_files)
+        self.concurrency = max(1, concurrency)
+        self.cache = cache if cache is not None and cache.enabled else None
+        self.retry_delay = retry_delay
+        self.cache_config = {
+            **get_analyzer(**options).config(),
+            "mode": mode,
+            "format": JSON_MEDIA_TYPE
+        }
+        self.started = time.perf_counter()
+        self.analysis_time = 0.0
+        self.analyzed = 0
+        self.counters = {"succeeded": 0, "failed": 0, "cache_hits": 0}
+        self._entries: List[Optional[bytes]] = []
+        self._chunk: List[Tuple[int, BatchItem, Optional[str]]] = []
+        self._tasks: List[Tuple[asyncio.Task, List[Tuple[int, BatchItem, Optional[str]]]]] = []
+        self._slots = asyncio.Semaphore(self.concurrency)
+
+    def plan(self, total_files: int) -> None:
+        """Chia đều file cho các worker khi biết trước số file (batch nhỏ)"""
+        per_task = -(-total_files // self.concurrency)
+        self.chunk_files = max(1, min(self.chunk_files, per_task))
+
+    async def add(self, item: BatchItem) -> None:
+        """Thêm một file; gửi nhóm hiện tại vào pool khi đã đủ chunk_files"""
+        index = len(self._entries)
+        self._entries.append(None)
+
+        if item.error is not None:
+            self._set_error(index, item.filename, item.error["error"], item.error["message"])
+            return
+
+        cache_key = None
+        if self.cache is not None and item.digest is not None:
+            cache_key = make_cache_key(item.digest, self.cache_config)
+            cached = await run_in_threadpool(self.cache.get, cache_key)
+            if cached is not None:
+                _discard(item.temp_path)
+                self.counters["cache_hits"] += 1
+                self._set_result(index, item.filename, cached)
+                return
+
+        self._chunk.append((index, item, cache_key))
+        if len(self._chunk) >= self.chunk_files:
+            await self._submit()
+
+    async def finish(self) -> None:
+        """Gửi nhóm cuối và chờ mọi nhóm hoàn tất"""
+        if self._chunk:
+            await self._submit()
+        await asyncio.gather(*(task for task, _ in self._tasks))
+
+    def close(self) -> None:
+        """Hủy các nhóm chưa xong và xóa file tạm còn lại (gọi trong finally)"""
+        for task, _ in self._tasks:
+            task.cancel()
+        # Nhóm bị hủy trước khi bắt đầu không chạy tới finally của _run_chunk
+        chunks = [chunk for _, chunk in self._tasks] + [self._chunk]
+        for chunk in chunks:
+            for _, item, _ in chunk:
+                _discard(item.temp_path)
+        self._chunk = []
+
+    def encode(self) -> bytes:
+        """Response JSON: thống kê, thời gian tổng hợp và kết quả từng file"""
+        total_time = time.perf_counter() - self.started
+        analyzed = self.analyzed
+        summary = {
+            "total_files": len(self._entries),
+            **self.counters,
+            "mode": self.mode,
+            "timing": {
+                "total_time": round(total_time, 4),
+                "analysis_time": round(self.analysis_time, 4),
+                "mean_file_time": round(self.analysis_time / analyzed, 4) if analyzed else 0.0,
+                "files_per_second": round(len(self._entries) / total_time, 2) if total_time else 0.0
+            }
+        }
+        head = json.dumps(summary, ensure_ascii=False, separators=(",", ":"))
+        return b"".join([
+            head[:-1].encode("utf-8"),
+            b',"results":[',
+            b",".join(self._entries),
+            b"]}"
+        ])
+
+    async def _submit(self) -> None:
+        """Gửi nhóm hiện tại, chờ nếu đã có `concurrency` nhóm đang chạy"""
+        chunk, self._chunk = self._chunk, []
+        await self._slots.acquire()
+        self._tasks.append((asyncio.create_task(self._run_chunk(chunk)), chunk))
+
+    async def _run_chunk(self, chunk: List[Tuple[int, BatchItem, Optional[str]]]) -> None:
+        try:
+            items = [(item.filename, item.source) for _, item, _ in chunk]
+            while True:
+                try:
+                    outcomes = await self.executor.run(
+                        analyze_batch_chunk, items, mode=self.mode, **self.options
+                    )
+                    break
+                except QueueFullError:
+                    # Pool đang đầy do các request khác - chờ rồi thử lại
+                    await asyncio.sleep(self.retry_delay)
+
+            for (index, item, cache_key), (ok, value, seconds) in zip(chunk, outcomes):
+                self.analysis_time += seconds
+                self.analyzed += 1
+                if ok:
+                    self._set_result(index, item.filename, value)
+                    if cache_key is not None:
+                        # Lỗi cache không được làm hỏng kết quả đã phân tích xong
+                        try:
+                            await run_in_threadpool(self.cache.put, cache_key, value)
+                        except Exception as e:
+                            logger.warning(f"Failed to cache result: {str(e)}")
+                else:
+                    logger.warning(f"Batch file failed: {item.filename}: {value}")
+                    self._set_error(
+                        index, item.filename, "Analysis failed",
+                        f"Failed to process audio file: {value}"
+                    )
+        except Exception as e:
+            logger.error(f"Batch chunk failed: {str(e)}", exc_info=True)
+            for index, item, _ in chunk:
+                self._set_error(
+                    index, item.filename, "Internal server error",
+                    f"Failed to process audio file: {str(e)}"
+                )
+        finally:
+            for _, item, _ in chunk:
+                _discard(item.temp_path)
+            self._slots.release()
+
+    def _set_result(self, index: int, filename: str, body: bytes) -> None:
+        """Ghép filename và status vào kết quả đã mã hóa (không kèm filename)"""
+        prefix = json.dumps(
+            {"filename": filename, "status": "ok"}, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        self._entries[index] = prefix[:-1] + b"," + body[1:]
+        self.counters["succeeded"] += 1
+
+    def _set_error(self, index: int, filename: str, error: str, message: str) -> None:
+        self._entries[index] = json.dumps(
+            {"filename": filename, "status": "error", "error": error, "message": message},
+            ensure_ascii=False,
+            separators=(",", ":")
+        ).encode("utf-8")
+        self.counters["failed"] += 1
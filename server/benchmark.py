@@ -0,0 +1,1103 @@
+"""
+Script benchmark hiệu năng cho AudioAnalyzer (NF-1)
+
+Cách chạy (từ thư mục server/):
+    python benchmark.py classify [--audio test_60s.wav]
+    python benchmark.py f0 [--duration 30] [--gate]
+    python benchmark.py formats [--audio test_60s.wav]
+    python benchmark.py stream [--duration 2400] [--backend nccf] [--gate]
+    python benchmark.py live [--duration 600] [--backend nccf] [--gate]
+    python benchmark.py resample [--duration 60] [--backend yin]
+    python benchmark.py overhead [--repeat 5]
+    python benchmark.py cost [--duration 60]
+    python benchmark.py threshold [--duration 120] [--backend yin]
+    python benchmark.py suite [--profile quick] [--http] [-o results.json]
+    python benchmark.py compare baseline.json results.json [--tolerance 0.15]
+    python benchmark.py startup [--repeat 5] [--no-server]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import librosa
+import numpy as np
+import soundfile
+
+from analysis import (
+    AudioAnalyzer, F0_BACKENDS, FRAME_TYPES, LIVE_F0_BACKENDS, LiveAnalysis,
+    RESAMPLE_TYPE, STREAM_BLOCK_FRAMES, SILENCE, get_analyzer
+)
+from formats import MEDIA_TYPES, JSON_MEDIA_TYPE, encode_result
+from metrics import track_stages
+
+# Cho phép import create_test_audio.py ở thư mục gốc của project
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def _timeit(func: Callable[[], Any], repeat: int) -> float:
+    """Chạy func `repeat` lần, trả về thời gian tốt nhất (giây)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _ensure_long_audio(audio_path: str = None) -> str:
+    """Trả về file 60s; tạo bằng create_test_audio.py nếu chưa có"""
+    if audio_path:
+        return audio_path
+    from create_test_audio import create_long_test_audio
+
+    audio_path = os.path.join(tempfile.gettempdir(), "test_60s.wav")
+    if not os.path.exists(audio_path):
+        create_long_test_audio(audio_path, duration=60)
+    return audio_path
+
+
+def _legacy_classify_frames(
+    analyzer: AudioAnalyzer,
+    f0: np.ndarray,
+    energy: np.ndarray,
+    sr: int
+) -> List[Dict[str, Any]]:
+    """Vòng lặp Python từng frame (phiên bản cũ) - dùng làm mốc so sánh"""
+    segments = []
+    min_length = min(len(f0), len(energy))
+
+    for i in range(min_length):
+        time_val = librosa.frames_to_time(i, sr=sr, hop_length=analyzer.hop_length)
+        current_f0 = float(f0[i])
+        current_energy = float(energy[i])
+
+        if current_f0 > 0:
+            frame_type = "VOICED"
+        elif current_energy > analyzer.energy_threshold:
+            frame_type = "UNVOICED"
+        else:
+            frame_type = "SILENCE"
+
+        segments.append({
+            "time": round(time_val, 3),
+            "type": frame_type,
+            "f0": round(current_f0, 2),
+            "energy": round(current_energy, 4)
+        })
+
+    return segments
+
+
+def bench_classify(args: argparse.Namespace) -> None:
+    """So sánh vòng lặp cũ với đường phân loại dạng cột"""
+    analyzer = AudioAnalyzer()
+    audio_path = _ensure_long_audio(args.audio)
+
+    y, sr = librosa.load(audio_path, sr=None)
+    f0 = analyzer._extract_f0(y, sr)
+    energy = analyzer._extract_energy(y)
+    duration = len(y) / sr
+
+    # File 1 giờ: lặp lại F0/energy của file 60s (chỉ đo bước phân loại)
+    repeats = int(np.ceil(3600 / duration))
+    cases = [
+        (f"{duration:.0f}s", f0, energy),
+        ("3600s", np.tile(f0, repeats), np.tile(energy, repeats)),
+    ]
+
+    print(f"{'audio':>8} {'frames':>9} {'legacy':>10} {'columns':>10} "
+          f"{'segments':>10} {'speedup':>8}")
+    for label, case_f0, case_energy in cases:
+        repeat = args.repeat if len(case_f0) < 100_000 else 1
+
+        legacy = _timeit(
+            lambda: _legacy_classify_frames(analyzer, case_f0, case_energy, sr),
+            repeat
+        )
+        columns = _timeit(
+            lambda: analyzer._classify_columns(case_f0, case_energy, sr),
+            repeat
+        )
+        segments = _timeit(
+            lambda: analyzer._classify_frames(case_f0, case_energy, sr),
+            repeat
+        )
+
+        # Kết quả phải giống hệt phiên bản cũ
+        expected = _legacy_classify_frames(analyzer, case_f0, case_energy, sr)
+        actual = analyzer._classify_frames(case_f0, case_energy, sr)
+        assert actual == expected, "Kết quả phân loại khác phiên bản cũ"
+
+        print(f"{label:>8} {len(case_f0):>9} {legacy * 1000:>8.1f}ms "
+              f"{columns * 1000:>8.1f}ms {segments * 1000:>8.1f}ms "
+              f"{legacy / columns:>7.0f}x")
+
+
+def _corpus_audio(
+    duration: float,
+    sr: int = 16000,
+    seed: int = 0
+) -> Tuple[np.ndarray, List[Tuple[float, float, int]]]:
+    """
+    Audio tổng hợp của create_corpus_audio (cùng corpus với `suite`), đọc
+    lại thành mảng float32; cùng seed cho cùng kết quả
+
+    Returns:
+        (audio float32, danh sách nhãn thật (start, end, mã nhãn))
+    """
+    from create_test_audio import create_corpus_audio
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.wav")
+        labels = create_corpus_audio(path, duration, sr, seed=seed)
+        y, _ = soundfile.read(path, dtype="float32")
+    codes = {name: code for code, name in enumerate(FRAME_TYPES)}
+    return y, [(start, end, codes[kind]) for start, end, kind in labels]
+
+
+def _truth_codes(
+    labels: List[Tuple[float, float, int]],
+    times: np.ndarray,
+    margin: float
+) -> np.ndarray:
+    """Nhãn thật tại tâm mỗi frame; frame sát biên đoạn (< margin) = 255"""
+    codes = np.full(len(times), 255, dtype=np.uint8)
+    for start, end, code in labels:
+        codes[(times >= start + margin) & (times < end - margin)] = code
+    return codes
+
+
+def bench_f0(args: argparse.Namespace) -> None:
+    """Tốc độ và độ trùng nhãn của các backend F0 so với pyin"""
+    sr = 16000
+    y, labels = _corpus_audio(args.duration, sr=sr, seed=args.seed)
+
+    results = {}
+    for backend in F0_BACKENDS:
+        analyzer = AudioAnalyzer(f0_backend=backend)
+        analyzer._extract_f0(y[:sr], sr)  # warm-up (numba JIT, cache)
+        energy = analyzer._extract_energy(y)
+
+        start = time.perf_counter()
+        f0 = analyzer._extract_f0(y, sr)
+        elapsed = time.perf_counter() - start
+        results[backend] = (elapsed, analyzer._classify_columns(f0, energy, sr))
+
+        if args.gate:
+            start = time.perf_counter()
+            f0 = analyzer._extract_f0_gated(y, sr, energy)
+            elapsed = time.perf_counter() - start
+            results[f"{backend}+gate"] = (
+                elapsed, analyzer._classify_columns(f0, energy, sr)
+            )
+
+    reference = results["pyin"][1]["type"]
+    frame_seconds = AudioAnalyzer().frame_length / sr
+    truth = _truth_codes(labels, results["pyin"][1]["time"], frame_seconds / 2)
+    known = truth != 255
+
+    print(f"Audio: {args.duration:.0f}s tổng hợp, seed={args.seed}, "
+          f"silence={(truth == SILENCE).sum() / known.sum():.0%}")
+    print(f"{'backend':>10} {'time':>9} {'x realtime':>11} "
+          f"{'= pyin':>8} {'= truth':>8}  " + " ".join(f"{t:>9}" for t in FRAME_TYPES))
+    for backend, (elapsed, columns) in results.items():
+        types = columns["type"]
+        counts = np.bincount(types, minlength=len(FRAME_TYPES))
+        print(f"{backend:>10} {elapsed:>8.2f}s {args.duration / elapsed:>10.0f}x "
+              f"{(types == reference).mean():>7.1%} "
+              f"{(types[known] == truth[known]).mean():>7.1%}  "
+              + " ".join(f"{c:>9}" for c in counts))
+
+
+def bench_formats(args: argparse.Namespace) -> None:
+    """Thời gian mã hóa và kích thước response của từng định dạng"""
+    analyzer = AudioAnalyzer(f0_backend="nccf")
+    audio_path = _ensure_long_audio(args.audio)
+    result = analyzer.analyze_columns(audio_path)
+    duration = result["total_segments"] * analyzer.hop_length / result["sample_rate"]
+
+    # 1 giờ: lặp lại các cột của file ngắn (chỉ đo bước mã hóa)
+    repeats = int(np.ceil(3600 / duration))
+    long_columns = {
+        name: np.tile(values, repeats) for name, values in result["columns"].items()
+    }
+    cases = [
+        (f"{duration:.0f}s", result),
+        ("3600s", {
+            **result,
+            "total_segments": len(long_columns["time"]),
+            "columns": long_columns
+        }),
+    ]
+
+    print(f"{'audio':>8} {'format':>44} {'encode':>10} {'size':>11}")
+    for label, case in cases:
+        repeat = args.repeat if case["total_segments"] < 100_000 else 1
+        for media_type in MEDIA_TYPES:
+            if media_type == JSON_MEDIA_TYPE:
+                # F-S5: gồm cả bước tạo dict cho từng frame
+                def encode():
+                    segments = analyzer._columns_to_segments(case["columns"])
+                    return encode_result({
+                        "total_segments": case["total_segments"],
+                        "segments": segments
+                    }, media_type)
+            else:
+                def encode():
+                    return encode_result(case, media_type)
+
+            elapsed = _timeit(encode, repeat)
+            size = len(encode())
+            print(f"{label:>8} {media_type:>44} {elapsed * 1000:>8.1f}ms "
+                  f"{size / 1024:>9.0f}KB")
+
+
+def _peak_memory(func: Callable[[], Any]) -> Tuple[Any, float, int]:
+    """Chạy func, trả về (kết quả, thời gian, bộ nhớ cấp phát đỉnh - bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_stream(args: argparse.Namespace) -> None:
+    """
+    Phân tích streaming (analyze_blocks) so với batch (analyze_columns):
+    kết quả phải giống hệt, bộ nhớ đỉnh của streaming không tăng theo độ dài
+    """
+    sr = 16000
+    analyzer = AudioAnalyzer(f0_backend=args.backend, f0_gating=args.gate)
+
+    print(f"{'audio':>8} {'path':>14} {'time':>9} {'peak mem':>10}")
+    for duration in (args.duration / 4, args.duration):
+        y, _ = _corpus_audio(duration, sr=sr, seed=args.seed)
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
+            audio_path = f.name
+        try:
+            soundfile.write(audio_path, y, sr)
+            del y
+
+            batch, elapsed, peak = _peak_memory(
+                lambda: analyzer.analyze_columns(audio_path)["columns"]
+            )
+            print(f"{duration:>7.0f}s {'batch':>14} {elapsed:>8.2f}s "
+                  f"{peak / 2 ** 20:>8.1f}MB")
+
+            # Khối nhỏ, số frame lẻ: nhiều biên khối để kiểm tra phần chồng lấn
+            for block_frames in (args.block_frames, 333):
+                def stream():
+                    blocks = list(analyzer.analyze_blocks(audio_path, block_frames))
+                    return {
+                        name: np.concatenate([block[name] for block in blocks])
+                        for name in batch
+                    }
+
+                streamed, elapsed, _ = _peak_memory(stream)
+                for name in batch:
+                    assert np.array_equal(streamed[name], batch[name]), \
+                        f"Cột {name} của streaming khác batch (block={block_frames})"
+
+            # Bộ nhớ đỉnh khi chỉ duyệt qua các khối (không giữ kết quả)
+            _, elapsed, peak = _peak_memory(
+                lambda: sum(1 for _ in analyzer.analyze_blocks(audio_path))
+            )
+            print(f"{duration:>7.0f}s {'stream':>14} {elapsed:>8.2f}s "
+                  f"{peak / 2 ** 20:>8.1f}MB")
+        finally:
+            os.unlink(audio_path)
+
+    print("Streaming = batch: OK")
+
+
+def bench_live(args: argparse.Namespace) -> None:
+    """
+    Phân tích live (LiveAnalysis, như /ws/analyze) với buffer microphone
+    RECORD_CHUNK mẫu: thời gian xử lý mỗi buffer phải nhỏ hơn thời lượng
+    buffer và không tăng theo độ dài phiên; kết quả giống hệt batch
+    """
+    sr, chunk = 16000, 1024  # như Config.RECORD_* của desktop client
+    analyzer = AudioAnalyzer(f0_backend=args.backend, f0_gating=args.gate)
+    y, _ = _corpus_audio(args.duration, sr=sr, seed=args.seed)
+    pcm = (np.clip(y, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    signal = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+
+    # Phiên làm nóng: lần gọi đầu tiên bao gồm thời gian biên dịch numba
+    warm = LiveAnalysis(analyzer, sr)
+    warm.push(signal[:sr])
+    warm.flush()
+
+    session = LiveAnalysis(analyzer, sr)
+    blocks, costs = [], []
+    for offset in range(0, len(pcm), 2 * chunk):
+        start = time.perf_counter()
+        blocks.append(session.push_pcm16(pcm[offset:offset + 2 * chunk]))
+        costs.append(time.perf_counter() - start)
+    blocks.append(session.flush())
+
+    batch = analyzer.analyze_signal(signal, sr)
+    for name in batch:
+        streamed = np.concatenate([block[name] for block in blocks])
+        assert np.array_equal(streamed, batch[name]), f"Cột {name} của live khác batch"
+
+    costs = np.array(costs) * 1000
+    quarter = len(costs) // 4
+    print(f"audio {args.duration:.0f}s, {len(costs)} buffer x {chunk / sr * 1000:.0f}ms, "
+          f"latency {session.latency_samples / sr * 1000:.0f}ms")
+    print(f"{'buffer':>12} {'mean':>9} {'p99':>9} {'max':>9}")
+    for label, part in (("first 25%", costs[:quarter]), ("last 25%", costs[-quarter:]),
+                        ("all", costs)):
+        print(f"{label:>12} {part.mean():>7.3f}ms {np.percentile(part, 99):>7.3f}ms "
+              f"{part.max():>7.3f}ms")
+    print("Live = batch: OK")
+
+
+def bench_resample(args: argparse.Namespace) -> None:
+    """
+    Chi phí mỗi giây audio theo sample rate nguồn: phân tích ở sample rate
+    gốc (khung 2048 mẫu) so với resample về 16kHz (khung 128ms / 32ms).
+    Cùng một nội dung ở mọi sample rate; nhãn được so với nhãn thật và với
+    kết quả của nguồn 16kHz.
+    """
+    source_rates = (8000, 16000, 22050, 44100, 48000)
+    y, labels = _corpus_audio(args.duration, sr=48000, seed=args.seed)
+    native = AudioAnalyzer(f0_backend=args.backend)
+    canonical = AudioAnalyzer(
+        f0_backend=args.backend, sample_rate=16000, frame_ms=128, hop_ms=32
+    )
+    native.analyze_signal(y[:16000], 16000)  # warm-up (numba JIT, cache)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for rate in source_rates:
+            audio_path = os.path.join(directory, f"{rate}.wav")
+            soundfile.write(
+                audio_path,
+                librosa.resample(y, orig_sr=48000, target_sr=rate, res_type=RESAMPLE_TYPE),
+                rate
+            )
+            for name, analyzer in (("native", native), ("16k", canonical)):
+                start = time.perf_counter()
+                columns = analyzer.analyze_columns(audio_path)["columns"]
+                results[rate, name] = (time.perf_counter() - start, columns)
+
+    reference = results[16000, "16k"][1]["type"]
+    print(f"Audio: {args.duration:.0f}s tổng hợp, backend={args.backend}, "
+          f"resampler={RESAMPLE_TYPE}")
+    print(f"{'source':>7} {'analysis':>9} {'time':>8} {'ms/s':>7} {'frames':>7} "
+          f"{'frame':>7} {'= truth':>8} {'= 16k':>7}")
+    for (rate, name), (elapsed, columns) in results.items():
+        analyzer = native if name == "native" else canonical
+        sr = analyzer.analysis_rate(rate)
+        frame_seconds = analyzer.frame_length / sr
+        truth = _truth_codes(labels, columns["time"], frame_seconds / 2)
+        known = truth != 255
+        types = columns["type"]
+        same = (
+            f"{(types == reference).mean():>6.1%}"
+            if len(types) == len(reference) else f"{'-':>6}"
+        )
+        print(f"{rate:>7} {name:>9} {elapsed:>7.2f}s "
+              f"{elapsed / args.duration * 1000:>7.1f} {len(types):>7} "
+              f"{frame_seconds * 1000:>5.0f}ms "
+              f"{(types[known] == truth[known]).mean():>7.1%} {same}")
+
+
+def bench_overhead(args: argparse.Namespace) -> None:
+    """
+    Chi phí cố định mỗi lần gọi trên clip ngắn: AudioAnalyzer mới cho mỗi
+    lần gọi (dựng lại ma trận HMM, lưới tần số... như trước khi có registry)
+    so với analyzer dùng chung từ get_analyzer; kết quả phải giống hệt
+    """
+    sr = 16000
+    print(f"{'backend':>8} {'clip':>6} {'new analyzer':>13} {'registry':>9} "
+          f"{'saved':>8} {'speedup':>8}")
+    for backend in F0_BACKENDS:
+        shared = get_analyzer(f0_backend=backend)
+        for duration in (0.25, 1.0, 5.0):
+            y, _ = _corpus_audio(duration, sr=sr, seed=args.seed)
+            shared.analyze_signal(y, sr)  # warm-up (numba JIT, trạng thái dựng sẵn)
+
+            fresh = AudioAnalyzer(f0_backend=backend).analyze_signal(y, sr)
+            cached = shared.analyze_signal(y, sr)
+            for name in fresh:
+                assert np.array_equal(fresh[name], cached[name]), \
+                    f"Cột {name} của registry khác analyzer mới ({backend})"
+
+            before = _timeit(
+                lambda: AudioAnalyzer(f0_backend=backend).analyze_signal(y, sr),
+                args.repeat
+            )
+            after = _timeit(
+                lambda: get_analyzer(f0_backend=backend).analyze_signal(y, sr),
+                args.repeat
+            )
+            print(f"{backend:>8} {duration:>5.2f}s {before * 1000:>11.1f}ms "
+                  f"{after * 1000:>7.1f}ms {(before - after) * 1000:>6.1f}ms "
+                  f"{before / after:>7.2f}x")
+    print("Registry = analyzer mới: OK")
+
+
+def bench_cost(args: argparse.Namespace) -> None:
+    """
+    Mô hình chi phí (AudioAnalyzer.estimate_cost, /stats/) so với thời gian
+    CPU thực khi phân tích audio tổng hợp dài `duration` giây
+    """
+    sr = 16000
+    y, _ = _corpus_audio(args.duration, sr=sr, seed=args.seed)
+    configs = [
+        {"f0_backend": "pyin"},
+        {"f0_backend": "pyin", "fmin": 80.0, "fmax": 500.0},
+        {"f0_backend": "pyin", "hop_length": 1024},
+        {"f0_backend": "pyin", "f0_gating": True},
+        {"f0_backend": "yin"},
+        {"f0_backend": "yin", "hop_length": 128},
+        {"f0_backend": "nccf"},
+        {"f0_backend": "nccf", "frame_length": 1024, "hop_length": 256}
+    ]
+
+    print(f"Audio: {args.duration:.0f}s tổng hợp, seed={args.seed}")
+    print(f"{'config':>42} {'estimate':>9} {'measured':>9} {'ratio':>6}")
+    for options in configs:
+        analyzer = AudioAnalyzer(sample_rate=sr, **options)
+        estimate = analyzer.estimate_cost()["cpu_seconds_per_audio_second"]
+        start = time.thread_time()
+        analyzer.analyze_signal(y, sr)
+        measured = (time.thread_time() - start) / args.duration
+        label = ",".join(f"{name}={value}" for name, value in options.items())
+        print(f"{label:>42} {estimate:>9.4f} {measured:>9.4f} "
+              f"{estimate / measured:>6.2f}")
+
+
+def bench_threshold(args: argparse.Namespace) -> None:
+    """
+    Ngưỡng cố định so với ngưỡng thích ứng (threshold_mode) trên cùng audio
+    tổng hợp ở nhiều mức âm lượng và nhiễu nền: độ trùng nhãn với nhãn thật,
+    và streaming (analyze_blocks) giống hệt batch khi dùng ngưỡng thích ứng
+    """
+    sr = 16000
+    y, labels = _corpus_audio(args.duration, sr=sr, seed=args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    noise = rng.standard_normal(len(y)).astype(np.float32)
+    conditions = [
+        ("gốc", y),
+        ("x0.1", 0.1 * y),
+        ("x0.01", 0.01 * y),
+        ("nhiễu 0.03", y + 0.03 * noise),
+        ("x0.1 + nhiễu 0.003", 0.1 * y + 0.003 * noise)
+    ]
+    analyzers = {
+        mode: AudioAnalyzer(f0_backend=args.backend, threshold_mode=mode)
+        for mode in ("fixed", "adaptive")
+    }
+
+    print(f"Audio: {args.duration:.0f}s tổng hợp, seed={args.seed}, backend={args.backend}")
+    print(f"{'condition':>20} {'fixed':>8} {'adaptive':>9} {'threshold':>10} {'noise floor':>12}")
+    for label, signal in conditions:
+        accuracy = {}
+        for mode, analyzer in analyzers.items():
+            energy = analyzer._extract_energy(signal)
+            threshold, noise_floor = analyzer.choose_threshold(energy)
+            columns = analyzer._analyze_energy(signal, sr, energy, threshold)
+            truth = _truth_codes(labels, columns["time"], analyzer.frame_length / sr / 2)
+            known = truth != 255
+            accuracy[mode] = (columns["type"][known] == truth[known]).mean()
+        print(f"{label:>20} {accuracy['fixed']:>7.1%} {accuracy['adaptive']:>8.1%} "
+              f"{threshold:>10.5f} {noise_floor:>12.5f}")
+
+    # Streaming: lượt energy trên cả file cho cùng ngưỡng như batch
+    analyzer = analyzers["adaptive"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "threshold.wav")
+        soundfile.write(path, conditions[-1][1], sr, subtype="FLOAT")
+        batch = analyzer.analyze_columns(path)
+        blocks = list(analyzer.analyze_blocks(path, block_frames=args.block_frames))
+    for name, values in batch["columns"].items():
+        streamed = np.concatenate([block[name] for block in blocks])
+        assert np.array_equal(streamed, values), f"Cột {name} của streaming khác batch"
+    print(f"Streaming = batch (adaptive, ngưỡng {batch['params']['energy_threshold']}): OK")
+
+
+# Các bộ corpus của `suite`: thời lượng (giây), sample rate, tỉ lệ voiced
+SUITE_PROFILES = {
+    "quick": {"durations": [1, 10, 60], "sample_rates": [16000], "voiced_ratios": [0.5]},
+    "standard": {
+        "durations": [1, 10, 60, 600],
+        "sample_rates": [16000, 44100],
+        "voiced_ratios": [0.2, 0.6]
+    },
+    "full": {
+        "durations": [1, 10, 60, 600, 1800, 7200],
+        "sample_rates": [8000, 16000, 44100, 48000],
+        "voiced_ratios": [0.2, 0.6]
+    }
+}
+# Cấu hình phân tích mặc định của server (ANALYZER_OPTIONS trong main.py)
+SUITE_ANALYZER_OPTIONS = {"sample_rate": 16000, "frame_ms": 128, "hop_ms": 32}
+# File dài hơn chỉ chạy một lần (không lặp --repeat)
+SUITE_REPEAT_MAX_SECONDS = 600
+SUITE_SCHEMA = 1
+# Chênh lệch nhỏ hơn các mức này không bị coi là hồi quy (nhiễu đo trên clip ngắn)
+COMPARE_MIN_SECONDS = 0.005
+COMPARE_MIN_MEMORY_MB = 1.0
+
+
+def _parse_list(value: Optional[str], cast: Callable[[str], Any]) -> Optional[List[Any]]:
+    return [cast(item) for item in value.split(",")] if value else None
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _build_corpus(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Tạo (hoặc dùng lại) các file corpus trong args.corpus_dir
+
+    Tên file mã hóa mọi tham số sinh, nên file đã có được dùng lại; sha256
+    của từng file được ghi vào kết quả để kiểm tra hai lần chạy dùng cùng audio.
+    """
+    from create_test_audio import create_corpus_audio
+
+    profile = SUITE_PROFILES[args.profile]
+    durations = _parse_list(args.durations, float) or profile["durations"]
+    sample_rates = _parse_list(args.sample_rates, int) or profile["sample_rates"]
+    voiced_ratios = _parse_list(args.voiced_ratios, float) or profile["voiced_ratios"]
+
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    corpus = []
+    for duration in durations:
+        for sample_rate in sample_rates:
+            for voiced_ratio in voiced_ratios:
+                name = (f"{duration:g}s_{sample_rate}Hz_v{voiced_ratio:g}"
+                        f"_s{args.silence_ratio:g}_seed{args.seed}")
+                path = os.path.join(args.corpus_dir, name + ".wav")
+                if not os.path.exists(path):
+                    create_corpus_audio(
+                        path + ".tmp", duration, sample_rate,
+                        voiced_ratio, args.silence_ratio, args.seed
+                    )
+                    os.replace(path + ".tmp", path)
+                corpus.append({
+                    "name": name,
+                    "path": path,
+                    "duration": duration,
+                    "sample_rate": sample_rate,
+                    "voiced_ratio": voiced_ratio,
+                    "silence_ratio": args.silence_ratio,
+                    "seed": args.seed,
+                    "bytes": os.path.getsize(path),
+                    "sha256": _file_sha256(path)
+                })
+    return corpus
+
+
+def _suite_environment() -> Dict[str, Any]:
+    """Phiên bản và phần cứng - kết quả chỉ so sánh được trên cùng môi trường"""
+    import scipy
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "librosa": librosa.__version__
+    }
+
+
+def _measure_analysis(
+    analyzer: AudioAnalyzer,
+    path: str,
+    repeat: int
+) -> Dict[str, Any]:
+    """
+    Phân tích `path` như /analyze/ (analyze + mã hóa JSON) `repeat` lần
+
+    Returns:
+        Thời gian tốt nhất và các giai đoạn của lần đó (metrics.stage), bộ
+        nhớ đỉnh (tracemalloc, một lần chạy riêng) và số frame theo loại
+    """
+    best = None
+    for _ in range(repeat):
+        with track_stages() as timings:
+            start = time.perf_counter()
+            result = analyzer.analyze(path)
+            encode_result(result, JSON_MEDIA_TYPE)
+            elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, dict(timings.stages))
+
+    tracemalloc.start()
+    analyzer.analyze(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    counts = {name: 0 for name in FRAME_TYPES}
+    for segment in result["segments"]:
+        counts[segment["type"]] += 1
+    return {
+        "total_seconds": round(best[0], 6),
+        "stages": {name: round(value, 6) for name, value in sorted(best[1].items())},
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        "frames": counts
+    }
+
+
+def _measure_http(client: Any, path: str, backend: str, repeat: int) -> float:
+    """Thời gian tốt nhất của POST /analyze/ (upload, phân tích, response)"""
+    with open(path, "rb") as handle:
+        content = handle.read()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.post(
+            f"/analyze/?f0_backend={backend}",
+            files={"file": (os.path.basename(path), content, "audio/wav")}
+        )
+        elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"/analyze/ returned {response.status_code}: {response.text[:200]}")
+        best = min(best, elapsed)
+    return best
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_suite(args: argparse.Namespace) -> None:
+    """
+    Bộ benchmark tái lập: corpus sinh theo seed (create_test_audio.py), thời
+    gian từng giai đoạn của AudioAnalyzer, round-trip /analyze/ (--http), bộ
+    nhớ đỉnh; kết quả JSON dùng cho `compare`
+    """
+    corpus = _build_corpus(args)
+    backends = args.backends.split(",")
+
+    client = None
+    if args.http:
+        # Server trong tiến trình (ASGI, không qua mạng), tắt cache kết quả
+        os.environ.setdefault("RESULT_CACHE_MB", "0")
+        os.environ.setdefault("ANALYSIS_WORKERS", "1")
+        from fastapi.testclient import TestClient
+        import main as server
+        client = TestClient(server.app)
+        client.__enter__()
+        max_upload_bytes = server.MAX_UPLOAD_BYTES
+
+    results = []
+    try:
+        for backend in backends:
+            analyzer = get_analyzer(f0_backend=backend, **SUITE_ANALYZER_OPTIONS)
+            analyzer.analyze(corpus[0]["path"])  # làm nóng: JIT, _pyin_plan...
+            for item in corpus:
+                repeat = args.repeat if item["duration"] <= SUITE_REPEAT_MAX_SECONDS else 1
+                entry = {
+                    "id": f"{backend}/{item['name']}",
+                    "backend": backend,
+                    "corpus": {key: value for key, value in item.items() if key != "path"},
+                    "repeat": repeat
+                }
+                entry.update(_measure_analysis(analyzer, item["path"], repeat))
+                entry["real_time_factor"] = round(entry["total_seconds"] / item["duration"], 6)
+                if client is not None:
+                    if item["bytes"] <= max_upload_bytes:
+                        entry["http_seconds"] = round(
+                            _measure_http(client, item["path"], backend, repeat), 6
+                        )
+                    else:
+                        entry["http_seconds"] = None  # vượt MAX_UPLOAD_MB
+                results.append(entry)
+
+                stages = " ".join(f"{name}={value * 1000:.1f}" for name, value in entry["stages"].items())
+                http = entry.get("http_seconds")
+                print(f"{entry['id']:>40} {entry['total_seconds']:>9.3f}s "
+                      f"rtf={entry['real_time_factor']:.4f} "
+                      f"mem={entry['peak_memory_mb']:.1f}MB"
+                      + (f" http={http:.3f}s" if http is not None else "")
+                      + f"  [{stages} ms]")
+    finally:
+        if client is not None:
+            client.__exit__(None, None, None)
+
+    report = {
+        "schema": SUITE_SCHEMA,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "environment": _suite_environment(),
+        "config": {
+            "profile": args.profile,
+            "backends": backends,
+            "analyzer": SUITE_ANALYZER_OPTIONS,
+            "repeat": args.repeat,
+            "http": args.http
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"Kết quả: {args.output}")
+    else:
+        print(json.dumps(report, ensure_ascii=False))
+
+
+def _suite_metrics(entry: Dict[str, Any]) -> Dict[str, Tuple[float, float]]:
+    """Các giá trị so sánh của một kết quả: tên -> (giá trị, ngưỡng tuyệt đối tối thiểu)"""
+    values = {
+        "total_seconds": (entry["total_seconds"], COMPARE_MIN_SECONDS),
+        "peak_memory_mb": (entry["peak_memory_mb"], COMPARE_MIN_MEMORY_MB)
+    }
+    if entry.get("http_seconds") is not None:
+        values["http_seconds"] = (entry["http_seconds"], COMPARE_MIN_SECONDS)
+    for name, seconds in entry["stages"].items():
+        values[f"stage.{name}"] = (seconds, COMPARE_MIN_SECONDS)
+    return values
+
+
+def bench_compare(args: argparse.Namespace) -> None:
+    """
+    So sánh hai kết quả của `suite`: giá trị tăng quá --tolerance (tương đối)
+    là hồi quy; số frame theo loại khác nhau nghĩa là kết quả phân tích đã
+    đổi. Thoát với mã 1 nếu có hồi quy hoặc kết quả khác.
+    """
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.current, encoding="utf-8") as handle:
+        current = json.load(handle)
+
+    if baseline["environment"] != current["environment"]:
+        print("Cảnh báo: môi trường của hai lần chạy khác nhau")
+        for key in sorted(set(baseline["environment"]) | set(current["environment"])):
+            before, after = baseline["environment"].get(key), current["environment"].get(key)
+            if before != after:
+                print(f"  {key}: {before} -> {after}")
+
+    print(f"baseline: {baseline.get('revision')} ({baseline['created']}), "
+          f"current: {current.get('revision')} ({current['created']})")
+    previous = {entry["id"]: entry for entry in baseline["results"]}
+    problems = 0
+    print(f"{'id':>40} {'metric':>18} {'baseline':>10} {'current':>10} {'change':>8}")
+    for entry in current["results"]:
+        before = previous.pop(entry["id"], None)
+        if before is None:
+            print(f"{entry['id']:>40} {'(mới)':>18}")
+            continue
+        if before["corpus"]["sha256"] != entry["corpus"]["sha256"]:
+            print(f"{entry['id']:>40} {'corpus khác':>18}  (không so sánh)")
+            continue
+        if before["frames"] != entry["frames"]:
+            problems += 1
+            print(f"{entry['id']:>40} {'frames':>18} {before['frames']} -> {entry['frames']}  OUTPUT CHANGED")
+
+        old_values = _suite_metrics(before)
+        for name, (value, min_delta) in _suite_metrics(entry).items():
+            if name not in old_values:
+                continue
+            old = old_values[name][0]
+            change = (value - old) / old if old > 0 else 0.0
+            regressed = change > args.tolerance and value - old > min_delta
+            improved = change < -args.tolerance and old - value > min_delta
+            if regressed or improved or args.verbose:
+                flag = "REGRESSION" if regressed else ("faster" if improved else "")
+                print(f"{entry['id']:>40} {name:>18} {old:>10.4f} {value:>10.4f} "
+                      f"{change:>+7.1%}  {flag}")
+            problems += regressed
+
+    for missing in previous:
+        print(f"{missing:>40} {'(không còn)':>18}")
+
+    print(f"{problems} hồi quy (tolerance {args.tolerance:.0%})")
+    if problems:
+        sys.exit(1)
+
+
+DESKTOP_DIR = os.path.join(ROOT_DIR, "desktop_client")
+# Đoạn mã chạy trong interpreter mới: in thời gian (giây) của `statement`
+_STARTUP_SNIPPET = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "{statement}\n"
+    "sys.stdout.write(repr(time.perf_counter() - start))\n"
+)
+
+
+def _fresh_seconds(statement: str, cwd: str, repeat: int) -> Tuple[Optional[float], str]:
+    """
+    Thời gian trung vị của `statement` trong `repeat` interpreter mới
+
+    Returns:
+        (giây, "") hoặc (None, dòng lỗi cuối) nếu không chạy được (thiếu module...)
+    """
+    times = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SNIPPET.format(statement=statement)],
+            cwd=cwd, capture_output=True, text=True
+        )
+        if completed.returncode != 0:
+            lines = completed.stderr.strip().splitlines()
+            return None, lines[-1] if lines else f"exit code {completed.returncode}"
+        times.append(float(completed.stdout))
+    return float(np.median(times)), ""
+
+
+def _import_breakdown(module: str, cwd: str, top: int) -> List[Tuple[str, float]]:
+    """Các module con trực tiếp tốn thời gian nhất khi import `module` (python -X importtime)"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    children = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        # " tên" là `module`, thêm 2 khoảng trắng mỗi cấp: chỉ lấy cấp ngay dưới
+        if len(name) - len(name.lstrip()) != 3:
+            continue
+        children.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(children, key=lambda item: item[1], reverse=True)[:top]
+
+
+def _server_startup(timeout: float = 180.0) -> Dict[str, Optional[float]]:
+    """
+    Khởi động uvicorn main:app trong tiến trình mới: thời gian tới response
+    đầu tiên của /health/ (server nhận request) và tới 200 (warm-up xong)
+    """
+    import http.client
+    import socket
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    responsive = ready = None
+    try:
+        while ready is None and time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                break
+            try:
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                connection.request("GET", "/health/")
+                status = connection.getresponse().status
+                connection.close()
+            except OSError:
+                time.sleep(0.02)
+                continue
+            elapsed = time.perf_counter() - start
+            responsive = responsive if responsive is not None else elapsed
+            if status == 200:
+                ready = elapsed
+            else:
+                time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait()
+    return {"responsive": responsive, "ready": ready}
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    """
+    Thời gian khởi động: import server (main.py) và desktop client trong
+    interpreter mới, các dependency nặng được import lúc dùng lần đầu
+    (librosa.core/numba/scipy, requests, pyaudio), và thời gian tới khi server nhận
+    request / warm-up xong
+    """
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    checks = [
+        ("server: import main", "import main", server_dir),
+        ("server: import analysis", "import analysis", server_dir),
+        ("  lần đầu phân tích: librosa", "import analysis, scipy.stats; analysis._pyin_internals()", server_dir),
+        ("desktop: import desktop_app", "import desktop_app", DESKTOP_DIR),
+        ("  lần đầu gửi file: requests", "import requests", DESKTOP_DIR),
+        ("  lần đầu ghi âm: pyaudio", "import pyaudio; pyaudio.PyAudio().terminate()", DESKTOP_DIR)
+    ]
+    print(f"Trung vị của {args.repeat} interpreter mới (chưa tính khởi động Python)")
+    for label, statement, cwd in checks:
+        seconds, error = _fresh_seconds(statement, cwd, args.repeat)
+        if seconds is None:
+            print(f"{label:>32}   bỏ qua ({error})")
+        else:
+            print(f"{label:>32} {seconds * 1000:>9.1f} ms")
+
+    print("\nModule tốn thời gian nhất khi import main.py:")
+    for name, seconds in _import_breakdown("main", server_dir, args.top):
+        print(f"{name:>32} {seconds * 1000:>9.1f} ms")
+
+    if not args.no_server:
+        timings = _server_startup()
+        print("\nuvicorn main:app (tính cả khởi động Python):")
+        for label, key in (("/health/ trả lời", "responsive"), ("/health/ 200 (warm-up xong)", "ready")):
+            value = timings[key]
+            print(f"{label:>32} " + (f"{value:>9.2f} s" if value is not None else "      lỗi"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark AudioAnalyzer")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    classify = subparsers.add_parser(
+        "classify",
+        help="So sánh vòng lặp phân loại cũ với đường dạng cột"
+    )
+    classify.add_argument("--audio", help="File âm thanh (mặc định: 60s noise)")
+    classify.add_argument("--repeat", type=int, default=3)
+    classify.set_defaults(func=bench_classify)
+
+    f0 = subparsers.add_parser(
+        "f0",
+        help="Tốc độ và độ trùng nhãn của các backend F0 so với pyin"
+    )
+    f0.add_argument("--duration", type=float, default=30.0)
+    f0.add_argument("--seed", type=int, default=0)
+    f0.add_argument("--gate", action="store_true",
+                    help="Đo thêm chế độ f0_gating (bỏ qua đoạn im lặng)")
+    f0.set_defaults(func=bench_f0)
+
+    formats = subparsers.add_parser(
+        "formats",
+        help="Thời gian mã hóa và kích thước của các định dạng response"
+    )
+    formats.add_argument("--audio", help="File âm thanh (mặc định: 60s noise)")
+    formats.add_argument("--repeat", type=int, default=3)
+    formats.set_defaults(func=bench_formats)
+
+    stream = subparsers.add_parser(
+        "stream",
+        help="Kiểm tra streaming giống hệt batch và đo bộ nhớ đỉnh"
+    )
+    stream.add_argument("--duration", type=float, default=2400.0)
+    stream.add_argument("--seed", type=int, default=0)
+    stream.add_argument("--backend", choices=F0_BACKENDS, default="nccf")
+    stream.add_argument("--gate", action="store_true")
+    stream.add_argument("--block-frames", type=int, default=STREAM_BLOCK_FRAMES)
+    stream.set_defaults(func=bench_stream)
+
+    live = subparsers.add_parser(
+        "live",
+        help="Chi phí mỗi buffer microphone của phân tích live (/ws/analyze)"
+    )
+    live.add_argument("--duration", type=float, default=600.0)
+    live.add_argument("--seed", type=int, default=0)
+    live.add_argument("--backend", choices=LIVE_F0_BACKENDS, default="nccf")
+    live.add_argument("--gate", action="store_true")
+    live.set_defaults(func=bench_live)
+
+    resample = subparsers.add_parser(
+        "resample",
+        help="Chi phí mỗi giây audio theo sample rate nguồn: gốc so với 16kHz"
+    )
+    resample.add_argument("--duration", type=float, default=60.0)
+    resample.add_argument("--seed", type=int, default=0)
+    resample.add_argument("--backend", choices=F0_BACKENDS, default="yin")
+    resample.set_defaults(func=bench_resample)
+
+    overhead = subparsers.add_parser(
+        "overhead",
+        help="Chi phí cố định mỗi lần gọi trên clip ngắn: analyzer mới so với registry"
+    )
+    overhead.add_argument("--repeat", type=int, default=5)
+    overhead.add_argument("--seed", type=int, default=0)
+    overhead.set_defaults(func=bench_overhead)
+
+    cost = subparsers.add_parser(
+        "cost",
+        help="Mô hình chi phí (/stats/) so với thời gian CPU thực"
+    )
+    cost.add_argument("--duration", type=float, default=60.0)
+    cost.add_argument("--seed", type=int, default=0)
+    cost.set_defaults(func=bench_cost)
+
+    threshold = subparsers.add_parser(
+        "threshold",
+        help="Ngưỡng năng lượng cố định so với thích ứng ở nhiều mức âm lượng/nhiễu"
+    )
+    threshold.add_argument("--duration", type=float, default=120.0)
+    threshold.add_argument("--seed", type=int, default=0)
+    threshold.add_argument("--backend", choices=F0_BACKENDS, default="yin")
+    threshold.add_argument("--block-frames", type=int, default=512)
+    threshold.set_defaults(func=bench_threshold)
+
+    suite = subparsers.add_parser(
+        "suite",
+        help="Bộ benchmark tái lập trên corpus sinh theo seed, kết quả JSON"
+    )
+    suite.add_argument("--profile", choices=SUITE_PROFILES, default="quick",
+                       help="Bộ corpus: quick (1-60s), standard (tới 10 phút), full (tới 2 giờ)")
+    suite.add_argument("--durations", help="Thay profile: danh sách thời lượng (giây), vd. 1,60,7200")
+    suite.add_argument("--sample-rates", help="Thay profile: danh sách sample rate, vd. 16000,44100")
+    suite.add_argument("--voiced-ratios", help="Thay profile: danh sách tỉ lệ voiced, vd. 0.2,0.6")
+    suite.add_argument("--silence-ratio", type=float, default=0.3)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--backends", default="yin,nccf",
+                       help="Các backend F0, phân cách bằng dấu phẩy")
+    suite.add_argument("--repeat", type=int, default=3,
+                       help=f"Số lần đo (lấy tốt nhất); file > {SUITE_REPEAT_MAX_SECONDS}s đo một lần")
+    suite.add_argument("--http", action="store_true",
+                       help="Đo thêm round-trip POST /analyze/ (server trong tiến trình)")
+    suite.add_argument("--corpus-dir",
+                       default=os.path.join(tempfile.gettempdir(), "voice_analysis_corpus"))
+    suite.add_argument("-o", "--output", help="File JSON kết quả (mặc định: in ra stdout)")
+    suite.set_defaults(func=bench_suite)
+
+    compare = subparsers.add_parser(
+        "compare",
+        help="So sánh hai kết quả của suite, báo hồi quy vượt tolerance"
+    )
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--tolerance", type=float, default=0.15,
+                         help="Mức tăng tương đối tối đa (0.15 = 15%%)")
+    compare.add_argument("--verbose", action="store_true", help="In mọi giá trị")
+    compare.set_defaults(func=bench_compare)
+
+    startup = subparsers.add_parser(
+        "startup",
+        help="Thời gian import của server/desktop client và khởi động uvicorn"
+    )
+    startup.add_argument("--repeat", type=int, default=5)
+    startup.add_argument("--top", type=int, default=8, help="Số module nặng nhất được liệt kê")
+    startup.add_argument("--no-server", action="store_true", help="Không đo khởi động uvicorn")
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
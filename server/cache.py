@@ -0,0 +1,270 @@
+"""
+Cache kết quả phân tích theo nội dung file (content-addressed)
+Cùng nội dung audio + cùng tham số phân tích -> cùng kết quả
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng/thuật toán của kết quả, nằm trong mọi khóa cache: tăng
+# khi thay đổi làm kết quả khác đi, để cache đĩa giữ qua deploy không trả về
+# kết quả của phiên bản cũ
+CACHE_FORMAT_VERSION = 2
+# Phần mở rộng file tầng đĩa (nội dung có thể là JSON hoặc nhị phân);
+# file .json của phiên bản trước vẫn được tính vào ngân sách để bị xóa dần
+ENTRY_SUFFIX = ".entry"
+LEGACY_SUFFIX = ".json"
+
+# Tầng đĩa: dung lượng được cộng dồn theo từng lần ghi, chỉ quét lại thư mục
+# khi ước lượng vượt ngân sách hoặc sau mỗi khoảng này (đồng bộ với các
+# worker khác dùng chung thư mục)
+DISK_RESCAN_SECONDS = 60.0
+# File tạm (*.tmp) cũ hơn khoảng này là phần còn sót của lần ghi bị gián đoạn
+STALE_TEMP_SECONDS = 300.0
+
+
+def make_cache_key(audio_digest: str, config: Dict[str, Any]) -> str:
+    """
+    Tạo khóa cache từ hash nội dung audio, tham số phân tích và
+    CACHE_FORMAT_VERSION
+
+    Args:
+        audio_digest: SHA-256 (hex) của nội dung file
+        config: Tham số hiệu lực của AudioAnalyzer (và định dạng kết quả)
+
+    Returns:
+        Khóa dạng hex, dùng được làm tên file
+    """
+    config_json = json.dumps(config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(
+        f"v{CACHE_FORMAT_VERSION}:{audio_digest}:{config_json}".encode()
+    ).hexdigest()
+
+
+class ResultCache:
+    """
+    Cache hai tầng cho kết quả đã mã hóa (bytes)
+
+    - Tầng bộ nhớ: LRU giới hạn tổng số byte
+    - Tầng đĩa (tùy chọn): mỗi khóa một file; vượt ngân sách thì xóa file
+      ít được dùng nhất (theo mtime, được cập nhật khi hit). Thư mục có thể
+      dùng chung giữa nhiều worker: dung lượng được cộng dồn khi ghi và
+      tính lại từ thư mục khi vượt ngân sách hoặc sau DISK_RESCAN_SECONDS,
+      nên mỗi lần ghi không phải quét toàn bộ thư mục
+
+    Attributes:
+        memory_budget: Tổng số byte tối đa của tầng bộ nhớ
+        disk_dir: Thư mục tầng đĩa, None để tắt
+        disk_budget: Tổng số byte tối đa của tầng đĩa
+    """
+
+    def __init__(
+        self,
+        memory_budget: int,
+        disk_dir: Optional[str] = None,
+        disk_budget: int = 0,
+        rescan_seconds: float = DISK_RESCAN_SECONDS
+    ):
+        self.memory_budget = memory_budget
+        self.disk_dir = disk_dir
+        self.disk_budget = disk_budget
+        self.rescan_seconds = rescan_seconds
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._disk_scanned_at = 0.0
+        self._lock = threading.Lock()
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._scan_disk())
+            self._disk_scanned_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_budget > 0 or bool(self.disk_dir)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Lấy giá trị theo khóa, None nếu không có (tính vào hit/miss)"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return value
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.counters["misses"] += 1
+                return None
+            self.counters["disk_hits"] += 1
+            self._store_memory(key, value)
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        """Lưu giá trị vào cả hai tầng"""
+        with self._lock:
+            self.counters["stores"] += 1
+            self._store_memory(key, value)
+        self._write_disk(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """Bộ đếm hit/miss và dung lượng đang dùng"""
+        with self._lock:
+            lookups = sum(
+                self.counters[name] for name in ("memory_hits", "disk_hits", "misses")
+            )
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_budget": self.memory_budget,
+                "disk_bytes": self._disk_bytes,
+                "disk_budget": self.disk_budget if self.disk_dir else 0
+            }
+
+    def _store_memory(self, key: str, value: bytes) -> None:
+        """Thêm vào LRU bộ nhớ và xóa mục cũ nhất cho tới khi vừa ngân sách"""
+        if len(value) > self.memory_budget:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+
+        while self._memory_bytes > self.memory_budget:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.counters["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}{ENTRY_SUFFIX}")
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)  # đánh dấu vừa được dùng
+            return value
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to read cache file: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, value: bytes) -> None:
+        if not self.disk_dir or len(value) > self.disk_budget:
+            return
+
+        path = self._disk_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            previous_size = os.path.getsize(path)
+        except OSError:
+            previous_size = 0
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(value)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to write cache file: {str(e)}")
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self._lock:
+            self._disk_bytes += len(value) - previous_size
+            stale = time.monotonic() - self._disk_scanned_at >= self.rescan_seconds
+            if stale or self._disk_bytes > self.disk_budget:
+                self._evict_disk()
+
+    def _scan_disk(self) -> List[Tuple[float, int, str]]:
+        """
+        Liệt kê các file cache (*.entry, *.json cũ) trên đĩa
+
+        Bỏ qua file tạm (*.tmp) đang được tiến trình khác ghi và file bị
+        xóa giữa chừng bởi tiến trình khác; file tạm cũ hơn
+        STALE_TEMP_SECONDS (tiến trình ghi đã chết) bị xóa.
+
+        Returns:
+            Danh sách (mtime, kích thước, đường dẫn)
+        """
+        entries = []
+        stale_before = time.time() - STALE_TEMP_SECONDS
+        try:
+            with os.scandir(self.disk_dir) as scan:
+                for entry in scan:
+                    is_temp = entry.name.endswith(".tmp")
+                    if not is_temp and not entry.name.endswith((ENTRY_SUFFIX, LEGACY_SUFFIX)):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if is_temp:
+                        if stat.st_mtime < stale_before:
+                            self._remove_stale_temp(entry.path)
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError as e:
+            logger.warning(f"Failed to scan cache directory: {str(e)}")
+        return entries
+
+    @staticmethod
+    def _remove_stale_temp(path: str) -> None:
+        try:
+            os.unlink(path)
+            logger.info(f"Removed stale cache temp file: {path}")
+        except OSError:
+            pass
+
+    def _evict_disk(self) -> None:
+        """
+        Quét lại thư mục, xóa file ít được dùng nhất cho tới khi tầng đĩa
+        vừa ngân sách
+        """
+        entries = self._scan_disk()
+        self._disk_scanned_at = time.monotonic()
+        self._disk_bytes = sum(size for _, size, _ in entries)
+        if self._disk_bytes <= self.disk_budget:
+            return
+
+        for _, size, path in sorted(entries):
+            if self._disk_bytes <= self.disk_budget:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # Tiến trình khác vừa xóa: không còn chiếm chỗ
+                self._disk_bytes -= size
+                continue
+            except OSError:
+                continue
+            self._disk_bytes -= size
+            self.counters["evictions"] += 1
@@ -0,0 +1,449 @@
+"""
+Phân tích hàng loạt file âm thanh trên đĩa, không qua HTTP
+
+Cách chạy (từ thư mục server/):
+    python -m analysis DIR [DIR ...] -o results.jsonl [--backend nccf] [--mode runs]
+    python -m analysis DIR -o results/ --format columns [--workers 8]
+
+Kết quả:
+- jsonl: mỗi file một dòng JSON giống response của /analyze/, filename là
+  đường dẫn tương đối so với thư mục được quét
+- columns: mỗi file một file nhị phân dạng cột <output>/<đường dẫn>.vuvc
+  (định dạng application/vnd.voiceanalysis.columns, xem formats.py)
+
+Manifest (mặc định <output>.manifest.jsonl) ghi lại từng file đã xử lý.
+Chạy lại cùng lệnh sẽ bỏ qua các file đã xong (cùng kích thước và mtime),
+nên có thể dừng (Ctrl+C) hoặc bị kill giữa chừng rồi chạy tiếp.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from analysis import (
+    AudioAnalyzer, F0_BACKENDS, RESPONSE_MODES, SUPPORTED_FORMATS, THRESHOLD_MODES,
+    get_analyzer, get_audio_duration
+)
+from formats import COLUMNS_BINARY_MEDIA_TYPE, JSON_MEDIA_TYPE, attach_filename, encode_result
+
+OUTPUT_FORMATS = ("jsonl", "columns")
+COLUMNS_SUFFIX = ".vuvc"
+MANIFEST_SUFFIX = ".manifest.jsonl"
+
+# AudioAnalyzer của worker hiện tại (tạo một lần trong _init_worker)
+_analyzer: Optional[AudioAnalyzer] = None
+
+
+class ManifestError(Exception):
+    """Manifest không khớp với lệnh hoặc file kết quả hiện tại"""
+
+
+def iter_audio_files(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    """
+    Duyệt các file âm thanh (SUPPORTED_FORMATS) theo thứ tự tên
+
+    Yields:
+        (đường dẫn, khóa) - với một thư mục, khóa là đường dẫn tương đối so
+        với thư mục đó; với nhiều đường dẫn, khóa là đường dẫn tương đối so
+        với thư mục cha chung của chúng, nên a/data/x.wav và b/data/x.wav
+        không trùng khóa
+    """
+    base = _common_base(paths) if len(paths) > 1 else None
+    for root in paths:
+        if os.path.isfile(root):
+            yield root, _file_key(root, base) if base is not None else os.path.basename(root)
+            continue
+
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if os.path.splitext(name)[1].lower() not in SUPPORTED_FORMATS:
+                    continue
+                path = os.path.join(dirpath, name)
+                key = _file_key(path, base) if base is not None else os.path.relpath(path, root)
+                yield path, key.replace(os.sep, "/")
+
+
+def _common_base(paths: List[str]) -> str:
+    """Thư mục cha chung của các đường dẫn (rỗng nếu khác ổ đĩa)"""
+    try:
+        return os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in paths])
+    except ValueError:
+        return ""
+
+
+def _file_key(path: str, base: str) -> str:
+    """Khóa của file: đường dẫn tương đối so với base, tuyệt đối nếu không có base"""
+    path = os.path.abspath(path)
+    return os.path.relpath(path, base) if base else path
+
+
+class Manifest:
+    """
+    Nhật ký JSONL các file đã xử lý, ghi thêm (append) sau mỗi file
+
+    Dòng đầu tiên là header (tham số phân tích, định dạng kết quả); mỗi
+    dòng sau là một file: key, size, mtime_ns, status, error, seconds và
+    output_end (độ dài file JSONL sau khi ghi dòng kết quả của file này).
+
+    Attributes:
+        path: Đường dẫn manifest
+        header: Tham số của lần chạy
+        entries: Dòng mới nhất của mỗi khóa
+    """
+
+    def __init__(self, path: str, header: Dict[str, Any]):
+        self.path = path
+        self.header = header
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.output_end = 0
+        self._file = None
+
+    def load(self) -> None:
+        """
+        Đọc manifest có sẵn (nếu có)
+
+        Raises:
+            ManifestError: Nếu manifest được tạo với tham số khác
+        """
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        if not lines:
+            return
+
+        header = json.loads(lines[0])
+        if header != self.header:
+            previous = {**header.get("config", {}), **header}
+            current = {**self.header["config"], **self.header}
+            changed = ", ".join(
+                f"{name}={previous.get(name)}" for name in current
+                if name != "config" and previous.get(name) != current[name]
+            )
+            raise ManifestError(
+                f"Manifest {self.path} was created with different parameters "
+                f"({changed}); use another --output or --manifest"
+            )
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                break  # dòng cuối bị cắt ngang khi tiến trình bị kill
+            self.entries[entry["key"]] = entry
+            self.output_end = entry.get("output_end", self.output_end)
+
+    def is_done(self, key: str, stat: os.stat_result, retry_failed: bool) -> bool:
+        """File đã được xử lý (và chưa thay đổi) trong lần chạy trước"""
+        entry = self.entries.get(key)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            return False
+        return entry["status"] == "ok" or not retry_failed
+
+    def open(self) -> None:
+        """Mở để ghi thêm; ghi header nếu manifest mới"""
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", encoding="utf-8")
+        if new:
+            self._write(self.header)
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        self.entries[entry["key"]] = entry
+        self._write(entry)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, data: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._file.flush()
+
+
+class Progress:
+    """Dòng tiến độ trên stderr: số file, tốc độ, thời gian còn lại, số lỗi"""
+
+    def __init__(self, total: int, interval: float = 0.5):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0.0
+        self.started = time.perf_counter()
+        self.interactive = sys.stderr.isatty()
+        # Không phải terminal (cron, log file): mỗi 10 giây một dòng
+        self.interval = interval if self.interactive else 10.0
+        self._last = 0.0
+
+    def update(self, ok: bool, audio_seconds: Optional[float]) -> None:
+        self.done += 1
+        self.failed += not ok
+        self.audio_seconds += audio_seconds or 0.0
+        now = time.perf_counter()
+        if now - self._last >= self.interval or self.done == self.total:
+            self._last = now
+            self._render(now - self.started)
+
+    def _render(self, elapsed: float) -> None:
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = (self.total - self.done) / rate if rate else 0.0
+        percent = 100.0 * self.done / self.total if self.total else 100.0
+        line = (f"[{self.done:>{len(str(self.total))}}/{self.total}] {percent:5.1f}% | "
+                f"{rate:6.1f} files/s | ETA {_format_seconds(remaining)} | "
+                f"failed {self.failed}")
+        if self.interactive:
+            end = "\n" if self.done == self.total else ""
+            sys.stderr.write(f"\r{line}{end}")
+        else:
+            sys.stderr.write(f"{line}\n")
+        sys.stderr.flush()
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def _init_worker(options: Dict[str, Any]) -> None:
+    """Lấy AudioAnalyzer (registry, xem get_analyzer) một lần cho mỗi worker"""
+    global _analyzer
+    _analyzer = get_analyzer(**options)
+
+
+def _process_file(task: Tuple[str, str, str, str, Optional[str]]) -> Dict[str, Any]:
+    """
+    Phân tích một file trên worker
+
+    Với định dạng columns, worker tự ghi file kết quả (ghi file tạm rồi đổi
+    tên) để không phải gửi dữ liệu về tiến trình chính.
+
+    Returns:
+        key, ok, error, seconds, audio_duration, line (bytes, với jsonl)
+    """
+    path, key, mode, output_format, output_dir = task
+    started = time.perf_counter()
+    outcome = {"key": key, "ok": True, "error": None, "line": None}
+    try:
+        if output_format == "columns":
+            result = _analyzer.analyze_columns(path, key)
+            body = attach_filename(
+                encode_result(result, COLUMNS_BINARY_MEDIA_TYPE), key, COLUMNS_BINARY_MEDIA_TYPE
+            )
+            target = os.path.join(output_dir, key + COLUMNS_SUFFIX)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temp_path = f"{target}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(body)
+            os.replace(temp_path, target)
+        else:
+            result = _analyzer.analyze(path, key, mode)
+            outcome["line"] = attach_filename(
+                encode_result(result, JSON_MEDIA_TYPE), key, JSON_MEDIA_TYPE
+            )
+    except Exception as e:
+        outcome["ok"] = False
+        outcome["error"] = str(e) or type(e).__name__
+    outcome["seconds"] = time.perf_counter() - started
+    outcome["audio_duration"] = get_audio_duration(path) if outcome["ok"] else None
+    return outcome
+
+
+def _imap_unordered(
+    pool: ProcessPoolExecutor,
+    func: Callable[[Any], Any],
+    tasks: Iterable[Any],
+    window: int
+) -> Iterator[Any]:
+    """Như Pool.imap_unordered nhưng chỉ giữ tối đa `window` tác vụ chờ"""
+    tasks = iter(tasks)
+    pending = set()
+    for task in tasks:
+        pending.add(pool.submit(func, task))
+        if len(pending) >= window:
+            break
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+            task = next(tasks, None)
+            if task is not None:
+                pending.add(pool.submit(func, task))
+
+
+def run(args: argparse.Namespace) -> int:
+    """
+    Phân tích mọi file chưa xử lý
+
+    Returns:
+        Mã thoát: 0 nếu mọi file thành công, 1 nếu có file lỗi,
+        2 nếu manifest không khớp, 130 nếu bị ngắt (Ctrl+C)
+    """
+    options = {
+        "f0_backend": args.backend,
+        "f0_gating": args.gate,
+        "threshold_mode": args.threshold_mode
+    }
+    if args.sample_rate > 0:
+        options.update(sample_rate=args.sample_rate, frame_ms=args.frame_ms, hop_ms=args.hop_ms)
+    manifest = Manifest(
+        args.manifest or args.output.rstrip("/\\") + MANIFEST_SUFFIX,
+        {
+            "config": get_analyzer(**options).config(),
+            "mode": args.mode,
+            "format": args.format
+        }
+    )
+    try:
+        manifest.load()
+    except ManifestError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    files = list(iter_audio_files(args.paths))
+    tasks = []
+    stats: Dict[str, os.stat_result] = {}
+    for path, key in files:
+        stats[key] = os.stat(path)
+        if not manifest.is_done(key, stats[key], args.retry_failed):
+            output_dir = args.output if args.format == "columns" else None
+            tasks.append((path, key, args.mode, args.format, output_dir))
+    print(f"Found {len(files)} files, {len(files) - len(tasks)} already processed, "
+          f"{len(tasks)} to analyze", file=sys.stderr)
+
+    output = None
+    if args.format == "jsonl":
+        output = _open_jsonl(args.output, manifest.output_end)
+        if output is None:
+            print(f"Error: {args.output} is shorter than recorded in {manifest.path}; "
+                  f"remove the manifest to start over", file=sys.stderr)
+            return 2
+    else:
+        os.makedirs(args.output, exist_ok=True)
+
+    manifest.open()
+    progress = Progress(len(tasks))
+    workers = max(1, args.workers)
+    try:
+        if workers == 1:
+            # Chạy ngay trong tiến trình chính (dễ debug, không tốn fork)
+            _init_worker(options)
+            outcomes = map(_process_file, tasks)
+            _collect(outcomes, output, manifest, stats, progress)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_worker,
+                initargs=(options,)
+            ) as pool:
+                outcomes = _imap_unordered(pool, _process_file, tasks, window=workers * 4)
+                _collect(outcomes, output, manifest, stats, progress)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after {progress.done} files; run the same command "
+              f"again to resume", file=sys.stderr)
+        return 130
+    finally:
+        manifest.close()
+        if output is not None:
+            output.close()
+
+    elapsed = time.perf_counter() - progress.started
+    realtime = f", {progress.audio_seconds / elapsed:.1f}x realtime" if elapsed and progress.audio_seconds else ""
+    print(f"Analyzed {progress.done} files ({progress.failed} failed) in {elapsed:.1f}s"
+          f"{realtime}", file=sys.stderr)
+    return 1 if progress.failed else 0
+
+
+def _open_jsonl(path: str, end: int) -> Optional[Any]:
+    """
+    Mở file JSONL để ghi thêm, cắt bỏ phần chưa có trong manifest
+
+    Dòng được ghi trước manifest, nên nếu tiến trình bị kill giữa hai lần
+    ghi, file kết quả có thể dài hơn output_end - phần đó bị cắt để file
+    được phân tích lại không bị trùng dòng.
+
+    Returns:
+        File đã mở, None nếu file ngắn hơn output_end (đã bị sửa/xóa)
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if size < end:
+        return None
+    output = open(path, "ab")
+    output.truncate(end)
+    output.seek(end)
+    return output
+
+
+def _collect(
+    outcomes: Iterable[Dict[str, Any]],
+    output: Optional[Any],
+    manifest: Manifest,
+    stats: Dict[str, os.stat_result],
+    progress: Progress
+) -> None:
+    """Ghi kết quả và manifest theo thứ tự hoàn thành"""
+    for outcome in outcomes:
+        key = outcome["key"]
+        if outcome["line"] is not None:
+            output.write(outcome["line"] + b"\n")
+            output.flush()
+        elif not outcome["ok"]:
+            newline = "\n" if progress.interactive else ""
+            print(f"{newline}Failed: {key}: {outcome['error']}", file=sys.stderr)
+
+        stat = stats[key]
+        manifest.record({
+            "key": key,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "status": "ok" if outcome["ok"] else "error",
+            "error": outcome["error"],
+            "seconds": round(outcome["seconds"], 4),
+            "output_end": output.tell() if output is not None else 0
+        })
+        progress.update(outcome["ok"], outcome["audio_duration"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m analysis",
+        description="Phân tích hàng loạt file âm thanh trên đĩa (không qua HTTP)"
+    )
+    parser.add_argument("paths", nargs="+", help="Thư mục (quét đệ quy) hoặc file âm thanh")
+    parser.add_argument("-o", "--output", required=True,
+                        help="File JSONL (--format jsonl) hoặc thư mục (--format columns)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="jsonl")
+    parser.add_argument("--backend", choices=F0_BACKENDS, default="pyin")
+    parser.add_argument("--gate", action="store_true",
+                        help="Bỏ qua F0 ở các đoạn im lặng (f0_gating)")
+    parser.add_argument("--threshold-mode", choices=THRESHOLD_MODES, default="fixed",
+                        help="Ngưỡng năng lượng cố định hoặc theo nền nhiễu của từng file")
+    parser.add_argument("--sample-rate", type=int, default=0,
+                        help="Tần số phân tích (Hz), 0 = giữ sample rate gốc (khuyến nghị 16000)")
+    parser.add_argument("--frame-ms", type=float, default=128.0,
+                        help="Độ dài khung (ms, khi có --sample-rate)")
+    parser.add_argument("--hop-ms", type=float, default=32.0,
+                        help="Bước nhảy giữa các khung (ms, khi có --sample-rate)")
+    parser.add_argument("--mode", choices=RESPONSE_MODES, default="frames",
+                        help="Định dạng segments của jsonl (columns luôn là frames)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Số tiến trình phân tích (1 = chạy trong tiến trình chính)")
+    parser.add_argument("--manifest", help="Đường dẫn manifest (mặc định <output>.manifest.jsonl)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Phân tích lại các file lỗi trong lần chạy trước")
+    args = parser.parse_args()
+
+    if args.format == "columns" and args.mode != "frames":
+        parser.error("--format columns only supports --mode frames")
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Bộ thực thi tác vụ phân tích - Chạy công việc CPU-bound ngoài event loop
+Tuân thủ tiêu chuẩn S-P2: main.py chỉ gọi vào, không tự quản lý pool
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import collect_stages, merge_stages
+
+logger = logging.getLogger(__name__)
+
+# Các loại pool được hỗ trợ
+# - process: tránh GIL, phù hợp với pyin/numpy nặng CPU (mặc định)
+# - thread: nhẹ hơn, dùng khi môi trường không cho phép fork
+EXECUTOR_KINDS = ("process", "thread")
+
+# Chu kỳ worker process kiểm tra tiến trình cha còn sống
+PARENT_CHECK_SECONDS = 1.0
+# Thời gian tối đa chờ mọi worker khởi tạo xong trong warm()
+WARM_UP_TIMEOUT_SECONDS = 600.0
+
+
+class QueueFullError(Exception):
+    """Số tác vụ đang chờ/chạy đã đạt giới hạn của AnalysisExecutor"""
+
+
+def _check_in(barrier: Any) -> Tuple[int, int]:
+    """
+    Tác vụ warm-up: chờ ở barrier cho tới khi đủ mọi worker
+
+    Tác vụ chỉ chạy sau initializer của worker, và giữ worker tới khi đủ
+    `workers` tác vụ cùng chờ - nên mỗi tác vụ nằm trên một worker khác
+    nhau, và barrier mở ra khi mọi worker đã khởi tạo xong.
+
+    Returns:
+        Mã của worker: (pid, thread id)
+    """
+    barrier.wait(WARM_UP_TIMEOUT_SECONDS)
+    return os.getpid(), threading.get_ident()
+
+
+def _watch_parent(parent_pid: int) -> None:
+    """Thoát ngay khi tiến trình cha chết (getppid đổi), kể cả khi đang phân tích"""
+    while os.getppid() == parent_pid:
+        time.sleep(PARENT_CHECK_SECONDS)
+    os._exit(1)
+
+
+def _process_initializer(
+    parent_pid: int,
+    initializer: Optional[Callable[[], None]]
+) -> None:
+    """
+    Initializer của worker process: gắn watchdog rồi chạy initializer gốc
+
+    Tiến trình cha bị SIGKILL thì không kịp dừng pool; watchdog bảo đảm
+    worker không mồ côi (ppid 1) và giữ bộ nhớ mãi.
+    """
+    threading.Thread(
+        target=_watch_parent,
+        args=(parent_pid,),
+        name="parent-watchdog",
+        daemon=True
+    ).start()
+    if initializer is not None:
+        initializer()
+
+
+class AnalysisExecutor:
+    """
+    Pool worker có giới hạn cho các tác vụ phân tích
+
+    Tối đa `workers` tác vụ chạy đồng thời và `queue_depth` tác vụ chờ;
+    vượt quá sẽ bị từ chối ngay bằng QueueFullError thay vì xếp hàng vô hạn.
+
+    Attributes:
+        kind: Loại pool ("process" hoặc "thread")
+        workers: Số worker
+        queue_depth: Số tác vụ được phép chờ khi mọi worker đều bận
+        initializer: Hàm chạy một lần trong mỗi worker khi khởi tạo
+    """
+
+    def __init__(
+        self,
+        kind: str = "process",
+        workers: int = 2,
+        queue_depth: int = 8,
+        initializer: Optional[Callable[[], None]] = None
+    ):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(
+                f"Unknown executor kind: {kind}. "
+                f"Supported kinds: {', '.join(EXECUTOR_KINDS)}"
+            )
+
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.initializer = initializer
+        self.in_flight = 0
+        self.rejected = 0
+        self._pool: Optional[Executor] = None
+
+    @property
+    def capacity(self) -> int:
+        """Tổng số tác vụ được nhận cùng lúc (đang chạy + đang chờ)"""
+        return self.workers + self.queue_depth
+
+    @property
+    def queued(self) -> int:
+        """Số tác vụ đang chờ worker rảnh"""
+        return max(0, self.in_flight - self.workers)
+
+    async def start(self, wait: bool = True) -> None:
+        """
+        Tạo pool và khởi động sẵn toàn bộ worker
+
+        Mỗi worker chạy initializer (import + warm-up) ngay lúc này,
+        để request đầu tiên không phải chờ.
+
+        Args:
+            wait: False để trả về ngay sau khi tạo pool, warm-up chạy nền
+                (xem warm); tác vụ gửi tới trong lúc đó chờ worker sẵn sàng
+        """
+        if self.kind == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_process_initializer,
+                initargs=(os.getpid(), self.initializer)
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="analysis",
+                initializer=self.initializer
+            )
+        if wait:
+            await self.warm()
+
+    async def warm(self) -> List[Tuple[int, int]]:
+        """
+        Chờ mọi worker của pool đã start khởi tạo xong (chạy xong initializer)
+
+        Gửi `workers` tác vụ cùng chờ ở một barrier (xem _check_in): worker
+        khởi tạo xong trước không thể nhận hết các tác vụ rồi báo sẵn sàng
+        trong khi các worker khác còn đang import/biên dịch.
+
+        Returns:
+            Mã (pid, thread id) của từng worker
+        """
+        loop = asyncio.get_running_loop()
+        manager = None
+        if self.kind == "process":
+            manager = multiprocessing.Manager()
+            barrier = manager.Barrier(self.workers)
+        else:
+            barrier = threading.Barrier(self.workers)
+        try:
+            worker_ids = await asyncio.gather(*(
+                loop.run_in_executor(self._pool, _check_in, barrier)
+                for _ in range(self.workers)
+            ))
+        finally:
+            if manager is not None:
+                manager.shutdown()
+        logger.info(f"Analysis executor ready: {self.kind} x {self.workers}")
+        return worker_ids
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Chạy func(*args, **kwargs) trên pool và chờ kết quả
+
+        Thời gian các giai đoạn trong worker được cộng vào bộ gom của
+        request/job đang gọi (xem metrics.collect_stages).
+
+        Raises:
+            QueueFullError: Nếu đã có `capacity` tác vụ đang chờ/chạy
+            RuntimeError: Nếu pool chưa được start
+        """
+        if self._pool is None:
+            raise RuntimeError("Analysis executor is not started")
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Analysis queue is full ({self.in_flight}/{self.capacity})"
+            )
+
+        self.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, collected = await loop.run_in_executor(
+                self._pool,
+                partial(collect_stages, func, *args, **kwargs)
+            )
+            merge_stages(collected)
+            return result
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        """Dừng pool, chờ các tác vụ đang chạy hoàn tất"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Trạng thái hiện tại của pool"""
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected
+        }
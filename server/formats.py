@@ -0,0 +1,210 @@
+"""
+Định dạng response của kết quả phân tích - chọn theo header Accept
+
+/analyze/:
+- application/json (mặc định): hợp đồng F-S5, list segment {time, type, f0, energy}
+- application/vnd.voiceanalysis.columns+json: các mảng song song, type là
+  mã số (chỉ số vào frame_types) - không lặp lại tên trường ở mỗi frame
+- application/vnd.voiceanalysis.columns: nhị phân, header nhỏ + mảng
+  float32/uint8 (little-endian)
+
+/analyze/stream (mỗi sự kiện một object JSON):
+- application/x-ndjson (mặc định): mỗi dòng {"event": tên, ...dữ liệu}
+- text/event-stream: Server-Sent Events, "event: tên" + "data: dữ liệu"
+
+Bố cục nhị phân:
+    magic "VUVC" (4 byte) | độ dài header N (uint32) | header JSON (N byte,
+    đệm khoảng trắng tới bội số của 4) | các cột liên tiếp theo thứ tự
+    header["columns"] = [[tên, dtype numpy], ...]
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from analysis import FRAME_TYPES
+from metrics import stage
+
+JSON_MEDIA_TYPE = "application/json"
+COLUMNS_JSON_MEDIA_TYPE = "application/vnd.voiceanalysis.columns+json"
+COLUMNS_BINARY_MEDIA_TYPE = "application/vnd.voiceanalysis.columns"
+MEDIA_TYPES = (JSON_MEDIA_TYPE, COLUMNS_JSON_MEDIA_TYPE, COLUMNS_BINARY_MEDIA_TYPE)
+COLUMNAR_MEDIA_TYPES = (COLUMNS_JSON_MEDIA_TYPE, COLUMNS_BINARY_MEDIA_TYPE)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+STREAM_MEDIA_TYPES = (NDJSON_MEDIA_TYPE, EVENT_STREAM_MEDIA_TYPE)
+
+BINARY_MAGIC = b"VUVC"
+_BINARY_PREFIX = struct.Struct("<4sI")
+# Cột float32 trước, uint8 sau cùng - mọi cột float đều căn lề 4 byte
+BINARY_COLUMNS = (
+    ("time", "<f4"),
+    ("f0", "<f4"),
+    ("energy", "<f4"),
+    ("type", "|u1")
+)
+
+
+class NotAcceptableError(Exception):
+    """Header Accept không chứa định dạng nào server hỗ trợ"""
+
+
+def _parse_accept(accept: str) -> List[Tuple[str, float]]:
+    """Tách header Accept thành list (media type, q)"""
+    entries = []
+    for part in accept.split(","):
+        fields = [field.strip() for field in part.split(";")]
+        if not fields[0]:
+            continue
+        quality = 1.0
+        for param in fields[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        entries.append((fields[0].lower(), quality))
+    return entries
+
+
+def negotiate(
+    accept: Optional[str],
+    supported: Tuple[str, ...] = MEDIA_TYPES
+) -> str:
+    """
+    Chọn định dạng response theo header Accept
+
+    Không có header hoặc */* -> supported[0] (JSON F-S5 với /analyze/).
+    Khi nhiều định dạng cùng q, định dạng được liệt kê trước thắng.
+
+    Raises:
+        NotAcceptableError: Nếu không định dạng nào được chấp nhận
+    """
+    if not accept:
+        return supported[0]
+
+    best, best_quality = None, 0.0
+    for media_type, quality in _parse_accept(accept):
+        if media_type.endswith("/*"):
+            # */* hoặc type/* -> định dạng được hỗ trợ đầu tiên khớp tiền tố
+            prefix = "" if media_type == "*/*" else media_type[:-1]
+            candidate = next(
+                (supported_type for supported_type in supported
+                 if supported_type.startswith(prefix)),
+                None
+            )
+            if candidate is None:
+                continue
+        elif (media_type == "application/octet-stream"
+              and COLUMNS_BINARY_MEDIA_TYPE in supported):
+            candidate = COLUMNS_BINARY_MEDIA_TYPE
+        elif media_type in supported:
+            candidate = media_type
+        else:
+            continue
+        if quality > best_quality:
+            best, best_quality = candidate, quality
+
+    if best is None:
+        raise NotAcceptableError(
+            f"None of the requested media types are supported. "
+            f"Supported types: {', '.join(supported)}"
+        )
+    return best
+
+
+def encode_event(event: str, data: Dict[str, Any], media_type: str) -> bytes:
+    """Mã hóa một sự kiện của response streaming (xem STREAM_MEDIA_TYPES)"""
+    with stage("encode"):
+        if media_type == EVENT_STREAM_MEDIA_TYPE:
+            payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+            return f"event: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+        payload = json.dumps(
+            {"event": event, **data}, ensure_ascii=False, separators=(",", ":")
+        )
+        return f"{payload}\n".encode("utf-8")
+
+
+def encode_result(result: Dict[str, Any], media_type: str) -> bytes:
+    """
+    Mã hóa kết quả theo media_type, bỏ trường filename
+
+    Cùng nội dung audio có thể được upload dưới nhiều tên khác nhau, nên
+    phần được cache không chứa filename (xem attach_filename).
+
+    Args:
+        result: Kết quả của analyze_audio_file (JSON) hoặc
+            analyze_audio_columns (các định dạng dạng cột)
+        media_type: Một trong MEDIA_TYPES
+    """
+    with stage("encode"):
+        return _encode_result(result, media_type)
+
+
+def _encode_result(result: Dict[str, Any], media_type: str) -> bytes:
+    if media_type == COLUMNS_BINARY_MEDIA_TYPE:
+        return _encode_binary(result)
+
+    if media_type == COLUMNS_JSON_MEDIA_TYPE:
+        columns = result["columns"]
+        body = {
+            "total_segments": result["total_segments"],
+            "sample_rate": result["sample_rate"],
+            "params": result["params"],
+            "frame_types": list(FRAME_TYPES),
+            "columns": {name: values.tolist() for name, values in columns.items()}
+        }
+    else:
+        body = {key: value for key, value in result.items() if key != "filename"}
+
+    return json.dumps(
+        body,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def attach_filename(body: bytes, filename: str, media_type: str) -> bytes:
+    """Ghép filename vào kết quả đã mã hóa bởi encode_result"""
+    if media_type == COLUMNS_BINARY_MEDIA_TYPE:
+        header, offset = _read_binary_header(body)
+        return _pack_binary_header({"filename": filename, **header}) + body[offset:]
+
+    name = json.dumps(filename, ensure_ascii=False).encode("utf-8")
+    return b'{"filename":' + name + b"," + body[1:]
+
+
+def _encode_binary(result: Dict[str, Any]) -> bytes:
+    columns = result["columns"]
+    header = {
+        "total_segments": result["total_segments"],
+        "sample_rate": result["sample_rate"],
+        "params": result["params"],
+        "frame_types": list(FRAME_TYPES),
+        "columns": [list(column) for column in BINARY_COLUMNS]
+    }
+    parts = [_pack_binary_header(header)]
+    for name, dtype in BINARY_COLUMNS:
+        parts.append(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+    return b"".join(parts)
+
+
+def _pack_binary_header(header: Dict[str, Any]) -> bytes:
+    encoded = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    encoded += b" " * (-len(encoded) % 4)
+    return _BINARY_PREFIX.pack(BINARY_MAGIC, len(encoded)) + encoded
+
+
+def _read_binary_header(body: bytes) -> Tuple[Dict[str, Any], int]:
+    """Đọc header, trả về (header, vị trí bắt đầu của dữ liệu cột)"""
+    magic, length = _BINARY_PREFIX.unpack_from(body)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a columnar binary body")
+    offset = _BINARY_PREFIX.size + length
+    return json.loads(body[_BINARY_PREFIX.size:offset]), offset
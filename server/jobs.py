@@ -0,0 +1,312 @@
+"""
+Quản lý job phân tích bất đồng bộ - POST /jobs/ trả về job id ngay,
+client hỏi trạng thái và lấy kết quả sau (dành cho file dài)
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from executor import AnalysisExecutor, QueueFullError
+from formats import JSON_MEDIA_TYPE, attach_filename, encode_result
+from metrics import AnalysisMetrics, start_stages
+
+logger = logging.getLogger(__name__)
+
+# Trạng thái của job
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """
+    Một yêu cầu phân tích bất đồng bộ
+
+    Attributes:
+        id: Mã job (uuid hex)
+        filename: Tên file gốc do client upload
+        audio_path: File tạm chứa audio - job sở hữu và xóa khi kết thúc
+        audio_duration: Thời lượng audio (giây), None nếu không đọc được
+        options: Tham số cho AudioAnalyzer
+        status: Một trong QUEUED, RUNNING, DONE, FAILED, CANCELLED
+        result: Kết quả F-S5 khi DONE, đã mã hóa JSON (bytes)
+        error: Thông báo lỗi khi FAILED
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        audio_path: str,
+        audio_duration: Optional[float],
+        options: Dict[str, Any]
+    ):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.audio_path = audio_path
+        self.audio_duration = audio_duration
+        self.options = options
+        self.status = QUEUED
+        self.result: Optional[bytes] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def to_dict(self, progress: Optional[float]) -> Dict[str, Any]:
+        """Trạng thái job dạng JSON (không kèm kết quả)"""
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "progress": progress,
+            "audio_duration": self.audio_duration,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+
+class JobStore:
+    """
+    Kho job trong bộ nhớ, chạy job trên AnalysisExecutor dùng chung
+
+    - Tối đa `concurrency` job được gửi vào executor cùng lúc, để
+      request đồng bộ /analyze/ vẫn còn chỗ trong hàng đợi
+    - Tối đa `max_active` job chưa kết thúc; vượt quá -> QueueFullError
+    - Job đã kết thúc bị xóa sau `ttl_seconds`, hoặc sớm hơn (cũ nhất
+      trước) khi vượt `max_finished` job hay `max_result_bytes` tổng kích
+      thước kết quả - bộ nhớ giữ kết quả không tăng theo số job được gửi
+
+    Attributes:
+        executor: Pool phân tích dùng chung với /analyze/
+        concurrency: Số job chạy đồng thời
+        max_active: Số job QUEUED + RUNNING tối đa
+        ttl_seconds: Thời gian giữ job đã kết thúc (giây)
+        max_finished: Số job đã kết thúc được giữ tối đa
+        max_result_bytes: Tổng kích thước kết quả được giữ tối đa (bytes)
+        retry_delay: Thời gian chờ khi executor đầy trước khi thử lại (giây)
+        metrics: Ghi nhận giai đoạn và hệ số thời gian thực của mỗi job
+            (job chạy nền, sau khi request tạo job đã kết thúc)
+    """
+
+    def __init__(
+        self,
+        executor: AnalysisExecutor,
+        concurrency: int = 1,
+        max_active: int = 32,
+        ttl_seconds: float = 3600,
+        max_finished: int = 256,
+        max_result_bytes: int = 256 * 1024 * 1024,
+        retry_delay: float = 1.0,
+        metrics: Optional[AnalysisMetrics] = None
+    ):
+        self.executor = executor
+        self.metrics = metrics
+        self.concurrency = max(1, concurrency)
+        self.max_active = max_active
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        self.max_result_bytes = max_result_bytes
+        self.retry_delay = retry_delay
+        self._jobs: Dict[str, Job] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        # Hệ số thời gian thực quan sát được (giây xử lý / giây audio),
+        # dùng để ước lượng tiến độ job đang chạy
+        self._realtime_factor: Dict[str, float] = {}
+
+    @property
+    def active(self) -> int:
+        """Số job chưa kết thúc"""
+        return sum(1 for job in self._jobs.values() if not job.finished)
+
+    def submit(
+        self,
+        func: Callable[..., Dict[str, Any]],
+        filename: str,
+        audio_path: str,
+        audio_duration: Optional[float] = None,
+        **options: Any
+    ) -> Job:
+        """
+        Tạo job chạy func(audio_path, filename=filename, **options) ở background
+
+        Raises:
+            QueueFullError: Nếu đã có max_active job chưa kết thúc
+        """
+        self.evict_expired()
+        if self.active >= self.max_active:
+            raise QueueFullError(
+                f"Too many active jobs ({self.active}/{self.max_active})"
+            )
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+        job = Job(filename, audio_path, audio_duration, options)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, func))
+        logger.info(f"Job {job.id} queued: {filename}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Lấy job theo id, None nếu không có hoặc đã hết hạn"""
+        self.evict_expired()
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Hủy job
+
+        Job đang chờ bị hủy ngay. Job đang chạy trên worker không thể
+        dừng giữa chừng - nó được đánh dấu CANCELLED và kết quả bị bỏ.
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job
+
+        if job.status == QUEUED and job.task is not None:
+            job.task.cancel()
+            # Task bị hủy trước khi chạy sẽ không tới được khối finally
+            self._discard_audio(job)
+        self._finish(job, CANCELLED)
+        logger.info(f"Job {job.id} cancelled")
+        return job
+
+    def progress(self, job: Job) -> Optional[float]:
+        """
+        Tiến độ 0..1 của job
+
+        Job đang chạy được ước lượng từ thời gian đã chạy, thời lượng audio
+        và hệ số thời gian thực của các job trước cùng backend; None nếu
+        chưa đủ dữ liệu để ước lượng.
+        """
+        if job.status == QUEUED:
+            return 0.0
+        if job.status == DONE:
+            return 1.0
+        if job.status != RUNNING:
+            return None
+
+        factor = self._realtime_factor.get(job.options.get("f0_backend"))
+        if factor is None or not job.audio_duration:
+            return None
+        elapsed = time.time() - job.started_at
+        return round(min(0.99, elapsed / (factor * job.audio_duration)), 3)
+
+    def evict_expired(self) -> None:
+        """Xóa các job đã kết thúc quá ttl_seconds"""
+        deadline = time.time() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < deadline
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def evict_over_budget(self) -> None:
+        """Xóa job đã kết thúc cũ nhất cho tới khi vừa max_finished và max_result_bytes"""
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished),
+            key=lambda job: job.finished_at
+        )
+        result_bytes = sum(len(job.result or b"") for job in finished)
+        for count, job in zip(range(len(finished), 0, -1), finished):
+            if count <= self.max_finished and result_bytes <= self.max_result_bytes:
+                break
+            result_bytes -= len(job.result or b"")
+            del self._jobs[job.id]
+            logger.info(f"Job {job.id} evicted: finished job limit reached")
+
+    @property
+    def result_bytes(self) -> int:
+        """Tổng kích thước kết quả đang giữ (bytes)"""
+        return sum(len(job.result or b"") for job in self._jobs.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Số job theo trạng thái"""
+        counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    async def _run(self, job: Job, func: Callable[..., Dict[str, Any]]) -> None:
+        """Thân của job: chờ slot, chạy trên executor, lưu kết quả"""
+        # Job chạy trong tác vụ asyncio riêng: bộ gom giai đoạn của riêng job
+        timings = start_stages()
+        try:
+            async with self._slots:
+                while True:
+                    if job.finished:
+                        return
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    try:
+                        result = await self.executor.run(
+                            func,
+                            job.audio_path,
+                            filename=job.filename,
+                            **job.options
+                        )
+                        break
+                    except QueueFullError:
+                        # Executor đang đầy do /analyze/ - chờ rồi thử lại
+                        job.status = QUEUED
+                        await asyncio.sleep(self.retry_delay)
+
+            if job.finished:
+                return
+            job.result = attach_filename(
+                encode_result(result, JSON_MEDIA_TYPE), job.filename, JSON_MEDIA_TYPE
+            )
+            self._finish(job, DONE)
+            self._record_speed(job)
+            if self.metrics is not None:
+                self.metrics.observe("job", job.finished_at - job.started_at, timings)
+            logger.info(f"Job {job.id} done: {result['total_segments']} segments")
+
+        except asyncio.CancelledError:
+            self._finish(job, CANCELLED)
+
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+            job.error = f"Failed to process audio file: {str(e)}"
+            self._finish(job, FAILED)
+
+        finally:
+            self._discard_audio(job)
+
+    @staticmethod
+    def _discard_audio(job: Job) -> None:
+        """Xóa file tạm của job (S-P1)"""
+        if os.path.exists(job.audio_path):
+            try:
+                os.unlink(job.audio_path)
+            except Exception as e:
+                logger.warning(f"Failed to delete temp file: {str(e)}")
+
+    def _finish(self, job: Job, status: str) -> None:
+        if not job.finished:
+            job.status = status
+            job.finished_at = time.time()
+            self.evict_over_budget()
+
+    def _record_speed(self, job: Job) -> None:
+        """Cập nhật hệ số thời gian thực (trung bình trượt) theo backend"""
+        if not job.audio_duration:
+            return
+        factor = (job.finished_at - job.started_at) / job.audio_duration
+        backend = job.options.get("f0_backend")
+        previous = self._realtime_factor.get(backend, factor)
+        self._realtime_factor[backend] = 0.7 * previous + 0.3 * factor
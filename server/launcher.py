@@ -0,0 +1,362 @@
+"""
+Chạy server cho production - nhiều worker uvicorn fork từ một tiến trình
+đã nạp sẵn (NF-4)
+
+Khác với `uvicorn --workers N` (mỗi worker là một interpreter mới, tự import
+librosa/numba và biên dịch lại JIT), launcher import main.py và chạy
+warm_up() một lần trong tiến trình cha rồi mới fork: các worker (và pool
+phân tích của chúng, cũng fork) dùng chung các trang bộ nhớ đó theo
+copy-on-write, khởi động gần như tức thì.
+
+- Worker chết bất thường được fork lại từ tiến trình cha (vẫn nóng); mỗi
+  worker là một process group riêng, nên các tiến trình con còn sót (pool
+  phân tích) bị dọn cùng lúc. Launcher bị SIGKILL thì worker tự dừng
+- SIGTERM/SIGINT: mọi worker ngừng nhận kết nối, chờ request đang xử lý
+  xong (tối đa --drain-timeout giây) rồi dừng pool phân tích; quá hạn thì
+  bị SIGKILL
+- --cpu-affinity auto: chia các CPU được phép thành N nhóm liền nhau, mỗi
+  worker (cùng pool phân tích của nó) chạy trên một nhóm
+- Mỗi worker báo thời gian từ lúc launcher khởi động tới khi sẵn sàng nhận
+  request (cold start) và RSS/PSS của nó cùng pool phân tích
+
+ANALYSIS_WORKERS mặc định là số CPU chia cho số worker, để tổng số tiến
+trình phân tích không vượt số CPU. Cần os.fork (Linux/macOS); trên Windows
+launcher chạy uvicorn.run(workers=N) thông thường.
+
+Cách chạy (từ thư mục server/):
+    python launcher.py --workers 4 --cpu-affinity auto
+    python launcher.py --host 127.0.0.1 --port 8080 --workers 2 --drain-timeout 60
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import select
+import signal
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import uvicorn
+
+LAUNCH_TIME = time.perf_counter()
+
+logger = logging.getLogger("launcher")
+
+# Thời gian chờ thêm sau --drain-timeout cho lifespan shutdown (dừng pool)
+SHUTDOWN_GRACE_SECONDS = 10.0
+# Worker chết ngay sau khi fork nhiều lần liên tiếp -> dừng hẳn thay vì fork mãi
+MAX_RESTARTS_PER_MINUTE = 10
+# Chu kỳ worker kiểm tra launcher còn sống (getppid đổi = launcher đã chết)
+PARENT_CHECK_SECONDS = 1.0
+
+
+def allowed_cpus() -> List[int]:
+    """Các CPU tiến trình được phép chạy (theo cgroup/taskset nếu có)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_groups(cpus: List[int], workers: int) -> List[List[int]]:
+    """Chia cpus thành `workers` nhóm liền nhau, chênh lệch kích thước tối đa 1"""
+    if workers >= len(cpus):
+        return [[cpus[index % len(cpus)]] for index in range(workers)]
+    size, extra = divmod(len(cpus), workers)
+    groups, start = [], 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(cpus[start:end])
+        start = end
+    return groups
+
+
+def process_memory(pid: int) -> Tuple[Optional[float], Optional[float]]:
+    """
+    (RSS, PSS) của tiến trình và mọi tiến trình con, MB
+
+    PSS chia đều các trang dùng chung cho các tiến trình cùng dùng, nên tổng
+    PSS của các worker là bộ nhớ thật sự dùng; RSS đếm trang chung nhiều lần.
+    Chỉ có trên Linux (/proc), nơi khác trả về (None, None).
+    """
+    rss = pss = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/smaps_rollup") as handle:
+                for line in handle:
+                    name, _, value = line.partition(":")
+                    if name == "Rss":
+                        rss += int(value.split()[0])
+                    elif name == "Pss":
+                        pss += int(value.split()[0])
+            with open(f"/proc/{current}/task/{current}/children") as handle:
+                pending.extend(int(child) for child in handle.read().split())
+    except (OSError, ValueError):
+        if rss == 0:
+            return None, None
+    return round(rss / 1024, 1), round(pss / 1024, 1)
+
+
+def _format_memory(rss: Optional[float], pss: Optional[float]) -> str:
+    if rss is None:
+        return "RSS n/a"
+    return f"RSS {rss:.0f} MB, PSS {pss:.0f} MB"
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    uvicorn.Server báo cho tiến trình cha (qua ready_fd) khi sẵn sàng: lifespan
+    startup và warm-up của pool phân tích (main.wait_until_ready) đã xong
+    """
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int, parent_pid: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+        self.parent_pid = parent_pid
+
+    async def startup(self, sockets: Optional[list] = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self._report = asyncio.ensure_future(self._report_ready())
+            self._watchdog = asyncio.ensure_future(self._watch_parent())
+
+    async def _watch_parent(self) -> None:
+        """Launcher chết (kể cả SIGKILL) -> dừng như khi nhận SIGTERM"""
+        while not self.should_exit:
+            if os.getppid() != self.parent_pid:
+                logger.warning(f"Launcher (pid {self.parent_pid}) is gone, shutting down worker")
+                self.should_exit = True
+                return
+            await asyncio.sleep(PARENT_CHECK_SECONDS)
+
+    async def _report_ready(self) -> None:
+        from main import wait_until_ready
+
+        await wait_until_ready()
+        # perf_counter dùng đồng hồ monotonic chung của hệ thống - cha so sánh được
+        os.write(self.ready_fd, f"{os.getpid()} {time.perf_counter():.6f}\n".encode())
+
+
+def preload() -> object:
+    """Import app và chạy warm_up() trong tiến trình cha; trả về main.app"""
+    start = time.perf_counter()
+    import main
+    from analysis import warm_up
+    imported = time.perf_counter()
+    warm_up(**main.ANALYZER_OPTIONS)
+    warmed = time.perf_counter()
+
+    rss, pss = process_memory(os.getpid())
+    logger.info(
+        f"Preloaded app: import {imported - start:.2f}s, warm-up {warmed - imported:.2f}s "
+        f"({_format_memory(rss, pss)})"
+    )
+    return main.app
+
+
+class Launcher:
+    """
+    Tiến trình cha: giữ socket đang lắng nghe, fork và giám sát các worker
+
+    Worker báo sẵn sàng qua một pipe (một dòng "pid thời điểm"), tiến trình
+    cha ghi log cold start (từ lúc launcher khởi động và từ lúc fork) và bộ
+    nhớ của từng worker.
+    """
+
+    def __init__(
+        self,
+        app: object,
+        host: str,
+        port: int,
+        workers: int,
+        affinity: Optional[List[List[int]]],
+        drain_timeout: float,
+        log_level: str
+    ):
+        self.config = uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            log_level=log_level,
+            timeout_graceful_shutdown=drain_timeout
+        )
+        self.workers = workers
+        self.affinity = affinity
+        self.drain_timeout = drain_timeout
+        self.children: Dict[int, int] = {}  # pid -> chỉ số worker
+        self.spawned: Dict[int, float] = {}  # pid -> thời điểm fork
+        self.ready: Set[int] = set()
+        self.all_ready = False
+        self.restarts: List[float] = []
+        self.stopping = False
+        self._ready_read, self._ready_write = os.pipe()
+        self._socket = None
+
+    def _spawn(self, index: int) -> None:
+        spawned = time.perf_counter()
+        parent_pid = os.getpid()
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            self.spawned[pid] = spawned
+            return
+
+        # Tiến trình con: process group riêng (pgid = pid) chứa cả pool phân
+        # tích, bỏ handler của cha, uvicorn tự cài SIGINT/SIGTERM
+        code = 1
+        try:
+            os.setpgid(0, 0)
+            os.close(self._ready_read)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            if self.affinity is not None:
+                os.sched_setaffinity(0, self.affinity[index])
+            WorkerServer(self.config, self._ready_write, parent_pid).run(sockets=[self._socket])
+            code = 0
+        except BaseException:
+            logger.exception(f"Worker {index} crashed")
+        finally:
+            os._exit(code)
+
+    def _handle_stop(self, signum: int, frame: object) -> None:
+        if not self.stopping:
+            logger.info(f"Received {signal.Signals(signum).name}, draining workers "
+                        f"(up to {self.drain_timeout:g}s)")
+        self.stopping = True
+
+    @staticmethod
+    def _kill_group(pid: int) -> None:
+        """SIGKILL process group của worker `pid` (worker và pool phân tích của nó)"""
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass  # group đã trống
+
+    def _reap(self) -> None:
+        """
+        Thu các worker đã kết thúc; fork lại nếu không phải đang dừng
+
+        Worker bị SIGKILL (OOM killer...) không kịp dừng pool phân tích: các
+        tiến trình con còn lại trong group của nó bị dọn luôn.
+        """
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            self._kill_group(pid)
+            index = self.children.pop(pid, None)
+            self.spawned.pop(pid, None)
+            self.ready.discard(pid)
+            if index is None or self.stopping:
+                continue
+            logger.warning(f"Worker {index} (pid {pid}) exited with status "
+                           f"{os.waitstatus_to_exitcode(status)}, restarting")
+            now = time.monotonic()
+            self.restarts = [moment for moment in self.restarts if now - moment < 60] + [now]
+            if len(self.restarts) > MAX_RESTARTS_PER_MINUTE:
+                logger.error("Workers keep crashing, shutting down")
+                self.stopping = True
+                return
+            self._spawn(index)
+
+    def _read_ready(self, timeout: float) -> None:
+        readable, _, _ = select.select([self._ready_read], [], [], timeout)
+        if not readable:
+            return
+        for line in os.read(self._ready_read, 4096).decode().splitlines():
+            pid_text, moment_text = line.split()
+            pid, moment = int(pid_text), float(moment_text)
+            self.ready.add(pid)
+            rss, pss = process_memory(pid)
+            index = self.children.get(pid)
+            cpus = f", CPU {self.affinity[index]}" if self.affinity and index is not None else ""
+            forked = moment - self.spawned.get(pid, moment)
+            logger.info(f"Worker {index} (pid {pid}) ready {moment - LAUNCH_TIME:.2f}s after launch, "
+                        f"{forked:.2f}s after fork ({_format_memory(rss, pss)}{cpus})")
+            if len(self.ready) == self.workers and not self.all_ready:
+                self.all_ready = True
+                total = [process_memory(child) for child in self.children]
+                if all(rss is not None for rss, _ in total):
+                    logger.info(
+                        f"All {self.workers} workers ready: total RSS "
+                        f"{sum(rss for rss, _ in total):.0f} MB, PSS {sum(pss for _, pss in total):.0f} MB"
+                    )
+
+    def _drain(self) -> None:
+        """Gửi SIGTERM cho mọi worker, chờ tối đa drain_timeout + grace rồi SIGKILL"""
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.drain_timeout + SHUTDOWN_GRACE_SECONDS
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning(f"Worker pid {pid} did not stop in time, killing")
+            self._kill_group(pid)
+            os.waitpid(pid, 0)
+            self.children.pop(pid)
+
+    def run(self) -> None:
+        self._socket = self.config.bind_socket()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        logger.info(f"Listening on http://{self.config.host}:{self.config.port} "
+                    f"with {self.workers} workers")
+        for index in range(self.workers):
+            self._spawn(index)
+        try:
+            while not self.stopping:
+                self._reap()
+                self._read_ready(0.5)
+        finally:
+            self._drain()
+            self._socket.close()
+            logger.info("Shutdown complete")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Chạy Voice Analysis API cho production: nạp sẵn rồi fork N worker"
+    )
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Số worker uvicorn (mặc định: số CPU)")
+    parser.add_argument("--cpu-affinity", choices=("none", "auto"), default="none",
+                        help="auto: gắn mỗi worker với một nhóm CPU riêng")
+    parser.add_argument("--drain-timeout", type=float, default=30.0,
+                        help="Thời gian tối đa chờ request đang xử lý khi dừng (giây)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:%(name)s:%(message)s")
+    workers = max(1, args.workers)
+    cpus = allowed_cpus()
+    # Trước khi import main.py: các hằng số cấu hình được đọc lúc import
+    os.environ.setdefault("ANALYSIS_WORKERS", str(max(1, len(cpus) // workers)))
+
+    if not hasattr(os, "fork"):
+        logger.warning("os.fork is not available, falling back to uvicorn workers (no preload)")
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=workers,
+                    log_level=args.log_level, timeout_graceful_shutdown=args.drain_timeout)
+        return
+
+    affinity = None
+    if args.cpu_affinity == "auto":
+        if hasattr(os, "sched_setaffinity"):
+            affinity = cpu_groups(cpus, workers)
+        else:
+            logger.warning("CPU affinity is not supported on this platform, ignoring")
+
+    app = preload()
+    Launcher(app, args.host, args.port, workers, affinity,
+             args.drain_timeout, args.log_level).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,537 @@
+"""
+Tạo tải HTTP cho /analyze/ - đo thông lượng thật của server để chọn số
+worker (uvicorn --workers, ANALYSIS_WORKERS) thay vì đoán
+
+Mặc định tự khởi động uvicorn trên 127.0.0.1 (cache kết quả tắt, để mọi
+request đều được phân tích), gửi request với số kết nối đồng thời, hỗn hợp
+độ dài file và tốc độ cho trước, rồi báo cáo độ trễ p50/p95/p99, thông lượng,
+tỉ lệ lỗi và CPU/RSS của các tiến trình server (cả pool phân tích).
+
+Cách chạy (từ thư mục server/):
+    python loadtest.py --concurrency 1,4,8 --duration 30
+    python loadtest.py --workers 1,2,4 --analysis-workers 1 --concurrency 8
+    python loadtest.py --mix 5:6,60:3,600:1 --rate 2 --duration 60
+    python loadtest.py --url http://server:8000 --pid 1234 -o load.json
+
+--rate 0 (mặc định): vòng kín, mỗi kết nối gửi request tiếp theo ngay khi
+nhận response. --rate N: vòng mở, N request/giây theo lịch cố định; độ trễ
+tính từ thời điểm theo lịch, nên thời gian chờ khi server quá tải cũng được
+tính (không bị "coordinated omission").
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+try:
+    import psutil
+except ImportError:  # Không bắt buộc - trên Linux đọc /proc
+    psutil = None
+
+# Lỗi khi một tiến trình kết thúc giữa hai lần đọc
+_PROCESS_GONE = (OSError, IndexError, ValueError) + ((psutil.Error,) if psutil else ())
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# Hỗn hợp mặc định: nhiều clip ngắn (ghi âm trên app), ít file dài
+DEFAULT_MIX = "5:6,30:3,120:1"
+SAMPLE_INTERVAL = 0.5  # giây giữa hai lần đo CPU/RSS
+STARTUP_TIMEOUT = 120.0
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(value: str) -> List[Tuple[float, float]]:
+    """"5:6,60:1" -> [(5.0, 6.0), (60.0, 1.0)] - (thời lượng giây, trọng số)"""
+    mix = []
+    for part in value.split(","):
+        duration, _, weight = part.partition(":")
+        mix.append((float(duration), float(weight or 1)))
+    if not mix or any(duration <= 0 or weight <= 0 for duration, weight in mix):
+        raise argparse.ArgumentTypeError(f"Invalid mix: {value}")
+    return mix
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def prepare_files(
+    mix: List[Tuple[float, float]],
+    sample_rate: int,
+    corpus_dir: str,
+    seed: int
+) -> List[Dict[str, Any]]:
+    """Tạo (hoặc dùng lại) một file WAV cho mỗi thời lượng trong mix, đọc sẵn vào bộ nhớ"""
+    from create_test_audio import create_corpus_audio
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    files = []
+    for duration, weight in mix:
+        name = f"load_{duration:g}s_{sample_rate}Hz_seed{seed}.wav"
+        path = os.path.join(corpus_dir, name)
+        if not os.path.exists(path):
+            create_corpus_audio(path + ".tmp", duration, sample_rate, seed=seed)
+            os.replace(path + ".tmp", path)
+        with open(path, "rb") as handle:
+            content = handle.read()
+        files.append({"name": name, "duration": duration, "weight": weight, "content": content})
+    return files
+
+
+def _multipart(filename: str, content: bytes) -> Tuple[bytes, str]:
+    """Body multipart/form-data với một trường file, và Content-Type tương ứng"""
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: audio/wav\r\n\r\n"
+    ).encode("utf-8")
+    body = head + content + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class ProcessSampler:
+    """
+    Đo CPU và RSS của một tiến trình cùng mọi tiến trình con (uvicorn worker,
+    pool phân tích) theo chu kỳ, trong một thread nền
+
+    Dùng psutil nếu đã cài, nếu không thì đọc /proc (chỉ Linux). Khi cả hai
+    đều không có, available = False và báo cáo không có số liệu tài nguyên.
+    """
+
+    def __init__(self, pid: int, interval: float = SAMPLE_INTERVAL):
+        self.pid = pid
+        self.interval = interval
+        self.available = psutil is not None or os.path.exists(f"/proc/{pid}/stat")
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self._page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples: List[Tuple[float, float, int]] = []  # (thời điểm, cpu giây, rss byte)
+
+    def _tree(self) -> List[int]:
+        """pid và mọi tiến trình con cháu"""
+        if psutil is not None:
+            try:
+                root = psutil.Process(self.pid)
+                return [self.pid] + [child.pid for child in root.children(recursive=True)]
+            except psutil.Error:
+                return []
+        parents: Dict[int, List[int]] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as handle:
+                    fields = handle.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            parents.setdefault(int(fields[1]), []).append(int(entry))
+        tree, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            tree.append(pid)
+            pending.extend(parents.get(pid, []))
+        return tree
+
+    def _usage(self, pid: int) -> Tuple[float, int]:
+        """(thời gian CPU user+system giây, RSS byte) của một tiến trình"""
+        if psutil is not None:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return times.user + times.system, process.memory_info().rss
+        with open(f"/proc/{pid}/stat") as handle:
+            fields = handle.read().rsplit(")", 1)[1].split()
+        # Sau "(comm)": fields[11] = utime, fields[12] = stime, fields[21] = rss (trang)
+        cpu = (int(fields[11]) + int(fields[12])) / self._ticks
+        return cpu, int(fields[21]) * self._page_size
+
+    def sample(self) -> Tuple[float, int]:
+        cpu, rss = 0.0, 0
+        for pid in self._tree():
+            try:
+                process_cpu, process_rss = self._usage(pid)
+            except _PROCESS_GONE:
+                continue  # tiến trình vừa kết thúc
+            cpu += process_cpu
+            rss += process_rss
+        return cpu, rss
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            cpu, rss = self.sample()
+            self.samples.append((time.perf_counter(), cpu, rss))
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self.available:
+            self.samples = []
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> Optional[Dict[str, float]]:
+        """Dừng đo; CPU trung bình/đỉnh (% một lõi) và RSS đỉnh/cuối (MB)"""
+        if self._thread is None:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if len(self.samples) < 2:
+            return None
+        usage = [
+            100.0 * (cpu - previous_cpu) / (moment - previous_moment)
+            for (previous_moment, previous_cpu, _), (moment, cpu, _)
+            in zip(self.samples, self.samples[1:])
+        ]
+        (first_moment, first_cpu, _), (last_moment, last_cpu, last_rss) = self.samples[0], self.samples[-1]
+        return {
+            "cpu_percent_mean": round(100.0 * (last_cpu - first_cpu) / (last_moment - first_moment), 1),
+            "cpu_percent_peak": round(max(usage), 1),
+            "rss_mb_peak": round(max(rss for _, _, rss in self.samples) / 1024 / 1024, 1),
+            "rss_mb_end": round(last_rss / 1024 / 1024, 1)
+        }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(host: str, port: int, process: Optional[subprocess.Popen]) -> float:
+    """Chờ GET /health/ trả 200; trả về thời gian chờ (giây)"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < STARTUP_TIMEOUT:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request("GET", "/health/")
+            if connection.getresponse().status == 200:
+                return time.perf_counter() - start
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {STARTUP_TIMEOUT:.0f}s")
+
+
+def start_server(
+    port: int,
+    workers: int,
+    env: Dict[str, str],
+    log_path: str
+) -> subprocess.Popen:
+    """Khởi động uvicorn main:app (không reload) trong thư mục server/"""
+    command = [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning"
+    ]
+    with open(log_path, "ab") as log:
+        return subprocess.Popen(
+            command, cwd=SERVER_DIR, env={**os.environ, **env},
+            stdout=log, stderr=subprocess.STDOUT
+        )
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+class LoadGenerator:
+    """
+    Gửi POST /analyze/ với `concurrency` kết nối keep-alive
+
+    Mỗi request chọn ngẫu nhiên (theo trọng số của mix, seed cố định) một
+    file đã đọc sẵn. Với rate > 0, request thứ i được lên lịch tại
+    i / rate giây và độ trễ tính từ thời điểm đó.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        files: List[Dict[str, Any]],
+        path: str = "/analyze/",
+        seed: int = 0,
+        timeout: float = 600.0
+    ):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.timeout = timeout
+        self.bodies = [_multipart(item["name"], item["content"]) for item in files]
+        self.files = files
+        self.weights = [item["weight"] for item in files]
+        self.random = random.Random(seed)
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def _send(self, index: int, scheduled: float) -> Dict[str, Any]:
+        body, content_type = self.bodies[index]
+        status, error = None, None
+        try:
+            connection = self._connection()
+            connection.request("POST", self.path, body=body, headers={"Content-Type": content_type})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader("Connection", "").lower() == "close":
+                self._reset()
+        except (OSError, http.client.HTTPException) as exc:
+            error = type(exc).__name__
+            self._reset()
+        return {
+            "file": index,
+            "status": status,
+            "error": error,
+            "latency": time.perf_counter() - scheduled
+        }
+
+    def _reset(self) -> None:
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def run(
+        self,
+        concurrency: int,
+        duration: float,
+        rate: float = 0.0,
+        max_requests: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Gửi request trong `duration` giây (hoặc tới max_requests)
+
+        Returns:
+            (kết quả từng request, thời gian chạy thực tế tới response cuối)
+        """
+        results: List[Dict[str, Any]] = []
+        lock = threading.Lock()
+        start = time.perf_counter()
+        deadline = start + duration
+
+        def pick() -> int:
+            with lock:
+                return self.random.choices(range(len(self.files)), self.weights)[0]
+
+        if rate > 0:
+            # Vòng mở: lịch cố định, pool `concurrency` thread gửi request
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = []
+                index = 0
+                while max_requests is None or index < max_requests:
+                    scheduled = start + index / rate
+                    if scheduled >= deadline:
+                        break
+                    delay = scheduled - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    futures.append(pool.submit(self._send, pick(), scheduled))
+                    index += 1
+                results = [future.result() for future in futures]
+        else:
+            # Vòng kín: mỗi thread gửi request tiếp theo ngay khi nhận response
+            tickets: "queue.Queue[None]" = queue.Queue()
+            if max_requests is not None:
+                for _ in range(max_requests):
+                    tickets.put(None)
+
+            def worker() -> None:
+                while time.perf_counter() < deadline:
+                    if max_requests is not None:
+                        try:
+                            tickets.get_nowait()
+                        except queue.Empty:
+                            break
+                    outcome = self._send(pick(), time.perf_counter())
+                    with lock:
+                        results.append(outcome)
+                self._reset()
+
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return results, time.perf_counter() - start
+
+
+def summarize(
+    results: List[Dict[str, Any]],
+    elapsed: float,
+    files: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Độ trễ p50/p95/p99 (request thành công), thông lượng, tỉ lệ lỗi"""
+    ok = [item for item in results if item["status"] == 200]
+    statuses: Dict[str, int] = {}
+    for item in results:
+        key = str(item["status"]) if item["status"] is not None else item["error"]
+        statuses[key] = statuses.get(key, 0) + 1
+
+    summary: Dict[str, Any] = {
+        "requests": len(results),
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "statuses": statuses,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else 0.0,
+        # Giây audio phân tích được mỗi giây - so sánh được giữa các mix khác nhau
+        "audio_seconds_per_second": round(
+            sum(files[item["file"]]["duration"] for item in ok) / elapsed, 2
+        ) if elapsed > 0 else 0.0
+    }
+    latencies = np.array([item["latency"] for item in ok])
+    for percentile in PERCENTILES:
+        summary[f"p{percentile}_seconds"] = (
+            round(float(np.percentile(latencies, percentile)), 4) if len(latencies) else None
+        )
+    summary["mean_seconds"] = round(float(latencies.mean()), 4) if len(latencies) else None
+    return summary
+
+
+def _print_row(label: str, summary: Dict[str, Any]) -> None:
+    def seconds(value: Optional[float]) -> str:
+        return f"{value:>8.3f}" if value is not None else f"{'-':>8}"
+
+    resources = summary.get("server") or {}
+    print(f"{label:>18} {summary['requests']:>6} {summary['throughput_rps']:>8.2f} "
+          f"{summary['audio_seconds_per_second']:>8.1f} "
+          f"{seconds(summary['p50_seconds'])} {seconds(summary['p95_seconds'])} "
+          f"{seconds(summary['p99_seconds'])} {summary['error_rate']:>7.1%} "
+          f"{resources.get('cpu_percent_mean', float('nan')):>7.0f} "
+          f"{resources.get('rss_mb_peak', float('nan')):>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tạo tải HTTP cho /analyze/ và đo độ trễ, thông lượng, CPU/RSS của server"
+    )
+    parser.add_argument("--url", help="Server có sẵn (mặc định: tự khởi động uvicorn cục bộ)")
+    parser.add_argument("--pid", type=int, help="PID của server có sẵn để đo CPU/RSS (với --url)")
+    parser.add_argument("--workers", type=_int_list, default=[1],
+                        help="uvicorn --workers, danh sách để so sánh, vd. 1,2,4")
+    parser.add_argument("--analysis-workers", type=int,
+                        help="ANALYSIS_WORKERS của server (mặc định: cấu hình của server)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Biến môi trường thêm cho server, vd. ANALYSIS_EXECUTOR=thread")
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="Giữ cache kết quả (mặc định RESULT_CACHE_MB=0: mọi request đều phân tích)")
+    parser.add_argument("--concurrency", type=_int_list, default=[4],
+                        help="Số kết nối đồng thời, danh sách để so sánh, vd. 1,4,16")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="Request/giây (vòng mở); 0 = vòng kín, gửi liên tục")
+    parser.add_argument("--duration", type=float, default=30.0, help="Thời gian mỗi lượt (giây)")
+    parser.add_argument("--requests", type=int, help="Giới hạn số request mỗi lượt")
+    parser.add_argument("--warmup", type=int, default=2,
+                        help="Số request làm nóng mỗi file trước khi đo (không tính)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Hỗn hợp độ dài file 'giây:trọng số,...' (mặc định {DEFAULT_MIX})")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="Sample rate của file tải lên")
+    parser.add_argument("--path", default="/analyze/",
+                        help="Đường dẫn và query, vd. '/analyze/?f0_backend=nccf'")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir",
+                        default=os.path.join(tempfile.gettempdir(), "voice_analysis_corpus"))
+    parser.add_argument("-o", "--output", help="File JSON kết quả")
+    args = parser.parse_args()
+
+    files = prepare_files(args.mix, args.sample_rate, args.corpus_dir, args.seed)
+    env = dict(item.split("=", 1) for item in args.env)
+    if not args.keep_cache:
+        env.setdefault("RESULT_CACHE_MB", "0")
+    if args.analysis_workers is not None:
+        env["ANALYSIS_WORKERS"] = str(args.analysis_workers)
+
+    print("Mix: " + ", ".join(f"{item['duration']:g}s x{item['weight']:g}" for item in files)
+          + f" | rate: {args.rate or 'closed loop'} | {args.duration:g}s mỗi lượt")
+    print(f"{'workers/conc':>18} {'req':>6} {'req/s':>8} {'audio/s':>8} {'p50':>8} "
+          f"{'p95':>8} {'p99':>8} {'errors':>7} {'cpu%':>7} {'rss MB':>8}")
+
+    runs = []
+    worker_counts = [None] if args.url else args.workers
+    for workers in worker_counts:
+        process, startup = None, None
+        if args.url:
+            target = urlsplit(args.url)
+            host, port = target.hostname, target.port or 80
+            pid = args.pid
+        else:
+            host, port = "127.0.0.1", _free_port()
+            log_path = os.path.join(tempfile.gettempdir(), "voice_analysis_loadtest.log")
+            process = start_server(port, workers, env, log_path)
+            pid = process.pid
+        try:
+            startup = _wait_ready(host, port, process)
+            generator = LoadGenerator(host, port, files, args.path, args.seed)
+            for index in range(len(files)):
+                for _ in range(args.warmup):
+                    generator._send(index, time.perf_counter())
+            generator._reset()
+
+            for concurrency in args.concurrency:
+                sampler = ProcessSampler(pid) if pid else None
+                if sampler is not None:
+                    sampler.start()
+                results, elapsed = generator.run(concurrency, args.duration, args.rate, args.requests)
+                summary = summarize(results, elapsed, files)
+                summary["server"] = sampler.stop() if sampler is not None else None
+                summary.update({
+                    "workers": workers,
+                    "concurrency": concurrency,
+                    "rate": args.rate,
+                    "startup_seconds": round(startup, 2) if process is not None else None
+                })
+                runs.append(summary)
+                _print_row(f"{workers or '-'}/{concurrency}", summary)
+        finally:
+            if process is not None:
+                stop_server(process)
+
+    if args.output:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "cpu_count": os.cpu_count(),
+            "path": args.path,
+            "mix": [{"duration": item["duration"], "weight": item["weight"]} for item in files],
+            "server_env": env,
+            "runs": runs
+        }
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"Kết quả: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
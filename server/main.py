@@ -3,25 +3,243 @@ API Server cho hệ thống phân tích Voiced/Unvoiced/Silence
 Tuân thủ tiêu chuẩn S-P2: main.py chỉ chứa logic API
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import (
+    Depends, FastAPI, File, UploadFile, HTTPException, Header, Query,
+    WebSocket, WebSocketDisconnect
+)
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import tempfile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
+import hashlib
 import os
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Optional, Tuple
 import logging
 
-from analysis import analyze_audio_file
+from analysis import (
+    analyze_audio_file, analyze_audio_columns, estimate_analysis_cost,
+    get_analyzer, get_audio_duration, warm_up, AudioAnalyzer, AudioSource, F0_BACKENDS, LIVE_F0_BACKENDS,
+    LiveAnalysis, RESPONSE_MODES, RunAccumulator, SUPPORTED_FORMATS
+)
+from batch import ArchiveReader, BatchAnalysis, BatchItem, archive_suffix
+from cache import ResultCache, make_cache_key
+from executor import AnalysisExecutor, QueueFullError
+from formats import (
+    COLUMNAR_MEDIA_TYPES, JSON_MEDIA_TYPE, MEDIA_TYPES, STREAM_MEDIA_TYPES,
+    NotAcceptableError, attach_filename, encode_event, encode_result, negotiate
+)
+from jobs import Job, JobStore, DONE, FAILED
+from metrics import CONTENT_TYPE, AnalysisMetrics, MetricsMiddleware, MetricsRegistry, stage
+from streaming import StreamingAnalysis
+from uploads import (
+    UploadLimitMiddleware, UploadTooLargeError, read_upload, save_upload
+)
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Cấu hình pool phân tích (NF-4) - đọc từ biến môi trường
+ANALYSIS_EXECUTOR = os.getenv("ANALYSIS_EXECUTOR", "process")  # process | thread
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+ANALYSIS_QUEUE_DEPTH = int(os.getenv("ANALYSIS_QUEUE_DEPTH", "8"))
+# Gợi ý thời gian client nên thử lại khi hàng đợi đầy (giây)
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", "5"))
+
+# Cấu hình job bất đồng bộ (/jobs/)
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", max(1, ANALYSIS_WORKERS // 2)))
+JOB_MAX_ACTIVE = int(os.getenv("JOB_MAX_ACTIVE", "32"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+# Giới hạn job đã kết thúc được giữ: số job và tổng kích thước kết quả
+JOB_MAX_FINISHED = int(os.getenv("JOB_MAX_FINISHED", "256"))
+JOB_MAX_RESULT_MB = int(os.getenv("JOB_MAX_RESULT_MB", "256"))
+
+# Tần số phân tích chung (tùy chọn): ANALYSIS_SAMPLE_RATE > 0 thì mọi audio
+# được resample về tần số này, khung và bước nhảy tính theo mili giây - chi
+# phí trên mỗi giây audio và độ phân giải thời gian không phụ thuộc nguồn.
+# Mặc định 0 = giữ sample rate gốc, khung 2048 / bước 512 mẫu như trước;
+# khuyến nghị đặt 16000 khi deploy
+ANALYSIS_SAMPLE_RATE = int(os.getenv("ANALYSIS_SAMPLE_RATE", "0"))
+ANALYSIS_FRAME_MS = float(os.getenv("ANALYSIS_FRAME_MS", "128"))
+ANALYSIS_HOP_MS = float(os.getenv("ANALYSIS_HOP_MS", "32"))
+# Ngưỡng năng lượng mặc định: fixed | adaptive (theo nền nhiễu của bản ghi)
+ANALYSIS_THRESHOLD_MODE = os.getenv("ANALYSIS_THRESHOLD_MODE", "fixed")
+ANALYZER_OPTIONS: Dict[str, Any] = {
+    "threshold_mode": ANALYSIS_THRESHOLD_MODE,
+    **(
+        {
+            "sample_rate": ANALYSIS_SAMPLE_RATE,
+            "frame_ms": ANALYSIS_FRAME_MS,
+            "hop_ms": ANALYSIS_HOP_MS
+        }
+        if ANALYSIS_SAMPLE_RATE > 0 else {}
+    )
+}
+
+# Giới hạn upload - file lớn hơn bị từ chối với 413
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "100"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+# Kích thước mỗi khối khi ghi upload ra file tạm (bytes)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# File nhỏ hơn ngưỡng này được giải mã trong bộ nhớ, không qua file tạm
+IN_MEMORY_MAX_MB = int(os.getenv("IN_MEMORY_MAX_MB", "32"))
+IN_MEMORY_MAX_BYTES = IN_MEMORY_MAX_MB * 1024 * 1024
+
+# Cache kết quả theo nội dung file; RESULT_CACHE_DIR rỗng = tắt tầng đĩa
+RESULT_CACHE_MB = int(os.getenv("RESULT_CACHE_MB", "64"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_MB = int(os.getenv("RESULT_CACHE_DISK_MB", "1024"))
+
+# /analyze/stream: số frame mỗi khối (512 frame ~ 16s audio 16kHz) và số
+# khối được phân tích trước trong lúc gửi khối hiện tại
+STREAM_BLOCK_FRAMES = int(os.getenv("STREAM_BLOCK_FRAMES", "512"))
+STREAM_PREFETCH = int(os.getenv("STREAM_PREFETCH", "1"))
+
+# /ws/analyze: PCM int16 mono với sample rate cố định, số kết nối tối đa
+LIVE_SAMPLE_RATE = 16000
+LIVE_MAX_SESSIONS = int(os.getenv("LIVE_MAX_SESSIONS", "16"))
+live_sessions = 0
+
+# /analyze/batch: số file tối đa (kể cả file trong file nén), số file mỗi
+# tác vụ trên pool, số tác vụ đồng thời và kích thước request tối đa
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "1000"))
+BATCH_CHUNK_FILES = int(os.getenv("BATCH_CHUNK_FILES", "8"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", ANALYSIS_WORKERS))
+BATCH_MAX_UPLOAD_MB = int(os.getenv("BATCH_MAX_UPLOAD_MB", "1024"))
+BATCH_MAX_UPLOAD_BYTES = BATCH_MAX_UPLOAD_MB * 1024 * 1024
+
+executor = AnalysisExecutor(
+    kind=ANALYSIS_EXECUTOR,
+    workers=ANALYSIS_WORKERS,
+    queue_depth=ANALYSIS_QUEUE_DEPTH,
+    initializer=partial(warm_up, **ANALYZER_OPTIONS)
+)
+
+# Warm-up khi khởi động (xem lifespan): /health/ trả 503 cho tới khi xong
+warm_up_task: Optional[asyncio.Task] = None
+warm_up_seconds: Optional[float] = None
+
+result_cache = ResultCache(
+    memory_budget=RESULT_CACHE_MB * 1024 * 1024,
+    disk_dir=RESULT_CACHE_DIR or None,
+    disk_budget=RESULT_CACHE_DISK_MB * 1024 * 1024
+)
+
+# GET /metrics (định dạng Prometheus): request, giai đoạn, hệ số thời gian thực
+metrics_registry = MetricsRegistry()
+analysis_metrics = AnalysisMetrics(metrics_registry)
+
+jobs = JobStore(
+    executor,
+    concurrency=JOB_CONCURRENCY,
+    max_active=JOB_MAX_ACTIVE,
+    ttl_seconds=JOB_TTL_SECONDS,
+    max_finished=JOB_MAX_FINISHED,
+    max_result_bytes=JOB_MAX_RESULT_MB * 1024 * 1024,
+    metrics=analysis_metrics
+)
+
+# Trạng thái pool, job, cache và phiên live - đọc lúc render /metrics
+metrics_registry.gauge(
+    "analysis_executor_workers", "Số worker của pool phân tích",
+    func=lambda: executor.workers
+)
+metrics_registry.gauge(
+    "analysis_executor_capacity", "Số tác vụ pool nhận cùng lúc (đang chạy + chờ)",
+    func=lambda: executor.capacity
+)
+metrics_registry.gauge(
+    "analysis_executor_in_flight", "Số tác vụ đang chạy hoặc chờ trên pool",
+    func=lambda: executor.in_flight
+)
+metrics_registry.gauge(
+    "analysis_executor_queued", "Số tác vụ đang chờ worker rảnh",
+    func=lambda: executor.queued
+)
+metrics_registry.counter(
+    "analysis_executor_rejected_total", "Số tác vụ bị từ chối vì hàng đợi đầy",
+    func=lambda: executor.rejected
+)
+metrics_registry.gauge(
+    "analysis_jobs", "Số job theo trạng thái", ("status",),
+    func=lambda: jobs.stats()
+)
+metrics_registry.gauge(
+    "analysis_job_result_bytes", "Tổng kích thước kết quả của các job đang được giữ",
+    func=lambda: jobs.result_bytes
+)
+metrics_registry.counter(
+    "result_cache_events_total", "Sự kiện của cache kết quả", ("event",),
+    func=lambda: dict(result_cache.counters)
+)
+metrics_registry.gauge(
+    "result_cache_bytes", "Dung lượng cache kết quả đang dùng", ("tier",),
+    func=lambda: {
+        "memory": result_cache.stats()["memory_bytes"],
+        "disk": result_cache.stats()["disk_bytes"]
+    }
+)
+metrics_registry.gauge(
+    "live_sessions", "Số phiên /ws/analyze đang mở",
+    func=lambda: live_sessions
+)
+
+
+async def _warm_up() -> None:
+    """
+    Warm-up mọi worker của pool; với pool process, cả tiến trình server
+    (phân tích live /ws/analyze chạy trong thread của server)
+    """
+    global warm_up_seconds
+    start = time.perf_counter()
+    try:
+        await executor.warm()
+        if executor.kind == "process":
+            await run_in_threadpool(warm_up, **ANALYZER_OPTIONS)
+    except Exception:
+        logger.exception("Warm-up failed, server stays not ready")
+        return
+    warm_up_seconds = time.perf_counter() - start
+    logger.info(f"Warm-up completed in {warm_up_seconds:.2f}s")
+
+
+async def wait_until_ready() -> None:
+    """Chờ warm-up khi khởi động hoàn tất (xem lifespan)"""
+    if warm_up_task is not None:
+        await asyncio.shield(warm_up_task)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Tạo pool phân tích rồi nhận request ngay; warm-up (import librosa, biên
+    dịch numba, chạy thử AudioAnalyzer.analyze) chạy nền - /health/ chỉ báo
+    sẵn sàng khi xong, request đến sớm hơn chờ worker sẵn sàng
+    """
+    global warm_up_task
+    await executor.start(wait=False)
+    warm_up_task = asyncio.create_task(_warm_up())
+    yield
+    warm_up_task.cancel()
+    executor.shutdown()
+
+
 # Khởi tạo FastAPI app
 app = FastAPI(
     title="Voice Analysis API",
     description="API phân tích âm thanh thành Voiced/Unvoiced/Silence",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Từ chối upload quá lớn trước khi đọc hết body
+app.add_middleware(
+    UploadLimitMiddleware,
+    max_upload_bytes=MAX_UPLOAD_BYTES,
+    path_limits={"/analyze/batch": BATCH_MAX_UPLOAD_BYTES}
 )
 
 # Cấu hình CORS để cho phép client từ các domain khác truy cập
@@ -33,8 +251,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Danh sách định dạng file được hỗ trợ (F-S2)
-SUPPORTED_FORMATS = {'.wav', '.mp3', '.m4a', '.flac', '.ogg'}
+# Đo mọi request (ngoài cùng: tính cả request bị từ chối 413)
+app.add_middleware(MetricsMiddleware, metrics=analysis_metrics)
+
+# Định dạng soundfile giải mã được trực tiếp từ bộ nhớ
+IN_MEMORY_FORMATS = {'.wav', '.flac', '.ogg'}
 
 
 @app.get("/")
@@ -45,74 +266,401 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "analyze": "/analyze/",
-            "health": "/health/"
+            "analyze_stream": "/analyze/stream",
+            "analyze_batch": "/analyze/batch",
+            "analyze_live": "/ws/analyze",
+            "jobs": "/jobs/",
+            "health": "/health/",
+            "metrics": "/metrics"
         }
     }
 
 
 @app.get("/health/")
 async def health_check():
-    """Endpoint kiểm tra sức khỏe server (Health check)"""
-    return {"status": "healthy"}
+    """
+    Endpoint kiểm tra sức khỏe server (Health check)
+    
+    503 {"status": "starting"} cho tới khi warm-up khi khởi động hoàn tất,
+    để load balancer chỉ gửi request tới worker đã nóng.
+    """
+    if warm_up_seconds is None:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting"},
+            headers={"Retry-After": "1"}
+        )
+    return {"status": "healthy", "warm_up_seconds": round(warm_up_seconds, 3)}
 
 
-@app.post("/analyze/")
-async def analyze_audio(file: UploadFile = File(...)) -> JSONResponse:
+@app.get("/metrics")
+async def get_metrics() -> Response:
     """
-    Endpoint chính để phân tích file âm thanh (F-S1)
+    Metrics theo định dạng text của Prometheus (xem metrics.py)
+    
+    Số request, request đang xử lý, độ sâu hàng đợi, thời gian request và
+    từng giai đoạn (theo nhóm độ dài audio), hệ số thời gian thực.
+    """
+    return Response(content=metrics_registry.render(), media_type=CONTENT_TYPE)
+
+
+def _validate_request(file: UploadFile, f0_backend: str, mode: str) -> str:
+    """
+    Kiểm tra định dạng file (F-S2) và tham số phân tích
     
-    Args:
-        file: File âm thanh được upload qua multipart/form-data
-        
     Returns:
-        JSONResponse chứa kết quả phân tích theo hợp đồng F-S5
+        Phần mở rộng của file (chữ thường)
         
     Raises:
-        HTTPException: 400 nếu file không hợp lệ, 500 nếu lỗi xử lý
+        HTTPException: 400 nếu không hợp lệ
     """
-    logger.info(f"Received file: {file.filename}")
-    
-    # Kiểm tra định dạng file (F-S2)
     file_ext = os.path.splitext(file.filename)[1].lower()
     if file_ext not in SUPPORTED_FORMATS:
         logger.warning(f"Unsupported format: {file_ext}")
+        raise HTTPException(status_code=400, detail=_unsupported_format(file_ext))
+    
+    _validate_options(f0_backend, mode)
+    return file_ext
+
+
+def _unsupported_format(file_ext: str) -> Dict[str, str]:
+    """Chi tiết lỗi cho định dạng file không được hỗ trợ (F-S2)"""
+    return {
+        "error": "Unsupported file format",
+        "message": f"File format {file_ext} is not supported. "
+                  f"Supported formats: {', '.join(SUPPORTED_FORMATS)}"
+    }
+
+
+def _validate_options(f0_backend: str, mode: str) -> None:
+    """
+    Kiểm tra tham số phân tích
+    
+    Raises:
+        HTTPException: 400 nếu không hợp lệ
+    """
+    if f0_backend not in F0_BACKENDS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Unsupported F0 backend",
+                "message": f"F0 backend {f0_backend} is not supported. "
+                          f"Supported backends: {', '.join(F0_BACKENDS)}"
+            }
+        )
+    
+    if mode not in RESPONSE_MODES:
         raise HTTPException(
             status_code=400,
             detail={
-                "error": "Unsupported file format",
-                "message": f"File format {file_ext} is not supported. "
-                          f"Supported formats: {', '.join(SUPPORTED_FORMATS)}"
+                "error": "Unsupported response mode",
+                "message": f"Mode {mode} is not supported. "
+                          f"Supported modes: {', '.join(RESPONSE_MODES)}"
             }
         )
+
+
+def _analysis_params(
+    energy_threshold: Optional[float] = Query(
+        None, description="Ngưỡng năng lượng SILENCE/UNVOICED (0-1), với threshold_mode=fixed"
+    ),
+    threshold_mode: Optional[str] = Query(
+        None, description="fixed | adaptive (ngưỡng theo nền nhiễu của bản ghi)"
+    ),
+    frame_length: Optional[int] = Query(
+        None, description="Độ dài khung (samples ở tần số phân tích)"
+    ),
+    hop_length: Optional[int] = Query(
+        None, description="Bước nhảy giữa các khung (samples) - lớn hơn thì nhanh hơn, thô hơn"
+    ),
+    fmin: Optional[float] = Query(None, description="Tần số F0 nhỏ nhất (Hz)"),
+    fmax: Optional[float] = Query(None, description="Tần số F0 lớn nhất (Hz)")
+) -> Dict[str, Any]:
+    """Tham số phân tích tùy chọn của request - chỉ các tham số được gửi"""
+    params = {
+        "energy_threshold": energy_threshold,
+        "threshold_mode": threshold_mode,
+        "frame_length": frame_length,
+        "hop_length": hop_length,
+        "fmin": fmin,
+        "fmax": fmax
+    }
+    return {name: value for name, value in params.items() if value is not None}
+
+
+def _analyzer_options(
+    f0_backend: str,
+    f0_gating: bool,
+    params: Dict[str, Any],
+    **overrides: Any
+) -> Dict[str, Any]:
+    """
+    Tham số AudioAnalyzer của một request: cấu hình server (ANALYZER_OPTIONS)
+    + tham số của request, đã kiểm tra giới hạn
+    
+    Raises:
+        HTTPException: 400 nếu tham số không hợp lệ (xem AudioAnalyzer)
+    """
+    options = {
+        **ANALYZER_OPTIONS,
+        **overrides,
+        "f0_backend": f0_backend,
+        "f0_gating": f0_gating,
+        **params
+    }
+    # frame_length / hop_length (samples) thay cho giá trị mặc định theo ms
+    if "frame_length" in params:
+        options.pop("frame_ms", None)
+    if "hop_length" in params:
+        options.pop("hop_ms", None)
     
-    # Sử dụng tempfile để xử lý file an toàn (F-S3, S-P1)
-    temp_file = None
     try:
-        # Tạo file tạm với suffix giống file gốc
-        temp_file = tempfile.NamedTemporaryFile(
-            delete=False,
-            suffix=file_ext
+        get_analyzer(**options)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error": "Invalid analysis parameter",
+                "message": str(e)
+            }
         )
+    return options
+
+
+async def _save_upload(
+    file: UploadFile,
+    file_ext: str,
+    digest: Optional[Any] = None
+) -> str:
+    """
+    Ghi file upload vào file tạm theo từng khối (F-S3, S-P1)
+    Người gọi chịu trách nhiệm xóa file tạm
+    
+    Returns:
+        Đường dẫn file tạm
         
-        # Ghi nội dung file upload vào file tạm
-        content = await file.read()
-        temp_file.write(content)
-        temp_file.close()
+    Raises:
+        HTTPException: 413 nếu file vượt quá MAX_UPLOAD_MB
+    """
+    try:
+        return await save_upload(
+            file,
+            file_ext,
+            max_bytes=MAX_UPLOAD_BYTES,
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            digest=digest
+        )
+    except UploadTooLargeError as e:
+        raise _upload_too_large(e)
+
+
+async def _receive_upload(
+    file: UploadFile,
+    file_ext: str,
+    digest: Optional[Any] = None
+) -> Tuple[AudioSource, Optional[str]]:
+    """
+    Nhận file upload để phân tích
+    
+    File nhỏ có định dạng soundfile đọc được (IN_MEMORY_FORMATS) được
+    giữ trong bộ nhớ và giải mã trực tiếp - không ghi/đọc/xóa file tạm.
+    Các trường hợp khác (mp3/m4a cần bộ giải mã ngoài, file lớn) được ghi
+    ra file tạm. Nếu có digest (hashlib), nội dung được hash khi đọc.
+    
+    Returns:
+        (nguồn âm thanh, đường dẫn file tạm hoặc None)
         
-        logger.info(f"Processing file: {temp_file.name}")
+    Raises:
+        HTTPException: 413 nếu file vượt quá MAX_UPLOAD_MB
+    """
+    if (
+        file_ext in IN_MEMORY_FORMATS
+        and file.size is not None
+        and file.size <= IN_MEMORY_MAX_BYTES
+    ):
+        try:
+            content = await read_upload(
+                file,
+                max_bytes=IN_MEMORY_MAX_BYTES,
+                chunk_size=UPLOAD_CHUNK_SIZE,
+                digest=digest
+            )
+        except UploadTooLargeError as e:
+            raise _upload_too_large(e)
+        return content, None
+    
+    temp_path = await _save_upload(file, file_ext, digest)
+    return temp_path, temp_path
+
+
+def _upload_too_large(error: UploadTooLargeError) -> HTTPException:
+    """Lỗi 413 khi file upload vượt quá MAX_UPLOAD_MB"""
+    logger.warning(f"Rejected file: {str(error)}")
+    return HTTPException(
+        status_code=413,
+        detail={
+            "error": "File too large",
+            "message": f"Upload exceeds the maximum size of {MAX_UPLOAD_MB}MB"
+        }
+    )
+
+
+def _remove_temp_file(path: str) -> None:
+    """Xóa file tạm nếu còn tồn tại (S-P1)"""
+    if path and os.path.exists(path):
+        try:
+            os.unlink(path)
+            logger.info(f"Cleaned up temp file: {path}")
+        except Exception as e:
+            logger.warning(f"Failed to delete temp file: {str(e)}")
+
+
+def _result_response(
+    filename: str,
+    body: bytes,
+    media_type: str,
+    cache_status: str
+) -> Response:
+    """Ghép filename vào kết quả đã mã hóa (xem formats.encode_result)"""
+    return Response(
+        content=attach_filename(body, filename, media_type),
+        media_type=media_type,
+        headers={"X-Cache": cache_status, "Vary": "Accept"}
+    )
+
+
+def _negotiate_format(
+    accept: Optional[str],
+    supported: Tuple[str, ...] = MEDIA_TYPES
+) -> str:
+    """
+    Chọn định dạng response theo header Accept
+    
+    Raises:
+        HTTPException: 406 nếu không hỗ trợ định dạng nào được yêu cầu
+    """
+    try:
+        return negotiate(accept, supported)
+    except NotAcceptableError as e:
+        raise HTTPException(
+            status_code=406,
+            detail={
+                "error": "Not acceptable",
+                "message": str(e)
+            }
+        )
+
+
+def _server_busy() -> HTTPException:
+    """Lỗi 503 kèm Retry-After khi hàng đợi phân tích đầy"""
+    return HTTPException(
+        status_code=503,
+        detail={
+            "error": "Server busy",
+            "message": "Analysis queue is full, please retry later"
+        },
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+@app.post("/analyze/")
+async def analyze_audio(
+    file: UploadFile = File(...),
+    f0_backend: str = Query("pyin", description="Thuật toán F0: pyin, yin, nccf"),
+    f0_gating: bool = Query(False, description="Bỏ qua F0 ở các đoạn im lặng"),
+    mode: str = Query("frames", description="Định dạng segments: frames, runs"),
+    params: Dict[str, Any] = Depends(_analysis_params),
+    accept: Optional[str] = Header(None)
+) -> Response:
+    """
+    Endpoint chính để phân tích file âm thanh (F-S1)
+    
+    Args:
+        file: File âm thanh được upload qua multipart/form-data
+        f0_backend: Thuật toán trích xuất F0 (query parameter)
+        f0_gating: Chỉ chạy F0 trên đoạn có năng lượng (query parameter)
+        mode: frames (mỗi frame một segment) hoặc runs (gộp các frame
+            liên tiếp cùng loại thành một đoạn)
+        params: energy_threshold, threshold_mode, frame_length, hop_length, fmin, fmax
+            (query parameter, tùy chọn) - kết quả có "params" là toàn bộ
+            tham số hiệu lực
+        accept: Định dạng response (header Accept, xem formats.py);
+            chỉ áp dụng cho mode=frames, mode=runs luôn trả về JSON
+        
+    Returns:
+        Kết quả phân tích - mặc định JSON theo hợp đồng F-S5
+        (header X-Cache: HIT/MISS)
+        
+    Raises:
+        HTTPException: 400 nếu file không hợp lệ, 406 nếu không hỗ trợ
+            định dạng trong Accept, 413 nếu file quá lớn,
+            503 nếu hàng đợi đầy, 500 nếu lỗi xử lý
+    """
+    logger.info(f"Received file: {file.filename}")
+    file_ext = _validate_request(file, f0_backend, mode)
+    options = _analyzer_options(f0_backend, f0_gating, params)
+    media_type = _negotiate_format(accept) if mode == "frames" else JSON_MEDIA_TYPE
+    columnar = media_type in COLUMNAR_MEDIA_TYPES
+    
+    # File nhỏ giải mã trong bộ nhớ, còn lại dùng tempfile (F-S3, S-P1)
+    digest = hashlib.sha256()
+    source, temp_path = await _receive_upload(file, file_ext, digest)
+    try:
+        # Cùng nội dung + cùng tham số đã phân tích trước đó -> dùng lại
+        cache_key = make_cache_key(
+            digest.hexdigest(),
+            {
+                **get_analyzer(**options).config(),
+                "mode": mode,
+                "format": media_type
+            }
+        )
+        if result_cache.enabled:
+            cached = await run_in_threadpool(result_cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"Cache hit: {file.filename}")
+                return _result_response(
+                    file.filename, cached, media_type, "HIT"
+                )
         
-        # Phân tích file âm thanh (F-S4)
-        result = analyze_audio_file(temp_file.name)
+        logger.info(f"Processing file: {temp_path or 'in memory'}")
+        
+        # Phân tích file âm thanh (F-S4) trên pool, không chặn event loop
+        # Định dạng dạng cột lấy thẳng mảng NumPy, không tạo dict từng frame
+        if columnar:
+            result = await executor.run(
+                analyze_audio_columns,
+                source,
+                filename=file.filename,
+                **options
+            )
+        else:
+            result = await executor.run(
+                analyze_audio_file,
+                source,
+                filename=file.filename,
+                mode=mode,
+                **options
+            )
         
         logger.info(
             f"Analysis completed: {result['total_segments']} segments"
         )
         
-        # Trả về kết quả theo hợp đồng F-S5
-        return JSONResponse(
-            content=result,
-            status_code=200
-        )
+        body = encode_result(result, media_type)
+        if result_cache.enabled:
+            # Lỗi cache không được làm hỏng kết quả đã phân tích xong
+            try:
+                await run_in_threadpool(result_cache.put, cache_key, body)
+            except Exception as e:
+                logger.warning(f"Failed to cache result: {str(e)}")
+        
+        # Trả về kết quả theo định dạng đã chọn (mặc định F-S5)
+        return _result_response(file.filename, body, media_type, "MISS")
+        
+    except QueueFullError as e:
+        logger.warning(f"Rejected file: {str(e)}")
+        raise _server_busy()
         
     except Exception as e:
         logger.error(f"Error processing file: {str(e)}", exc_info=True)
@@ -128,32 +676,617 @@ async def analyze_audio(file: UploadFile = File(...)) -> JSONResponse:
         
     finally:
         # Đảm bảo file tạm được xóa (S-P1)
-        if temp_file and os.path.exists(temp_file.name):
-            try:
-                os.unlink(temp_file.name)
-                logger.info(f"Cleaned up temp file: {temp_file.name}")
-            except Exception as e:
-                logger.warning(f"Failed to delete temp file: {str(e)}")
+        _remove_temp_file(temp_path)
 
 
-@app.get("/stats/")
-async def get_stats():
-    """Endpoint thống kê (tùy chọn)"""
+@app.post("/analyze/stream")
+async def analyze_audio_stream(
+    file: UploadFile = File(...),
+    f0_backend: str = Query("pyin", description="Thuật toán F0: pyin, yin, nccf"),
+    f0_gating: bool = Query(False, description="Bỏ qua F0 ở các đoạn im lặng"),
+    mode: str = Query("frames", description="Định dạng segments: frames, runs"),
+    params: Dict[str, Any] = Depends(_analysis_params),
+    accept: Optional[str] = Header(None)
+) -> StreamingResponse:
+    """
+    Phân tích file âm thanh và gửi kết quả dần theo từng khối
+    
+    Client có thể hiển thị segments ngay khi khối đầu tiên xong thay vì
+    chờ cả file. Các sự kiện (NDJSON hoặc SSE, theo header Accept):
+    - start: filename, mode, total_frames, sample_rate, params
+    - segments: các segment (frames) hoặc đoạn đã hoàn chỉnh (runs) của khối
+    - end: total_segments, time_to_first_segment, total_time (giây)
+    - error: lỗi xảy ra sau khi response đã bắt đầu
+    
+    Raises:
+        HTTPException: 400 nếu file không hợp lệ, 406 nếu không hỗ trợ
+            định dạng trong Accept, 413 nếu file quá lớn,
+            503 nếu hàng đợi đầy, 500 nếu lỗi xử lý khối đầu tiên
+    """
+    logger.info(f"Received stream file: {file.filename}")
+    file_ext = _validate_request(file, f0_backend, mode)
+    options = _analyzer_options(f0_backend, f0_gating, params)
+    media_type = _negotiate_format(accept, STREAM_MEDIA_TYPES)
+    started = time.perf_counter()
+    
+    temp_path = await _save_upload(file, file_ext)
+    analysis = StreamingAnalysis(
+        executor,
+        temp_path,
+        options,
+        block_frames=STREAM_BLOCK_FRAMES,
+        prefetch=STREAM_PREFETCH,
+        retry_delay=RETRY_AFTER_SECONDS
+    )
+    
+    # Khối đầu tiên được phân tích trước khi gửi header, để lỗi và hàng
+    # đợi đầy vẫn trả được mã HTTP như /analyze/
+    try:
+        await analysis.start()
+    except QueueFullError as e:
+        logger.warning(f"Rejected stream file: {str(e)}")
+        _remove_temp_file(temp_path)
+        raise _server_busy()
+    except Exception as e:
+        logger.error(f"Error processing file: {str(e)}", exc_info=True)
+        _remove_temp_file(temp_path)
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": "Internal server error",
+                "message": f"Failed to process audio file: {str(e)}"
+            }
+        )
+    
+    analyzer = get_analyzer(**options)
+    
+    async def events():
+        first_segment_at = None
+        total_segments = 0
+        try:
+            yield encode_event("start", {
+                "filename": file.filename,
+                "mode": mode,
+                "total_frames": analysis.total_frames,
+                "sample_rate": analysis.sample_rate,
+                "params": analyzer.params(
+                    analysis.sample_rate, analysis.threshold, analysis.noise_floor
+                )
+            }, media_type)
+            
+            if mode == "runs":
+                batches = _stream_runs(analyzer, analysis)
+            else:
+                batches = _stream_frames(analyzer, analysis)
+            
+            async for segments in batches:
+                if not segments:
+                    continue
+                if first_segment_at is None:
+                    first_segment_at = time.perf_counter()
+                total_segments += len(segments)
+                yield encode_event("segments", {"segments": segments}, media_type)
+            
+            finished = time.perf_counter()
+            timing = {
+                "time_to_first_segment": round(
+                    (first_segment_at or finished) - started, 4
+                ),
+                "total_time": round(finished - started, 4)
+            }
+            logger.info(
+                f"Stream completed: {total_segments} segments, "
+                f"first segment after {timing['time_to_first_segment']}s, "
+                f"total {timing['total_time']}s"
+            )
+            yield encode_event("end", {
+                "total_segments": total_segments,
+                **timing
+            }, media_type)
+            
+        except Exception as e:
+            logger.error(f"Error streaming file: {str(e)}", exc_info=True)
+            yield encode_event("error", {
+                "error": "Internal server error",
+                "message": f"Failed to process audio file: {str(e)}"
+            }, media_type)
+            
+        finally:
+            # Đảm bảo file tạm được xóa (S-P1)
+            _remove_temp_file(temp_path)
+    
+    return StreamingResponse(
+        events(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _stream_frames(analyzer: AudioAnalyzer, analysis: StreamingAnalysis):
+    """Segment F-S5 của từng khối"""
+    async for columns in analysis.blocks():
+        with stage("segments"):
+            segments = analyzer._columns_to_segments(columns)
+        yield segments
+
+
+async def _stream_runs(analyzer: AudioAnalyzer, analysis: StreamingAnalysis):
+    """Các đoạn đã hoàn chỉnh sau mỗi khối, đoạn cuối khi hết file"""
+    accumulator = RunAccumulator(analyzer, analysis.sample_rate)
+    async for columns in analysis.blocks():
+        with stage("segments"):
+            runs = accumulator.push(columns)
+        yield runs
+    yield accumulator.flush()
+
+
+@app.post("/analyze/batch")
+async def analyze_audio_batch(
+    files: List[UploadFile] = File(...),
+    f0_backend: str = Query("pyin", description="Thuật toán F0: pyin, yin, nccf"),
+    f0_gating: bool = Query(False, description="Bỏ qua F0 ở các đoạn im lặng"),
+    mode: str = Query("frames", description="Định dạng segments: frames, runs"),
+    params: Dict[str, Any] = Depends(_analysis_params)
+) -> Response:
+    """
+    Phân tích nhiều file trong một request
+    
+    Mỗi phần `files` là một file âm thanh hoặc một file nén (.zip, .tar,
+    .tar.gz, .tgz) chứa các file âm thanh. Các file được phân tích song
+    song trên pool theo nhóm BATCH_CHUNK_FILES file; lỗi của một file
+    (định dạng, giải mã...) chỉ nằm trong kết quả của file đó.
+    
+    Returns:
+        JSON: total_files, succeeded, failed, cache_hits, mode, timing
+        (total_time, analysis_time, mean_file_time, files_per_second) và
+        results - theo thứ tự file, mỗi phần tử là kết quả như /analyze/
+        kèm "status": "ok", hoặc {filename, status: "error", error, message}
+        
+    Raises:
+        HTTPException: 400 nếu tham số không hợp lệ hoặc quá BATCH_MAX_FILES
+            file, 413 nếu request quá BATCH_MAX_UPLOAD_MB, 500 nếu lỗi xử lý
+    """
+    logger.info(f"Received batch: {len(files)} uploads")
+    _validate_options(f0_backend, mode)
+    options = _analyzer_options(f0_backend, f0_gating, params)
+    
+    batch = BatchAnalysis(
+        executor,
+        options,
+        mode,
+        chunk_files=BATCH_CHUNK_FILES,
+        concurrency=BATCH_CONCURRENCY,
+        cache=result_cache,
+        retry_delay=RETRY_AFTER_SECONDS
+    )
+    archives = []
+    try:
+        # Liệt kê mọi file (kể cả trong file nén) trước khi đọc nội dung
+        entries = []
+        for file in files:
+            suffix = archive_suffix(file.filename)
+            if suffix is None:
+                entries.append((file, None))
+                continue
+            reader, error = await _open_archive(file, suffix, archives)
+            if reader is None:
+                entries.append((BatchItem(file.filename, error=error), None))
+                continue
+            members = await run_in_threadpool(reader.members)
+            entries.extend((reader, member) for member in members)
+        
+        if len(entries) > BATCH_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": "Too many files",
+                    "message": f"Batch contains {len(entries)} files, "
+                              f"the maximum is {BATCH_MAX_FILES}"
+                }
+            )
+        
+        batch.plan(len(entries))
+        for source, member in entries:
+            if isinstance(source, BatchItem):
+                item = source
+            elif member is None:
+                item = await _batch_upload_item(source)
+            else:
+                item = await _batch_member_item(source, *member)
+            await batch.add(item)
+        await batch.finish()
+        
+        logger.info(
+            f"Batch completed: {batch.counters['succeeded']} succeeded, "
+            f"{batch.counters['failed']} failed"
+        )
+        return Response(content=batch.encode(), media_type=JSON_MEDIA_TYPE)
+    
+    except HTTPException:
+        raise
+    
+    except Exception as e:
+        logger.error(f"Error processing batch: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "error": "Internal server error",
+                "message": f"Failed to process batch: {str(e)}"
+            }
+        )
+    
+    finally:
+        # Đảm bảo file tạm được xóa (S-P1)
+        batch.close()
+        for reader, temp_path in archives:
+            reader.close()
+            _remove_temp_file(temp_path)
+
+
+async def _open_archive(
+    file: UploadFile,
+    suffix: str,
+    archives: List[Tuple[ArchiveReader, str]]
+) -> Tuple[Optional[ArchiveReader], Optional[Dict[str, str]]]:
+    """
+    Lưu file nén ra file tạm và mở (file tạm được thêm vào `archives`)
+    
+    Returns:
+        (reader, None) hoặc (None, chi tiết lỗi) nếu file nén không hợp lệ
+    """
+    try:
+        temp_path = await save_upload(
+            file,
+            suffix,
+            max_bytes=BATCH_MAX_UPLOAD_BYTES,
+            chunk_size=UPLOAD_CHUNK_SIZE
+        )
+    except UploadTooLargeError as e:
+        raise _upload_too_large(e)
+    
+    try:
+        reader = await run_in_threadpool(ArchiveReader, temp_path)
+    except Exception as e:
+        _remove_temp_file(temp_path)
+        return None, {"error": "Invalid archive", "message": str(e)}
+    archives.append((reader, temp_path))
+    return reader, None
+
+
+async def _batch_upload_item(file: UploadFile) -> BatchItem:
+    """Nhận một file upload của batch (trong bộ nhớ hoặc file tạm)"""
+    file_ext = os.path.splitext(file.filename)[1].lower()
+    if file_ext not in SUPPORTED_FORMATS:
+        return BatchItem(file.filename, error=_unsupported_format(file_ext))
+    
+    digest = hashlib.sha256()
+    try:
+        source, temp_path = await _receive_upload(file, file_ext, digest)
+    except HTTPException as e:
+        return BatchItem(file.filename, error=e.detail)
+    return BatchItem(file.filename, source, temp_path, digest.hexdigest())
+
+
+async def _batch_member_item(
+    reader: ArchiveReader,
+    name: str,
+    size: int,
+    handle: Any
+) -> BatchItem:
+    """Đọc một file trong file nén (giống _receive_upload)"""
+    file_ext = os.path.splitext(name)[1].lower()
+    if file_ext not in SUPPORTED_FORMATS:
+        return BatchItem(name, error=_unsupported_format(file_ext))
+    if size > MAX_UPLOAD_BYTES:
+        return BatchItem(name, error={
+            "error": "File too large",
+            "message": f"File exceeds the maximum size of {MAX_UPLOAD_MB}MB"
+        })
+    
+    try:
+        if file_ext in IN_MEMORY_FORMATS and size <= IN_MEMORY_MAX_BYTES:
+            content, digest = await run_in_threadpool(reader.read, handle)
+            return BatchItem(name, content, None, digest)
+        temp_path, digest = await run_in_threadpool(reader.extract, handle, file_ext)
+        return BatchItem(name, temp_path, temp_path, digest)
+    except Exception as e:
+        return BatchItem(name, error={"error": "Invalid archive", "message": str(e)})
+
+
+@app.websocket("/ws/analyze")
+async def analyze_live(
+    websocket: WebSocket,
+    f0_backend: str = "nccf",
+    f0_gating: bool = False,
+    params: Dict[str, Any] = Depends(_analysis_params)
+) -> None:
+    """
+    Phân tích trực tiếp audio từ microphone qua WebSocket
+    
+    Client gửi message nhị phân chứa PCM int16 little-endian, mono,
+    16 kHz (độ dài tùy ý), và text "end" khi dừng. Tham số phân tích tùy
+    chọn như /analyze/ (query). Server trả về JSON:
+    - start: sample_rate, frame_length, hop_length, f0_backend, params,
+      latency (giây)
+    - segments: các frame vừa hoàn chỉnh {time, type, f0, energy}
+    - end: total_frames (sau khi đã gửi các frame còn lại)
+    - error: error, message (kết nối bị đóng sau đó)
+    
+    Mỗi frame được trả về sau tối đa `latency` giây audio kể từ tâm frame.
+    """
+    global live_sessions
+    await websocket.accept()
+    
+    if f0_backend not in LIVE_F0_BACKENDS:
+        await _close_live(websocket, 1008, "Unsupported F0 backend",
+                          f"F0 backend {f0_backend} is not supported for live analysis. "
+                          f"Supported backends: {', '.join(LIVE_F0_BACKENDS)}")
+        return
+    try:
+        options = _analyzer_options(
+            f0_backend, f0_gating, params, sample_rate=LIVE_SAMPLE_RATE
+        )
+    except HTTPException as e:
+        await _close_live(websocket, 1008, e.detail["error"], e.detail["message"])
+        return
+    if live_sessions >= LIVE_MAX_SESSIONS:
+        await _close_live(websocket, 1013, "Server busy",
+                          "Too many live sessions, please retry later")
+        return
+    
+    session = None
+    try:
+        # Tăng trong try để finally luôn trả lại chỗ, kể cả khi khởi tạo lỗi
+        live_sessions += 1
+        analyzer = get_analyzer(**options)
+        session = LiveAnalysis(analyzer, LIVE_SAMPLE_RATE)
+        logger.info(f"Live session started ({f0_backend})")
+        
+        await websocket.send_json({
+            "event": "start",
+            "sample_rate": LIVE_SAMPLE_RATE,
+            "frame_length": analyzer.frame_length,
+            "hop_length": analyzer.hop_length,
+            "f0_backend": f0_backend,
+            "params": analyzer.params(LIVE_SAMPLE_RATE),
+            "latency": session.latency_samples / LIVE_SAMPLE_RATE
+        })
+        
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes") is not None:
+                # Phân tích ngoài event loop (S-P2), mỗi lần chỉ vài frame
+                columns = await run_in_threadpool(session.push_pcm16, message["bytes"])
+                await _send_live_segments(websocket, analyzer, session, columns)
+            elif (message.get("text") or "").strip() == "end":
+                columns = await run_in_threadpool(session.flush)
+                await _send_live_segments(websocket, analyzer, session, columns)
+                await websocket.send_json({
+                    "event": "end",
+                    "total_frames": session.next_frame
+                })
+                await websocket.close()
+                break
+            else:
+                await _close_live(websocket, 1003, "Unsupported message",
+                                  "Send binary PCM int16 chunks or the text \"end\"")
+                break
+    
+    except WebSocketDisconnect:
+        pass
+    
+    except Exception as e:
+        logger.error(f"Live session error: {str(e)}", exc_info=True)
+        await _close_live(websocket, 1011, "Internal server error",
+                          f"Failed to process audio: {str(e)}")
+    
+    finally:
+        live_sessions -= 1
+        if session is not None:
+            logger.info(f"Live session ended: {session.next_frame} frames")
+
+
+async def _send_live_segments(
+    websocket: WebSocket,
+    analyzer: AudioAnalyzer,
+    session: LiveAnalysis,
+    columns: Dict[str, Any]
+) -> None:
+    """
+    Gửi các frame vừa hoàn chỉnh (bỏ qua nếu chưa có frame nào), kèm
+    ngưỡng năng lượng hiện tại khi nền nhiễu được theo dõi (adaptive)
+    """
+    if len(columns["type"]):
+        event = {
+            "event": "segments",
+            "segments": analyzer._columns_to_segments(columns)
+        }
+        if session.noise_floor is not None:
+            event["energy_threshold"] = round(session.threshold, 6)
+            event["noise_floor"] = round(session.noise_floor, 6)
+        await websocket.send_json(event)
+
+
+async def _close_live(websocket: WebSocket, code: int, error: str, message: str) -> None:
+    """Gửi sự kiện lỗi cùng định dạng với các endpoint rồi đóng kết nối"""
+    try:
+        await websocket.send_json({"event": "error", "error": error, "message": message})
+        await websocket.close(code=code)
+    except Exception:
+        pass  # client đã ngắt kết nối
+
+
+def _get_job_or_404(job_id: str) -> Job:
+    """Lấy job theo id hoặc trả về 404"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "error": "Job not found",
+                "message": f"Job {job_id} does not exist or has expired"
+            }
+        )
+    return job
+
+
+@app.post("/jobs/", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    f0_backend: str = Query("pyin", description="Thuật toán F0: pyin, yin, nccf"),
+    f0_gating: bool = Query(False, description="Bỏ qua F0 ở các đoạn im lặng"),
+    mode: str = Query("frames", description="Định dạng segments: frames, runs"),
+    params: Dict[str, Any] = Depends(_analysis_params)
+) -> Dict[str, Any]:
+    """
+    Tạo job phân tích bất đồng bộ - trả về job id ngay lập tức
+    
+    Dùng cho file dài mà /analyze/ có thể vượt timeout của client.
+    
+    Raises:
+        HTTPException: 400 nếu file không hợp lệ, 413 nếu file quá lớn,
+            503 nếu quá nhiều job
+    """
+    logger.info(f"Received job file: {file.filename}")
+    file_ext = _validate_request(file, f0_backend, mode)
+    options = _analyzer_options(f0_backend, f0_gating, params)
+    temp_path = await _save_upload(file, file_ext)
+    # Đọc header (có thể chậm với mp3/m4a) ngoài event loop
+    duration = await run_in_threadpool(get_audio_duration, temp_path)
+    
+    try:
+        job = jobs.submit(
+            analyze_audio_file,
+            file.filename,
+            temp_path,
+            duration,
+            mode=mode,
+            **options
+        )
+    except QueueFullError as e:
+        logger.warning(f"Rejected job: {str(e)}")
+        _remove_temp_file(temp_path)
+        raise _server_busy()
+    
     return {
+        **job.to_dict(jobs.progress(job)),
+        "status_url": f"/jobs/{job.id}",
+        "result_url": f"/jobs/{job.id}/result"
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> Dict[str, Any]:
+    """Trạng thái và tiến độ của job"""
+    job = _get_job_or_404(job_id)
+    return job.to_dict(jobs.progress(job))
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str) -> Response:
+    """
+    Kết quả của job theo hợp đồng F-S5
+    
+    Raises:
+        HTTPException: 404 nếu không có job, 409 nếu job chưa xong
+            hoặc đã bị hủy, 500 nếu job lỗi
+    """
+    job = _get_job_or_404(job_id)
+    
+    if job.status == FAILED:
+        raise HTTPException(
+            status_code=500,
+            detail={"error": "Internal server error", "message": job.error}
+        )
+    if job.status != DONE:
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error": "Job not completed",
+                "message": f"Job {job_id} is {job.status}"
+            }
+        )
+    
+    return Response(content=job.result, media_type=JSON_MEDIA_TYPE)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    """Hủy job đang chờ hoặc đang chạy"""
+    _get_job_or_404(job_id)
+    job = jobs.cancel(job_id)
+    return job.to_dict(jobs.progress(job))
+
+
+@app.get("/stats/")
+async def get_stats(
+    f0_backend: Optional[str] = Query(
+        None, description="Ước lượng chi phí cho cấu hình này (cost_model)"
+    ),
+    f0_gating: bool = Query(False, description="Bỏ qua F0 ở các đoạn im lặng"),
+    params: Dict[str, Any] = Depends(_analysis_params)
+):
+    """
+    Endpoint thống kê (tùy chọn)
+    
+    Khi có f0_backend (và các tham số phân tích như /analyze/), kết quả có
+    thêm cost_model: số giây CPU ước lượng cho mỗi giây audio với cấu hình
+    đó (xem AudioAnalyzer.estimate_cost), đo trên pool phân tích.
+    
+    Raises:
+        HTTPException: 400 nếu tham số không hợp lệ, 503 nếu hàng đợi đầy
+    """
+    stats = {
         "supported_formats": list(SUPPORTED_FORMATS),
-        "max_file_size": "100MB (configurable)",
-        "frame_classification": ["VOICED", "UNVOICED", "SILENCE"]
+        "max_file_size": f"{MAX_UPLOAD_MB}MB (configurable)",
+        "frame_classification": ["VOICED", "UNVOICED", "SILENCE"],
+        "f0_backends": list(F0_BACKENDS),
+        "response_modes": list(RESPONSE_MODES),
+        "response_formats": list(MEDIA_TYPES),
+        "executor": executor.stats(),
+        "jobs": jobs.stats(),
+        "cache": result_cache.stats(),
+        "live_sessions": {"active": live_sessions, "max": LIVE_MAX_SESSIONS},
+        "batch": {
+            "max_files": BATCH_MAX_FILES,
+            "chunk_files": BATCH_CHUNK_FILES,
+            "concurrency": BATCH_CONCURRENCY
+        }
     }
+    
+    if f0_backend is not None:
+        _validate_options(f0_backend, "frames")
+        options = _analyzer_options(f0_backend, f0_gating, params)
+        try:
+            cost = await executor.run(estimate_analysis_cost, **options)
+        except QueueFullError:
+            raise _server_busy()
+        cpu_per_second = cost["cpu_seconds_per_audio_second"]
+        stats["cost_model"] = {
+            "params": get_analyzer(**options).params(cost["sample_rate"]),
+            "frames_per_second": round(cost["frames_per_second"], 2),
+            "cpu_seconds_per_audio_second": round(cpu_per_second, 5),
+            "audio_seconds_per_cpu_second": (
+                round(1 / cpu_per_second, 1) if cpu_per_second > 0 else None
+            )
+        }
+    
+    return stats
 
 
 if __name__ == "__main__":
     import uvicorn
     
-    # Chạy server với cấu hình phù hợp NF-4
+    # Chạy server cho phát triển (tự reload khi sửa code). Production dùng
+    # launcher.py: nhiều worker fork từ tiến trình đã nạp sẵn (NF-4), số
+    # worker chọn bằng loadtest.py
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,  # Tắt trong production
-        workers=1  # Tăng lên 4-8 trong production (NF-4)
+        reload=True,
+        workers=1
     )
@@ -0,0 +1,415 @@
+"""
+Metrics theo định dạng text của Prometheus (GET /metrics)
+
+Không cần prometheus_client: chỉ Counter, Gauge và Histogram có nhãn, đủ
+cho các metric của server. Giá trị nằm trong tiến trình server - mỗi tiến
+trình (khi chạy nhiều worker uvicorn) có bộ đếm riêng.
+
+Thời gian từng giai đoạn (STAGES) được gom theo request: stage(name) cộng
+dồn vào bộ gom của context hiện tại (contextvars - mỗi request/tác vụ
+asyncio một bộ gom). Giai đoạn chạy trong worker của pool được gom bởi
+collect_stages ngay trong worker rồi AnalysisExecutor cộng vào bộ gom của
+request đã gửi tác vụ. Ngoài bộ gom (CLI, benchmark), stage() không làm gì.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Các giai đoạn được đo (nhãn stage của analysis_stage_seconds)
+# - upload_read: đọc body upload; temp_write: ghi file tạm (uploads.py)
+# - decode: giải mã audio; resample: về tần số phân tích
+# - energy, f0, classify: các bước của AudioAnalyzer.analyze_signal
+# - segments: tạo segment F-S5 / runs; encode: mã hóa response (formats.py)
+STAGES = (
+    "upload_read", "temp_write", "decode", "resample", "energy", "f0",
+    "classify", "segments", "encode"
+)
+
+# Bucket (giây) cho thời gian request và thời gian từng giai đoạn
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+)
+# Bucket cho hệ số thời gian thực (giây xử lý / giây audio)
+RTF_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0)
+# Ranh giới (giây) của nhãn audio_duration: "0-10s", "10-60s", ..., "3600s+"
+AUDIO_DURATION_BUCKETS = (10, 60, 600, 3600)
+
+LabelValues = Tuple[str, ...]
+# Kiểu ASGI (như starlette.types) - module này không import starlette để
+# analysis.py (CLI, worker) dùng được stage() mà không kéo theo web framework
+Message = Dict[str, Any]
+ASGIApp = Callable[..., Awaitable[None]]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """
+    Metric có nhãn: giá trị theo bộ giá trị nhãn
+
+    Nếu có `func`, giá trị được đọc lúc render: func() trả về một số
+    (metric không nhãn) hoặc dict {bộ giá trị nhãn: số}.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        func: Optional[Callable[[], Any]] = None
+    ):
+        self.name = name
+        self.help = description
+        self.labelnames = tuple(labelnames)
+        self.func = func
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Dict[LabelValues, float]:
+        if self.func is None:
+            with self._lock:
+                return dict(self._values)
+        values = self.func()
+        if isinstance(values, dict):
+            return {
+                tuple(str(v) for v in (key if isinstance(key, tuple) else (key,))): value
+                for key, value in values.items()
+            }
+        return {(): values}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in sorted(self._samples().items()):
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Giá trị tức thời"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Phân bố giá trị theo các bucket cố định (cộng dồn như Prometheus)"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(
+                (key, (list(state[0]), state[1], state[2]))
+                for key, state in self._values.items()
+            )
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(
+                    self.labelnames + ("le",), values + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Tập các metric của server, render theo định dạng text của Prometheus"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _add(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                func: Optional[Callable[[], Any]] = None) -> Counter:
+        return self._add(Counter(name, description, labelnames, func))
+
+    def gauge(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+              func: Optional[Callable[[], Any]] = None) -> Gauge:
+        return self._add(Gauge(name, description, labelnames, func))
+
+    def histogram(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, description, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageTimings:
+    """
+    Bộ gom của một request/tác vụ
+
+    Attributes:
+        stages: Tổng thời gian (giây) theo giai đoạn
+        audio_seconds: Tổng số giây audio đã phân tích
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.audio_seconds = 0.0
+
+    def add(self, stages: Dict[str, float], audio_seconds: float = 0.0) -> None:
+        for name, seconds in stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.audio_seconds += audio_seconds
+
+
+_current: ContextVar[Optional[StageTimings]] = ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Cộng thời gian của khối lệnh vào giai đoạn `name` của bộ gom hiện tại"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.stages[name] = timings.stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def record_audio(seconds: float) -> None:
+    """Ghi nhận số giây audio vừa được phân tích (tính hệ số thời gian thực)"""
+    timings = _current.get()
+    if timings is not None:
+        timings.audio_seconds += seconds
+
+
+def start_stages() -> StageTimings:
+    """
+    Dùng một bộ gom mới cho phần còn lại của context hiện tại - cho tác
+    vụ asyncio chạy nền (job), vốn có bản sao context riêng
+    """
+    timings = StageTimings()
+    _current.set(timings)
+    return timings
+
+
+@contextmanager
+def track_stages() -> Iterator[StageTimings]:
+    """Dùng một bộ gom mới cho khối lệnh (một request hoặc một job)"""
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def collect_stages(
+    func: Callable[..., Any],
+    *args: Any,
+    **kwargs: Any
+) -> Tuple[Any, Tuple[Dict[str, float], float]]:
+    """
+    Chạy func trong worker với bộ gom riêng
+
+    Returns:
+        (kết quả, (thời gian theo giai đoạn, số giây audio)) - xem merge_stages
+    """
+    with track_stages() as timings:
+        result = func(*args, **kwargs)
+    return result, (timings.stages, timings.audio_seconds)
+
+
+def merge_stages(collected: Tuple[Dict[str, float], float]) -> None:
+    """Cộng phần gom được trong worker (collect_stages) vào bộ gom hiện tại"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(*collected)
+
+
+def duration_label(seconds: float) -> str:
+    """Nhãn audio_duration của một độ dài audio (xem AUDIO_DURATION_BUCKETS)"""
+    if seconds <= 0:
+        return "none"
+    lower = 0
+    for bound in AUDIO_DURATION_BUCKETS:
+        if seconds <= bound:
+            return f"{lower}-{bound}s"
+        lower = bound
+    return f"{lower}s+"
+
+
+class AnalysisMetrics:
+    """
+    Metric của request HTTP và tác vụ phân tích
+
+    Dùng bởi MetricsMiddleware (mỗi request) và JobStore (mỗi job chạy nền).
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.requests = registry.counter(
+            "http_requests_total", "Số request HTTP đã xử lý",
+            ("method", "route", "status")
+        )
+        self.in_flight = registry.gauge(
+            "http_requests_in_flight", "Số request HTTP đang xử lý"
+        )
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "Thời gian xử lý request (tới byte cuối)",
+            ("route",)
+        )
+        self.stages = registry.histogram(
+            "analysis_stage_seconds", "Thời gian từng giai đoạn trong một request/job",
+            ("stage", "audio_duration")
+        )
+        self.processing = registry.histogram(
+            "analysis_processing_seconds", "Thời gian xử lý request/job có phân tích audio",
+            ("route", "audio_duration")
+        )
+        self.audio = registry.counter(
+            "analysis_audio_seconds_total", "Tổng số giây audio đã phân tích", ("route",)
+        )
+        self.real_time_factor = registry.histogram(
+            "analysis_real_time_factor", "Thời gian xử lý / thời lượng audio",
+            ("route",), RTF_BUCKETS
+        )
+
+    def observe(self, route: str, elapsed: float, timings: StageTimings) -> None:
+        """Ghi nhận các giai đoạn và hệ số thời gian thực của một request/job"""
+        duration = duration_label(timings.audio_seconds)
+        for name, seconds in timings.stages.items():
+            self.stages.observe(seconds, stage=name, audio_duration=duration)
+        if timings.audio_seconds > 0:
+            self.processing.observe(elapsed, route=route, audio_duration=duration)
+            self.audio.inc(timings.audio_seconds, route=route)
+            self.real_time_factor.observe(elapsed / timings.audio_seconds, route=route)
+
+
+class MetricsMiddleware:
+    """
+    Đo mỗi request HTTP: số request theo route/mã trạng thái, số request
+    đang xử lý, thời gian (tới byte cuối của response, kể cả streaming) và
+    các giai đoạn gom được trong request (xem AnalysisMetrics.observe)
+
+    Nhãn route là mẫu đường dẫn của endpoint (vd. /jobs/{job_id}), không phải
+    đường dẫn thực - số nhãn không tăng theo số job.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: AnalysisMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        scope: Dict[str, Any],
+        receive: Callable[[], Awaitable[Message]],
+        send: Callable[[Message], Awaitable[None]]
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.metrics.in_flight.inc()
+        start = time.perf_counter()
+        try:
+            with track_stages() as timings:
+                await self.app(scope, receive, send_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.metrics.in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.metrics.requests.inc(method=scope["method"], route=route, status=status)
+            self.metrics.latency.observe(elapsed, route=route)
+            self.metrics.observe(route, elapsed, timings)
@@ -0,0 +1,156 @@
+"""
+Phân tích streaming trên AnalysisExecutor - mỗi khối frame là một tác vụ
+riêng, kết quả được trả về client ngay khi từng khối xong
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+import numpy as np
+import soundfile
+from starlette.concurrency import run_in_threadpool
+
+from analysis import (
+    analyze_audio_block, analyze_audio_columns, estimate_audio_threshold, get_analyzer
+)
+from executor import AnalysisExecutor, QueueFullError
+
+logger = logging.getLogger(__name__)
+
+
+def _read_info(file_path: str) -> Optional[Any]:
+    """Header của file, None nếu libsndfile không đọc được"""
+    try:
+        return soundfile.info(file_path)
+    except RuntimeError:
+        return None
+
+
+class StreamingAnalysis:
+    """
+    Chia file thành các khối block_frames frame và phân tích lần lượt
+
+    Khối đầu tiên được phân tích trong start(), nên lỗi và hàng đợi đầy
+    vẫn trả được mã HTTP trước khi response bắt đầu. Trong lúc client nhận
+    một khối, tối đa `prefetch` khối tiếp theo đã được gửi vào pool.
+
+    File libsndfile không đọc được (mp3/m4a tùy phiên bản) được phân tích
+    một lần rồi chia khối - vẫn đúng kết quả, nhưng không giảm độ trễ.
+
+    Với threshold_mode="adaptive", start() chạy thêm một lượt chỉ tính
+    energy trên cả file (estimate_audio_threshold) trước khối đầu tiên, để
+    mọi khối dùng cùng ngưỡng như khi phân tích cả file.
+
+    Attributes:
+        sample_rate: Tần số phân tích (sau start)
+        total_frames: Tổng số frame (sau start)
+        threshold: Ngưỡng năng lượng của cả file (sau start)
+        noise_floor: Nền nhiễu đã ước lượng (threshold_mode="adaptive")
+    """
+
+    def __init__(
+        self,
+        executor: AnalysisExecutor,
+        file_path: str,
+        options: Dict[str, Any],
+        block_frames: int,
+        prefetch: int = 1,
+        retry_delay: float = 1.0
+    ):
+        self.executor = executor
+        self.file_path = file_path
+        self.options = options
+        self.block_frames = max(1, block_frames)
+        self.prefetch = max(0, prefetch)
+        self.retry_delay = retry_delay
+        self.sample_rate: Optional[int] = None
+        self.total_frames: Optional[int] = None
+        self.threshold: Optional[float] = None
+        self.noise_floor: Optional[float] = None
+        self._first: Optional[Dict[str, np.ndarray]] = None
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+
+    async def start(self) -> None:
+        """
+        Đọc header và phân tích khối đầu tiên
+
+        Raises:
+            QueueFullError: Nếu pool phân tích đang đầy
+        """
+        info = await run_in_threadpool(_read_info, self.file_path)
+        if info is None:
+            result = await self.executor.run(
+                analyze_audio_columns, self.file_path, **self.options
+            )
+            self.sample_rate = result["sample_rate"]
+            self.total_frames = result["total_segments"]
+            self.threshold = result["params"]["energy_threshold"]
+            self.noise_floor = result["params"].get("noise_floor")
+            self._columns = result["columns"]
+            return
+
+        analyzer = get_analyzer(**self.options)
+        self.sample_rate = analyzer.analysis_rate(info.samplerate)
+        self.total_frames = analyzer.frame_count(info.frames, info.samplerate)
+        self.threshold = analyzer.energy_threshold
+        if analyzer.threshold_mode == "adaptive":
+            self.threshold, self.noise_floor = await self.executor.run(
+                estimate_audio_threshold, self.file_path, **self.options
+            )
+        self._first = await self.executor.run(
+            analyze_audio_block,
+            self.file_path,
+            0,
+            min(self.block_frames, self.total_frames),
+            self.threshold,
+            **self.options
+        )
+
+    async def blocks(self) -> AsyncIterator[Dict[str, np.ndarray]]:
+        """Các cột (xem AudioAnalyzer._classify_columns) của từng khối, theo thứ tự"""
+        if self._columns is not None:
+            for first in range(0, self.total_frames, self.block_frames):
+                yield {
+                    name: values[first:first + self.block_frames]
+                    for name, values in self._columns.items()
+                }
+            return
+
+        ranges = iter(range(self.block_frames, self.total_frames, self.block_frames))
+        pending: Deque[asyncio.Task] = deque()
+
+        def submit() -> None:
+            first = next(ranges, None)
+            if first is not None:
+                last = min(first + self.block_frames, self.total_frames)
+                pending.append(asyncio.create_task(self._run_block(first, last)))
+
+        for _ in range(self.prefetch):
+            submit()
+        try:
+            yield self._first
+            while pending:
+                columns = await pending.popleft()
+                submit()
+                yield columns
+        finally:
+            # Client ngắt kết nối: bỏ các khối chưa gửi
+            for task in pending:
+                task.cancel()
+
+    async def _run_block(self, first: int, last: int) -> Dict[str, np.ndarray]:
+        """Phân tích một khối; pool đầy thì chờ rồi thử lại (response đã bắt đầu)"""
+        while True:
+            try:
+                return await self.executor.run(
+                    analyze_audio_block,
+                    self.file_path,
+                    first,
+                    last,
+                    self.threshold,
+                    **self.options
+                )
+            except QueueFullError:
+                await asyncio.sleep(self.retry_delay)
@@ -0,0 +1,218 @@
+"""
+Nhận file upload - Ghi từng khối ra đĩa và giới hạn kích thước
+Không giữ toàn bộ file trong RAM (F-S3, S-P1)
+"""
+
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from metrics import stage
+
+# Phần dư cho header/boundary của multipart ngoài nội dung file (bytes)
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """File upload vượt quá giới hạn kích thước"""
+
+
+async def save_upload(
+    file: UploadFile,
+    suffix: str,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024,
+    digest: Optional[Any] = None
+) -> str:
+    """
+    Ghi file upload vào file tạm theo từng khối chunk_size
+
+    Args:
+        file: File upload
+        suffix: Phần mở rộng của file tạm
+        max_bytes: Kích thước tối đa cho phép
+        chunk_size: Kích thước mỗi khối đọc/ghi
+        digest: Đối tượng hashlib (tùy chọn) được cập nhật với từng khối
+
+    Returns:
+        Đường dẫn file tạm - người gọi chịu trách nhiệm xóa
+
+    Raises:
+        UploadTooLargeError: Nếu file lớn hơn max_bytes (file tạm đã bị xóa)
+    """
+    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    written = 0
+
+    try:
+        while True:
+            with stage("upload_read"):
+                chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+
+            written += len(chunk)
+            if written > max_bytes:
+                raise UploadTooLargeError(
+                    f"File exceeds the maximum size of {max_bytes} bytes"
+                )
+
+            if digest is not None:
+                digest.update(chunk)
+            with stage("temp_write"):
+                await run_in_threadpool(temp_file.write, chunk)
+    except BaseException:
+        temp_file.close()
+        os.unlink(temp_file.name)
+        raise
+    else:
+        temp_file.close()
+
+    return temp_file.name
+
+
+async def read_upload(
+    file: UploadFile,
+    max_bytes: int,
+    chunk_size: int = 1024 * 1024,
+    digest: Optional[Any] = None
+) -> bytes:
+    """
+    Đọc toàn bộ file upload vào bộ nhớ theo từng khối chunk_size
+
+    Chỉ dùng cho file nhỏ (giải mã trực tiếp từ bộ nhớ, không cần file tạm).
+    Nếu có digest (đối tượng hashlib), nó được cập nhật với từng khối.
+
+    Raises:
+        UploadTooLargeError: Nếu file lớn hơn max_bytes
+    """
+    buffer = bytearray()
+
+    while True:
+        with stage("upload_read"):
+            chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise UploadTooLargeError(
+                f"File exceeds the maximum size of {max_bytes} bytes"
+            )
+        if digest is not None:
+            digest.update(chunk)
+
+    return bytes(buffer)
+
+
+class UploadLimitMiddleware:
+    """
+    Từ chối request quá lớn bằng 413 trước khi body được đọc hết
+
+    FastAPI phân tích toàn bộ multipart trước khi gọi endpoint, nên giới
+    hạn trong endpoint là quá muộn. Middleware này kiểm tra Content-Length
+    ngay khi nhận header, và đếm số byte thực nhận được (cho request
+    chunked không có Content-Length) - vượt quá thì ngừng đọc body.
+    Content-Length không phải số nguyên bị từ chối với 400.
+
+    Attributes:
+        max_upload_bytes: Kích thước file tối đa
+        max_body_bytes: Kích thước body tối đa (file + MULTIPART_OVERHEAD)
+        path_limits: Giới hạn riêng (bytes) theo đường dẫn, ví dụ cho
+            endpoint nhận nhiều file trong một request
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_upload_bytes: int,
+        path_limits: Optional[Dict[str, int]] = None
+    ):
+        self.app = app
+        self.max_upload_bytes = max_upload_bytes
+        self.max_body_bytes = max_upload_bytes + MULTIPART_OVERHEAD
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        max_upload_bytes = self.path_limits.get(scope["path"], self.max_upload_bytes)
+        max_body_bytes = max_upload_bytes + MULTIPART_OVERHEAD
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                await self._send_error(
+                    send, 400, "Invalid request", "Malformed Content-Length header"
+                )
+                return
+            if declared > max_body_bytes:
+                await self._reject(send, max_upload_bytes)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_bytes:
+                    # Ngừng đọc body: app thấy client ngắt kết nối
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            if exceeded and not response_started:
+                # Bỏ response lỗi của app, thay bằng 413 bên dưới
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+
+        if exceeded and not response_started:
+            await self._reject(send, max_upload_bytes)
+
+    async def _reject(self, send: Send, max_upload_bytes: int) -> None:
+        """Gửi response 413 khi request vượt quá giới hạn"""
+        await self._send_error(
+            send, 413, "File too large",
+            f"Upload exceeds the maximum size of {max_upload_bytes // (1024 * 1024)}MB"
+        )
+
+    async def _send_error(self, send: Send, status: int, error: str, message: str) -> None:
+        """Gửi response lỗi cùng định dạng với các endpoint"""
+        body = json.dumps({"detail": {"error": error, "message": message}}).encode()
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close")
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
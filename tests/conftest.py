@@ -0,0 +1,32 @@
+"""
+Cấu hình pytest: server chạy từ thư mục server/ (import phẳng),
+create_test_audio.py nằm ở thư mục gốc
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "server"))
+
+
+@pytest.fixture(scope="session")
+def api_client():
+    """
+    TestClient của server với pool thread (không fork tiến trình),
+    cache kết quả chỉ trong bộ nhớ và giới hạn upload 1 MB
+    """
+    os.environ.update({
+        "ANALYSIS_EXECUTOR": "thread",
+        "ANALYSIS_WORKERS": "2",
+        "RESULT_CACHE_DIR": "",
+        "MAX_UPLOAD_MB": "1"
+    })
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,93 @@
+"""
+Cache kết quả (cache.py): khóa, hit/miss qua /analyze/, LRU theo byte
+và ngân sách tầng đĩa
+"""
+
+import os
+
+import pytest
+
+from cache import ENTRY_SUFFIX, ResultCache, make_cache_key
+from create_test_audio import create_corpus_audio
+
+DIGEST = "ab" * 32
+CONFIG = {"f0_backend": "yin", "sample_rate": 16000, "mode": "frames", "format": "application/json"}
+
+
+@pytest.fixture(scope="module")
+def audio_bytes(tmp_path_factory):
+    path = tmp_path_factory.mktemp("audio") / "clip.wav"
+    create_corpus_audio(str(path), duration=2, sample_rate=16000, seed=3)
+    return path.read_bytes()
+
+
+def test_hit_after_miss_splices_filename(api_client, audio_bytes):
+    url = "/analyze/?f0_backend=yin&energy_threshold=0.021"
+    first = api_client.post(url, files={"file": ("first.wav", audio_bytes, "audio/wav")})
+    second = api_client.post(url, files={"file": ("second.wav", audio_bytes, "audio/wav")})
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert first.json()["filename"] == "first.wav"
+    assert second.json()["filename"] == "second.wav"
+    assert {**second.json(), "filename": "first.wav"} == first.json()
+
+
+@pytest.mark.parametrize("change", [
+    {"energy_threshold": 0.03},
+    {"mode": "runs"},
+    {"format": "application/vnd.voiceanalysis.columns"}
+])
+def test_key_depends_on_params_mode_and_format(change):
+    assert make_cache_key(DIGEST, {**CONFIG, **change}) != make_cache_key(DIGEST, CONFIG)
+    assert make_cache_key(DIGEST, dict(reversed(list(CONFIG.items())))) == make_cache_key(DIGEST, CONFIG)
+    assert make_cache_key("cd" * 32, CONFIG) != make_cache_key(DIGEST, CONFIG)
+
+
+def test_memory_lru_evicts_by_bytes():
+    cache = ResultCache(memory_budget=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    assert cache.get("a") == b"a" * 100  # a mới được dùng, b cũ nhất
+    cache.put("c", b"c" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a" * 100
+    assert cache.get("c") == b"c" * 100
+    stats = cache.stats()
+    assert stats["memory_bytes"] == 200
+    assert stats["evictions"] == 1
+
+    cache.put("big", b"x" * 300)  # lớn hơn cả ngân sách: không lưu
+    assert cache.get("big") is None
+    assert cache.stats()["memory_bytes"] == 200
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(memory_budget=0, disk_dir=str(tmp_path), disk_budget=250)
+    for index, key in enumerate(("a", "b")):
+        cache.put(key, key.encode() * 100)
+        os.utime(tmp_path / f"{key}{ENTRY_SUFFIX}", (1000 + index, 1000 + index))
+    cache.put("c", b"c" * 100)
+
+    assert sorted(os.listdir(tmp_path)) == [f"b{ENTRY_SUFFIX}", f"c{ENTRY_SUFFIX}"]
+    assert cache.stats()["disk_bytes"] == 200
+
+    # Tiến trình khác (cache mới trên cùng thư mục) đọc được tầng đĩa
+    shared = ResultCache(memory_budget=0, disk_dir=str(tmp_path), disk_budget=250)
+    assert shared.stats()["disk_bytes"] == 200
+    assert shared.get("b") == b"b" * 100
+    assert shared.get("a") is None
+
+
+def test_stale_temp_files_are_removed(tmp_path):
+    stale = tmp_path / f"x{ENTRY_SUFFIX}.123.tmp"
+    fresh = tmp_path / f"y{ENTRY_SUFFIX}.456.tmp"
+    stale.write_bytes(b"partial")
+    fresh.write_bytes(b"partial")
+    os.utime(stale, (1000, 1000))
+
+    ResultCache(memory_budget=0, disk_dir=str(tmp_path), disk_budget=250)
+    assert not stale.exists()
+    assert fresh.exists()
@@ -0,0 +1,96 @@
+"""
+CLI phân tích hàng loạt (cli.py): chạy lại bỏ qua file đã xong, phần đuôi
+JSONL chưa có trong manifest bị cắt, manifest khác tham số bị từ chối
+"""
+
+import json
+import sys
+
+import pytest
+
+import cli
+from create_test_audio import create_corpus_audio
+
+FILES = ("a.wav", "b.wav", "sub/c.wav")
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    audio_dir = tmp_path / "audio"
+    for seed, name in enumerate(FILES):
+        path = audio_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        create_corpus_audio(str(path), duration=1, sample_rate=16000, seed=seed)
+    return audio_dir
+
+
+def _run(monkeypatch, audio_dirs, output, *extra):
+    argv = ["analysis", *map(str, audio_dirs), "-o", str(output), "--backend", "yin", "--workers", "1"]
+    monkeypatch.setattr(sys, "argv", argv + list(extra))
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main()
+    return exit_info.value.code
+
+
+def _lines(output):
+    return [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+
+
+def _manifest(output):
+    path = output.parent / (output.name + cli.MANIFEST_SUFFIX)
+    return path, path.read_text(encoding="utf-8").splitlines()
+
+
+def test_rerun_skips_processed_files(corpus, tmp_path, monkeypatch):
+    output = tmp_path / "results.jsonl"
+    assert _run(monkeypatch, [corpus], output) == 0
+    first = output.read_bytes()
+    assert [line["filename"] for line in _lines(output)] == list(FILES)
+    _, entries = _manifest(output)
+    assert len(entries) == 1 + len(FILES)
+
+    assert _run(monkeypatch, [corpus], output) == 0
+    assert output.read_bytes() == first
+    assert len(_manifest(output)[1]) == 1 + len(FILES)
+
+
+def test_resume_truncates_unrecorded_tail(corpus, tmp_path, monkeypatch):
+    output = tmp_path / "results.jsonl"
+    assert _run(monkeypatch, [corpus], output) == 0
+    complete = output.read_bytes()
+
+    # Bị kill sau khi ghi (một phần) dòng của c.wav, trước khi ghi manifest
+    manifest_path, entries = _manifest(output)
+    manifest_path.write_text("\n".join(entries[:-1]) + "\n", encoding="utf-8")
+    recorded_end = json.loads(entries[-2])["output_end"]
+    output.write_bytes(complete[:recorded_end] + complete[recorded_end:][:40])
+
+    assert _run(monkeypatch, [corpus], output) == 0
+    assert output.read_bytes() == complete
+    assert [line["filename"] for line in _lines(output)] == list(FILES)
+    assert len(_manifest(output)[1]) == 1 + len(FILES)
+
+
+def test_manifest_with_other_params_is_rejected(corpus, tmp_path, monkeypatch):
+    output = tmp_path / "results.jsonl"
+    assert _run(monkeypatch, [corpus], output) == 0
+    before = output.read_bytes()
+
+    assert _run(monkeypatch, [corpus], output, "--mode", "runs") == 2
+    assert output.read_bytes() == before
+    assert len(_manifest(output)[1]) == 1 + len(FILES)
+
+
+def test_same_basename_directories_do_not_collide(tmp_path, monkeypatch):
+    roots = [tmp_path / "a" / "data", tmp_path / "b" / "data"]
+    for seed, root in enumerate(roots):
+        root.mkdir(parents=True)
+        create_corpus_audio(str(root / "x.wav"), duration=1, sample_rate=16000, seed=seed)
+    output = tmp_path / "results.jsonl"
+
+    # Chạy lại: file thứ hai không bị coi là đã xong
+    for _ in range(2):
+        assert _run(monkeypatch, roots, output) == 0
+
+    assert [line["filename"] for line in _lines(output)] == ["a/data/x.wav", "b/data/x.wav"]
+    assert len(_manifest(output)[1]) == 1 + len(roots)
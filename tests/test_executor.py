@@ -0,0 +1,50 @@
+"""
+AnalysisExecutor.warm(): chỉ trả về khi mọi worker đã chạy xong initializer
+"""
+
+import asyncio
+import os
+import threading
+import time
+from functools import partial
+
+import pytest
+
+from executor import AnalysisExecutor
+
+WORKERS = 4
+
+
+def _slow_initializer(directory: str) -> None:
+    """Worker đầu tiên khởi tạo nhanh, các worker sau chậm hơn nhiều"""
+    try:
+        os.close(os.open(os.path.join(directory, "first"), os.O_CREAT | os.O_EXCL))
+        time.sleep(0.05)
+    except FileExistsError:
+        time.sleep(1.0)
+    name = f"{os.getpid()}-{threading.get_ident()}"
+    with open(os.path.join(directory, "done", name), "w"):
+        pass
+
+
+@pytest.mark.parametrize("kind", ["process", "thread"])
+def test_warm_waits_for_every_initializer(tmp_path, kind):
+    (tmp_path / "done").mkdir()
+    executor = AnalysisExecutor(
+        kind=kind,
+        workers=WORKERS,
+        initializer=partial(_slow_initializer, str(tmp_path))
+    )
+
+    async def start():
+        await executor.start(wait=False)
+        return await executor.warm()
+
+    try:
+        worker_ids = asyncio.run(start())
+        initialized = set(os.listdir(tmp_path / "done"))
+    finally:
+        executor.shutdown()
+
+    assert len(set(worker_ids)) == WORKERS
+    assert {f"{pid}-{ident}" for pid, ident in worker_ids} == initialized
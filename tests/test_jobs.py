@@ -0,0 +1,56 @@
+"""
+JobStore: job đã kết thúc bị giới hạn theo số lượng và tổng kích thước
+kết quả, job cũ nhất bị xóa trước
+"""
+
+import asyncio
+import json
+
+from executor import AnalysisExecutor
+from jobs import DONE, JobStore
+
+
+def _fake_analysis(audio_path, filename=None, segments=0):
+    return {"filename": filename, "total_segments": segments, "segments": [0] * segments}
+
+
+async def _run_jobs(tmp_path, sizes, **limits):
+    executor = AnalysisExecutor(kind="thread", workers=1)
+    await executor.start()
+    store = JobStore(executor, max_active=len(sizes), **limits)
+    try:
+        submitted = []
+        for index, segments in enumerate(sizes):
+            path = tmp_path / f"{index}.wav"
+            path.write_bytes(b"")
+            job = store.submit(_fake_analysis, f"{index}.wav", str(path), segments=segments)
+            await job.task
+            submitted.append(job)
+        return store, submitted
+    finally:
+        executor.shutdown()
+
+
+def test_finished_jobs_capped_by_count(tmp_path):
+    store, submitted = asyncio.run(_run_jobs(tmp_path, [1] * 5, max_finished=3))
+
+    assert [store.get(job.id) is not None for job in submitted] == [False, False, True, True, True]
+    result = json.loads(store.get(submitted[-1].id).result)
+    assert result["filename"] == "4.wav"
+    assert result["total_segments"] == 1
+
+
+def test_finished_jobs_capped_by_result_bytes(tmp_path):
+    sizes = [1000, 1000, 1000]
+    store, submitted = asyncio.run(_run_jobs(tmp_path, sizes, max_result_bytes=5000))
+
+    assert all(job.status == DONE for job in submitted)
+    kept = [job for job in submitted if store.get(job.id) is not None]
+    assert kept == submitted[1:]
+    assert store.result_bytes == sum(len(job.result) for job in kept) <= 5000
+
+
+def test_result_larger_than_budget_is_not_kept(tmp_path):
+    store, submitted = asyncio.run(_run_jobs(tmp_path, [10], max_result_bytes=0))
+    assert store.get(submitted[0].id) is None
+    assert store.result_bytes == 0
@@ -0,0 +1,59 @@
+"""
+pYIN nhanh (hàm nội bộ của librosa, trạng thái dựng sẵn) phải cho kết quả
+giống hệt librosa.pyin; hàm nội bộ đổi chữ ký thì dùng librosa.pyin
+"""
+
+import librosa
+import numpy as np
+import pytest
+import soundfile
+
+import analysis
+from analysis import AudioAnalyzer
+from create_test_audio import create_corpus_audio
+
+SAMPLE_RATE = 16000
+
+
+@pytest.fixture(scope="module")
+def signal(tmp_path_factory):
+    path = tmp_path_factory.mktemp("audio") / "pyin.wav"
+    create_corpus_audio(str(path), duration=4, sample_rate=SAMPLE_RATE, seed=2)
+    y, _ = soundfile.read(str(path), dtype="float32")
+    return y
+
+
+def _librosa_pyin(analyzer, y):
+    f0, voiced_flag, _ = librosa.pyin(
+        y,
+        fmin=analyzer.fmin,
+        fmax=analyzer.fmax,
+        sr=SAMPLE_RATE,
+        frame_length=analyzer.frame_length,
+        hop_length=analyzer.hop_length
+    )
+    return np.nan_to_num(f0, nan=0.0), voiced_flag
+
+
+def test_fast_pyin_matches_librosa(signal):
+    assert analysis._pyin_internals() is not None
+    analyzer = AudioAnalyzer(f0_backend="pyin")
+    f0 = analyzer._extract_f0_pyin(signal, SAMPLE_RATE)
+
+    expected_f0, expected_voiced = _librosa_pyin(analyzer, signal)
+    np.testing.assert_allclose(f0, expected_f0, rtol=1e-9)
+    np.testing.assert_array_equal(f0 > 0, expected_voiced)
+
+
+def test_changed_internals_fall_back_to_librosa(signal, monkeypatch):
+    def changed_signature(*args):
+        raise TypeError("unexpected positional argument")
+
+    internals = {**analysis._pyin_internals(), "observations": changed_signature}
+    monkeypatch.setattr(analysis, "_pyin_internals", lambda: internals)
+    monkeypatch.setattr(analysis, "_pyin_fast_path", True)
+
+    analyzer = AudioAnalyzer(f0_backend="pyin")
+    f0 = analyzer._extract_f0_pyin(signal, SAMPLE_RATE)
+    assert analysis._pyin_fast_path is False
+    np.testing.assert_array_equal(f0, _librosa_pyin(analyzer, signal)[0])
@@ -0,0 +1,35 @@
+"""
+Sample rate cao (88.2/96kHz) ở tần số gốc: fmin mặc định không bị từ chối,
+khoảng chu kỳ được kẹp trong khung như librosa.pyin
+"""
+
+import pytest
+
+from analysis import AudioAnalyzer
+from create_test_audio import create_corpus_audio
+
+
+@pytest.fixture(scope="module")
+def high_rate_audio(tmp_path_factory):
+    path = tmp_path_factory.mktemp("audio") / "hires.wav"
+    create_corpus_audio(str(path), duration=2, sample_rate=96000, seed=5)
+    return path.read_bytes()
+
+
+@pytest.mark.parametrize("f0_backend", ["pyin", "yin", "nccf"])
+def test_upload_at_96khz_is_analyzed(api_client, high_rate_audio, f0_backend):
+    response = api_client.post(
+        f"/analyze/?f0_backend={f0_backend}",
+        files={"file": ("hires.wav", high_rate_audio, "audio/wav")}
+    )
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["params"]["sample_rate"] == 96000
+    assert result["total_segments"] > 0
+
+
+def test_explicit_fmin_is_still_checked():
+    AudioAnalyzer().check_sample_rate(96000)
+    with pytest.raises(ValueError, match="too low"):
+        AudioAnalyzer(fmin=40.0).check_sample_rate(96000)
@@ -0,0 +1,38 @@
+"""
+Phân tích streaming (analyze_blocks) phải cho kết quả giống hệt batch
+"""
+
+import numpy as np
+import pytest
+
+from analysis import AudioAnalyzer
+from create_test_audio import create_corpus_audio
+
+SOURCE_RATE = 44100
+ANALYSIS_RATE = 16000
+# Khối lẻ: biên khối (block_frames * hop mẫu phân tích) không rơi vào mẫu gốc
+# nguyên, mỗi khối phải resample lại đoạn chồng lấn
+BLOCK_FRAMES = (97, 333)
+
+
+@pytest.fixture(scope="module")
+def corpus_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("audio") / "corpus.wav"
+    create_corpus_audio(str(path), duration=12, sample_rate=SOURCE_RATE, seed=7)
+    return str(path)
+
+
+@pytest.mark.parametrize("f0_backend", ["yin", "nccf", "pyin"])
+@pytest.mark.parametrize("block_frames", BLOCK_FRAMES)
+def test_blocks_match_batch(corpus_path, f0_backend, block_frames):
+    analyzer = AudioAnalyzer(f0_backend=f0_backend, sample_rate=ANALYSIS_RATE)
+    batch = analyzer.analyze_columns(corpus_path)["columns"]
+
+    blocks = list(analyzer.analyze_blocks(corpus_path, block_frames))
+    assert len(blocks) > 1
+    for name, values in batch.items():
+        streamed = np.concatenate([block[name] for block in blocks])
+        np.testing.assert_array_equal(streamed, values, err_msg=f"column {name}")
+
+    segments = analyzer.analyze(corpus_path)["segments"]
+    assert list(analyzer.iter_segments(corpus_path, block_frames)) == segments
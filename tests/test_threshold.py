@@ -0,0 +1,76 @@
+"""
+Ngưỡng năng lượng thích ứng (threshold_mode="adaptive"): bản ghi nhỏ tiếng
+được phân loại như bản gốc, streaming dùng cùng ngưỡng với batch
+"""
+
+import numpy as np
+import pytest
+import soundfile
+
+from analysis import AudioAnalyzer, SILENCE, UNVOICED
+from create_test_audio import create_corpus_audio
+
+SAMPLE_RATE = 16000
+GAIN = 0.03
+
+
+@pytest.fixture(scope="module")
+def clips(tmp_path_factory):
+    """(bản gốc, bản nhỏ tiếng GAIN lần) - float để không mất nền nhiễu khi lượng tử hóa"""
+    directory = tmp_path_factory.mktemp("audio")
+    source = directory / "source.wav"
+    create_corpus_audio(str(source), duration=12, sample_rate=SAMPLE_RATE, seed=11)
+    y, _ = soundfile.read(str(source), dtype="float32")
+
+    paths = []
+    for name, gain in (("normal.wav", 1.0), ("quiet.wav", GAIN)):
+        path = directory / name
+        soundfile.write(str(path), gain * y, SAMPLE_RATE, subtype="FLOAT")
+        paths.append(str(path))
+    return paths
+
+
+def test_adaptive_threshold_ignores_gain(clips):
+    normal_path, quiet_path = clips
+    fixed = AudioAnalyzer(f0_backend="yin")
+    adaptive = AudioAnalyzer(f0_backend="yin", threshold_mode="adaptive")
+
+    reference = fixed.analyze_columns(normal_path)["columns"]["type"]
+    assert (reference == UNVOICED).any()
+
+    # Ngưỡng cố định 0.02: đoạn unvoiced nhỏ tiếng bị coi là im lặng
+    # (trừ vài frame sát đoạn voiced)
+    quiet_fixed = fixed.analyze_columns(quiet_path)["columns"]["type"]
+    assert (quiet_fixed[reference == UNVOICED] == SILENCE).mean() > 0.9
+
+    normal = adaptive.analyze_columns(normal_path)
+    quiet = adaptive.analyze_columns(quiet_path)
+    np.testing.assert_array_equal(normal["columns"]["type"], reference)
+    np.testing.assert_array_equal(quiet["columns"]["type"], reference)
+
+    # params báo ngưỡng đã chọn; nền nhiễu tỉ lệ với âm lượng (làm tròn 6 chữ số)
+    for result in (normal, quiet):
+        params = result["params"]
+        assert params["threshold_mode"] == "adaptive"
+        assert 0 < params["noise_floor"] < params["energy_threshold"]
+    assert quiet["params"]["noise_floor"] == pytest.approx(
+        GAIN * normal["params"]["noise_floor"], rel=0.05
+    )
+    assert fixed.analyze_columns(quiet_path)["params"]["energy_threshold"] == 0.02
+
+
+def test_blocks_use_batch_threshold(clips):
+    _, quiet_path = clips
+    analyzer = AudioAnalyzer(f0_backend="yin", threshold_mode="adaptive")
+    batch = analyzer.analyze_columns(quiet_path)
+
+    with soundfile.SoundFile(quiet_path) as audio:
+        threshold, noise_floor = analyzer.file_threshold(audio)
+    assert round(threshold, 6) == batch["params"]["energy_threshold"]
+    assert round(noise_floor, 6) == batch["params"]["noise_floor"]
+
+    blocks = list(analyzer.analyze_blocks(quiet_path, block_frames=97))
+    assert len(blocks) > 1
+    for name, values in batch["columns"].items():
+        streamed = np.concatenate([block[name] for block in blocks])
+        np.testing.assert_array_equal(streamed, values, err_msg=f"column {name}")
@@ -0,0 +1,56 @@
+"""
+Giới hạn upload (uploads.py): 413 khi vượt MAX_UPLOAD_MB, không để lại
+file tạm; Content-Length sai định dạng trả về 400
+"""
+
+import asyncio
+import json
+import tempfile
+
+import pytest
+
+from uploads import UploadLimitMiddleware
+
+MAX_UPLOAD_BYTES = 1024 * 1024  # MAX_UPLOAD_MB=1 của api_client
+
+
+@pytest.mark.parametrize("size", [
+    # Body vẫn trong phần dư multipart: endpoint ghi file tạm rồi dừng
+    MAX_UPLOAD_BYTES + 32 * 1024,
+    # Content-Length vượt giới hạn: middleware từ chối trước khi đọc body
+    2 * MAX_UPLOAD_BYTES
+])
+def test_oversized_upload_is_rejected_without_temp_file(api_client, tmp_path, monkeypatch, size):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    response = api_client.post(
+        "/analyze/", files={"file": ("big.mp3", b"\0" * size, "audio/mpeg")}
+    )
+
+    assert response.status_code == 413
+    assert response.json()["detail"]["error"] == "File too large"
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_malformed_content_length_is_rejected():
+    async def app(scope, receive, send):
+        raise AssertionError("request must not reach the app")
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = UploadLimitMiddleware(app, max_upload_bytes=MAX_UPLOAD_BYTES)
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/analyze/",
+        "headers": [(b"content-length", b"abc")]
+    }
+    asyncio.run(middleware(scope, receive, send))
+
+    assert sent[0]["status"] == 400
+    assert json.loads(sent[1]["body"])["detail"]["error"] == "Invalid request"